@@ -7,10 +7,11 @@ Flask-based web interface for generating word images
 import os
 import json
 import asyncio
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, url_for
+import threading
+from datetime import datetime, timedelta
+from flask import Flask, Response, render_template, request, jsonify, send_file, url_for
 from werkzeug.utils import secure_filename
-import glob
+from concurrent.futures import ThreadPoolExecutor
 
 # Import Ver.1 core modules
 from src.openai_client import OpenAIClient
@@ -18,11 +19,180 @@ from src.scene_generator import SceneGenerator
 from src.image_generator import ImageGenerator
 from src.html_generator import HTMLGenerator
 from src.cost_calculator import CostCalculator
+from src.word_pipeline import WordPipeline
+from src.job_queue import JobManager
+from src.scene_cache import SceneCache
+from src.image_cache import ImageCache
+from src.client_registry import ClientRegistry
+from src.character_images import CharacterImageRegistry
+from src.image_derivatives import ImageDerivatives
+from src.http_cache import FileETagCache
+from src.output_index import OutputIndex
+from src.catalog import Catalog
+from src.gallery import Gallery
+from src.word_input import WordList
+from src.cost_estimator import CostEstimator
+from src.budget import Budget, BudgetRegistry
+from src.metrics import PipelineMetrics
+from src.tracing import TraceFileWriter
+from src.cassette import Cassette
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'word-image-maker-v2'
 app.config['UPLOAD_FOLDER'] = 'image'
 app.config['OUTPUT_FOLDER'] = 'output'
+# Worker pool shared by all requests, and the per-request concurrency limit
+app.config['MAX_WORKERS'] = int(os.getenv('WORD_IMAGE_MAX_WORKERS', '8'))
+app.config['MAX_CONCURRENCY_PER_REQUEST'] = int(os.getenv('WORD_IMAGE_MAX_CONCURRENCY', '4'))
+# Number of /generate jobs processed at the same time (others wait in the queue)
+app.config['MAX_RUNNING_JOBS'] = int(os.getenv('WORD_IMAGE_MAX_RUNNING_JOBS', '2'))
+# Batches with at least this many words generate their scenes in shared chat completions
+app.config['SCENE_BATCH_MIN_WORDS'] = int(os.getenv('WORD_IMAGE_SCENE_BATCH_MIN_WORDS',
+                                                    str(SceneGenerator.BATCH_MIN_WORDS)))
+# Seconds an unused OpenAI client (and its connection pool) is kept for reuse
+app.config['CLIENT_IDLE_TTL'] = float(os.getenv('WORD_IMAGE_CLIENT_IDLE_TTL', '600'))
+# Thumbnails / WebP renditions: 'eager' builds the gallery thumbnail in the background right
+# after each image is saved, 'lazy' builds it on first request. Other renditions are always
+# built one at a time on their first request
+app.config['DERIVATIVES_MODE'] = os.getenv('WORD_IMAGE_DERIVATIVES', 'eager')
+# Threads building renditions in the background
+app.config['DERIVATIVE_WORKERS'] = int(os.getenv('WORD_IMAGE_DERIVATIVE_WORKERS',
+                                                 str(ImageDerivatives.DEFAULT_MAX_WORKERS)))
+# AVIF renditions next to WebP (opt-in: AVIF encoding takes seconds per image)
+app.config['DERIVATIVES_AVIF'] = os.getenv('WORD_IMAGE_DERIVATIVES_AVIF', '0') == '1'
+# Browser cache lifetime for timestamped images, which are never rewritten
+app.config['IMMUTABLE_MAX_AGE'] = 365 * 24 * 60 * 60
+# Seconds between reconciling the output index with the output folder
+app.config['OUTPUT_RESCAN_INTERVAL'] = float(os.getenv('WORD_IMAGE_OUTPUT_RESCAN_INTERVAL', '60'))
+# Default and maximum page size of /outputs
+app.config['OUTPUTS_PAGE_SIZE'] = 50
+app.config['OUTPUTS_MAX_PAGE_SIZE'] = 200
+# Initial OpenAI rate limits per API key (adjusted from x-ratelimit-* response headers)
+app.config['OPENAI_CHAT_RPM'] = float(os.getenv('OPENAI_CHAT_RPM', str(OpenAIClient.CHAT_REQUESTS_PER_MINUTE)))
+app.config['OPENAI_CHAT_TPM'] = float(os.getenv('OPENAI_CHAT_TPM', str(OpenAIClient.CHAT_TOKENS_PER_MINUTE)))
+app.config['OPENAI_IMAGE_RPM'] = float(os.getenv('OPENAI_IMAGE_RPM', str(OpenAIClient.IMAGE_REQUESTS_PER_MINUTE)))
+# Alternative OpenAI-compatible endpoint, e.g. the fake server in benchmarks/ (empty = official API)
+app.config['OPENAI_BASE_URL'] = os.getenv('OPENAI_BASE_URL', '')
+# Record OpenAI responses to, or replay them from, a cassette directory ('record' / 'replay', empty = off).
+# Replay never touches the network, so batches re-run instantly and for free
+app.config['CASSETTE_MODE'] = os.getenv('WORD_IMAGE_CASSETTE_MODE', '')
+app.config['CASSETTE_DIR'] = os.getenv('WORD_IMAGE_CASSETTE_DIR', os.path.join('output', 'cassettes'))
+# Spending caps in USD (0 = unlimited): per /generate request, and per API key per day.
+# A word is only started if its estimated cost still fits in both
+app.config['MAX_BATCH_BUDGET'] = float(os.getenv('WORD_IMAGE_MAX_BATCH_BUDGET', '10'))
+app.config['KEY_DAILY_BUDGET'] = float(os.getenv('WORD_IMAGE_KEY_DAILY_BUDGET', '50'))
+# Optional Chrome trace-event file receiving every word's timing spans (empty = disabled)
+app.config['TRACE_FILE'] = os.getenv('WORD_IMAGE_TRACE_FILE', '')
+# Size cap of images held only by the generated image cache; blobs still hard-linked from
+# output/images cost no extra disk and are not counted (least recently used are evicted first)
+app.config['IMAGE_CACHE_MAX_BYTES'] = int(os.getenv('WORD_IMAGE_IMAGE_CACHE_MAX_MB', '500')) * 1024 * 1024
+
+word_executor = ThreadPoolExecutor(max_workers=app.config['MAX_WORKERS'],
+                                   thread_name_prefix='word')
+job_manager = JobManager(max_running_jobs=app.config['MAX_RUNNING_JOBS'])
+
+# Base character images are loaded once and reloaded only when the file changes
+character_images = CharacterImageRegistry(app.config['UPLOAD_FOLDER'])
+
+# Content hashes used as strong ETags for /view responses
+file_etags = FileETagCache()
+
+# Stateless components shared by every request
+ImageDerivatives.avif_enabled = app.config['DERIVATIVES_AVIF']
+derivatives = ImageDerivatives(background=True, max_workers=app.config['DERIVATIVE_WORKERS'])
+cost_calculator = CostCalculator()
+
+# Per-key spending
+key_budgets = BudgetRegistry(app.config['KEY_DAILY_BUDGET'] or None)
+
+# Components backed by files under OUTPUT_FOLDER; opened by init_storage() before the
+# first request so importing this module touches no disk
+scene_cache = None
+image_cache = None
+html_generator = None
+output_index = None
+catalog = None
+gallery = None
+cost_estimator = None
+cassette = None
+trace_writer = None
+_storage_lock = threading.Lock()
+_storage_ready = False
+
+def init_storage():
+    """Open the caches, catalog, gallery and viewer index under OUTPUT_FOLDER (once)"""
+    global scene_cache, image_cache, html_generator, output_index, catalog, gallery
+    global cost_estimator, cassette, trace_writer, _storage_ready
+    with _storage_lock:
+        if _storage_ready:
+            return
+
+        output_folder = app.config['OUTPUT_FOLDER']
+        scene_cache = SceneCache(os.path.join(output_folder, 'cache', 'scenes'))
+        image_cache = ImageCache(os.path.join(output_folder, 'cache', 'images'),
+                                 max_bytes=app.config['IMAGE_CACHE_MAX_BYTES'])
+        html_generator = HTMLGenerator(output_folder, cost_calculator=cost_calculator,
+                                       responsive_images=True)
+
+        # Generated viewers, kept up to date as html_generator writes them
+        output_index = OutputIndex(output_folder, rescan_interval=app.config['OUTPUT_RESCAN_INTERVAL'])
+        html_generator.add_listener(output_index.add)
+
+        # Indexed history of every successful generation (scene, usage, cost, artifacts)
+        catalog = Catalog(os.path.join(output_folder, 'catalog.sqlite3'))
+
+        # Paged output/index.html covering the whole history; only the affected page is
+        # rewritten when a word is recorded
+        gallery = Gallery(html_generator, catalog)
+        gallery.ensure_built()
+        catalog.add_listener(gallery.add)
+
+        # Pre-flight cost/time estimates from past generations
+        cost_estimator = CostEstimator(catalog, cost_calculator)
+
+        if app.config['CASSETTE_MODE']:
+            cassette = Cassette(app.config['CASSETTE_DIR'], app.config['CASSETTE_MODE'])
+        if app.config['TRACE_FILE']:
+            trace_writer = TraceFileWriter(app.config['TRACE_FILE'])
+        _storage_ready = True
+
+@app.before_request
+def ensure_storage():
+    """Open the on-disk components on the first request"""
+    if not _storage_ready:
+        init_storage()
+
+# OpenAI clients are reused across requests with the same API key so their
+# keep-alive connection pools survive between batches
+client_registry = ClientRegistry(
+    lambda api_key: OpenAIClient(
+        api_key,
+        scene_cache=scene_cache,
+        character_images=character_images,
+        rate_limits=OpenAIClient.create_rate_limits(app.config['OPENAI_CHAT_RPM'],
+                                                    app.config['OPENAI_CHAT_TPM'],
+                                                    app.config['OPENAI_IMAGE_RPM']),
+        base_url=app.config['OPENAI_BASE_URL'] or None,
+        cassette=cassette
+    ),
+    idle_ttl=app.config['CLIENT_IDLE_TTL']
+)
+
+# Prometheus metrics: per-stage latency, tokens, dollars, cache hits, retries, failures,
+# plus gauges read at scrape time
+metrics = PipelineMetrics()
+metrics.gauge('jobs', 'Generation jobs by state', ['state'],
+              lambda: {(state,): count for state, count in job_manager.stats().items()
+                       if state != 'pending_words'})
+metrics.gauge('words_queued', 'Words in queued or running jobs that have not started yet',
+              callback=lambda: job_manager.stats()['pending_words'])
+metrics.gauge('rate_limiter_queue_depth', 'Calls waiting for an OpenAI rate limiter slot', ['endpoint'],
+              lambda: sum_rate_limit_stats('queue_depth'))
+metrics.gauge('rate_limiter_wait_seconds', 'Cumulative seconds pooled clients spent waiting for rate limiter slots',
+              ['endpoint'], lambda: sum_rate_limit_stats('total_wait_seconds'))
+metrics.gauge('openai_clients', 'Pooled OpenAI clients', ['state'],
+              lambda: {('total',): client_registry.stats()['clients'],
+                       ('in_use',): client_registry.stats()['in_use']})
 
 # Global variables for configuration
 current_config = {
@@ -36,14 +206,17 @@ current_config = {
 def index():
     """Main page with input form"""
     # Get list of existing output HTML files
-    output_files = get_output_files()
+    outputs_version = output_index.version
+    output_files, _ = get_output_files()
     return render_template('index.html', 
                          config=current_config,
-                         output_files=output_files)
+                         output_files=output_files,
+                         outputs_version=outputs_version,
+                         max_batch_budget=app.config['MAX_BATCH_BUDGET'])
 
 @app.route('/generate', methods=['POST'])
 def generate_images():
-    """Generate images for multiple words"""
+    """Enqueue a generation job for multiple words and return its job ID"""
     try:
         # Get form data
         api_key = request.form.get('api_key', '').strip()
@@ -51,6 +224,10 @@ def generate_images():
         quality = request.form.get('quality', 'auto')
         character_image = request.form.get('character_image', 'cat_and_mouse.png')
         character_description = request.form.get('character_description', '仲の良い猫とねずみ')
+        # Skip the scene/image caches when the user explicitly wants a fresh result
+        use_cache = request.form.get('no_cache') not in ('1', 'on', 'true')
+        # Leave out words already generated with the same character and quality
+        skip_existing = request.form.get('skip_existing') in ('1', 'on', 'true')
         
         if not api_key:
             return jsonify({'error': 'API Key is required'}), 400
@@ -66,149 +243,363 @@ def generate_images():
             'quality': quality
         })
         
-        # Parse words (handle # notation for disambiguation)
-        words = parse_words(words_text)
-        
-        # Initialize components
-        client = OpenAIClient(api_key)
-        scene_generator = SceneGenerator(client)
-        image_generator = ImageGenerator(client)
-        html_generator = HTMLGenerator()
-        cost_calculator = CostCalculator()
-        
-        # Generate images for each word
-        results = []
-        total_cost = 0.0
-        
-        for word_info in words:
-            word = word_info['word']
-            context = word_info.get('context', '')
-            
-            try:
-                # Generate scene
-                scene_data = scene_generator.generate_scene_data(
-                    word, 
-                    character_description,
-                    context
-                )
-                
-                # Generate image
-                image_path, cost_info = image_generator.generate_image(
-                    f"image/{character_image}",
-                    scene_data,
-                    quality
+        try:
+            base_image_path = character_images.resolve(character_image)
+        except FileNotFoundError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Normalize words (handle # notation for disambiguation) and merge duplicates
+        word_list = WordList.from_lines(words_text.split('\n'))
+        if not word_list.words:
+            return jsonify({'error': 'Words are required'}), 400
+        if skip_existing:
+            word_list.skip_existing(catalog, os.path.basename(base_image_path), quality)
+        words = word_list.words
+        concurrency = get_request_concurrency()
+        
+        # Reserve each word's estimated cost against the request and API key budgets
+        estimate = estimate_batch(words, quality, base_image_path, concurrency)
+        budget = Budget(get_request_budget(), parent=key_budgets.get(api_key))
+        word_cost = estimate['per_word_cost_high']
+        if words and budget.remaining is not None and budget.remaining < word_cost:
+            return jsonify({
+                'error': 'Budget exhausted for this request or API key',
+                'estimate': estimate,
+                'budget_remaining': budget.remaining
+            }), 429
+        
+        def run_job(job):
+            # Borrow the shared client for this API key for the whole job
+            with client_registry.lease(api_key) as client:
+                pipeline = WordPipeline(
+                    SceneGenerator(client),
+                    ImageGenerator(client, image_cache=image_cache, cost_calculator=cost_calculator,
+                                   character_images=character_images,
+                                   derivatives=derivatives if app.config['DERIVATIVES_MODE'] == 'eager' else None),
+                    html_generator,
+                    executor=word_executor,
+                    catalog=catalog,
+                    metrics=metrics,
+                    trace_writer=trace_writer
                 )
                 
-                # Generate HTML viewer
-                html_path = html_generator.generate_viewer_html(
-                    scene_data, 
-                    image_path,
-                    cost_info,
-                    quality
+                # Generate images for each word on the shared worker pool,
+                # recording each result on the job as soon as it finishes
+                pipeline.run(
+                    words,
+                    base_image_path,
+                    character_description,
+                    quality,
+                    concurrency=concurrency,
+                    use_cache=use_cache,
+                    batch_min_words=app.config['SCENE_BATCH_MIN_WORDS'],
+                    on_start=job.mark_word_running,
+                    on_result=job.record_result,
+                    budget=budget,
+                    word_cost=word_cost
                 )
-                
-                # Calculate cost (already calculated in image generation)
-                word_cost = cost_info.get('total_cost', 0.0)
-                total_cost += word_cost
-                
-                results.append({
-                    'word': word,
-                    'context': context,
-                    'status': 'success',
-                    'image_path': image_path,
-                    'html_path': html_path,
-                    'html_filename': os.path.basename(html_path),
-                    'cost': word_cost
-                })
-                
-            except Exception as e:
-                results.append({
-                    'word': word,
-                    'context': context,
-                    'status': 'error',
-                    'error': str(e)
-                })
+        
+        job = job_manager.submit(words, run_job, input_report=word_list.to_dict())
         
         return jsonify({
             'success': True,
-            'results': results,
-            'total_cost': total_cost,
-            'output_files': get_output_files()
+            'job_id': job.id,
+            'status_url': url_for('get_job', job_id=job.id),
+            'input': word_list.to_dict(),
+            'estimate': estimate
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/estimate', methods=['POST'])
+def estimate_generation():
+    """Pre-flight cost and time estimate for the words in the generate form"""
+    try:
+        api_key = request.form.get('api_key', '').strip()
+        quality = request.form.get('quality', 'auto')
+        character_image = request.form.get('character_image', 'cat_and_mouse.png')
+        skip_existing = request.form.get('skip_existing') in ('1', 'on', 'true')
+        
+        try:
+            base_image_path = character_images.resolve(character_image)
+        except FileNotFoundError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        word_list = WordList.from_lines(request.form.get('words', '').split('\n'))
+        if skip_existing:
+            word_list.skip_existing(catalog, os.path.basename(base_image_path), quality)
+        
+        estimate = estimate_batch(word_list.words, quality, base_image_path, get_request_concurrency())
+        budget = Budget(get_request_budget(), parent=key_budgets.get(api_key) if api_key else None)
+        
+        # Words that fit in the budget at the conservative per-word estimate
+        remaining = budget.remaining
+        words_within_budget = len(word_list.words)
+        if remaining is not None and estimate['per_word_cost_high']:
+            words_within_budget = min(int(remaining // estimate['per_word_cost_high']), words_within_budget)
+        
+        return jsonify({
+            'input': word_list.to_dict(),
+            'estimate': estimate,
+            'budget': {
+                'limit': budget.limit,
+                'remaining': remaining,
+                'words_within_budget': words_within_budget
+            }
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Report per-word status, partial results and cost of a generation job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/rate-limits')
+def rate_limits():
+    """Report OpenAI rate limiter queue depth and wait times for every pooled client"""
+    return jsonify({
+        'clients': client_registry.stats(),
+        'rate_limits': client_registry.collect(lambda client: client.rate_limit_stats())
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of pipeline metrics"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def sum_rate_limit_stats(field):
+    """Total of one rate limiter stat per endpoint across every pooled client"""
+    totals = {}
+    for stats in client_registry.collect(lambda client: client.rate_limit_stats()):
+        for endpoint, endpoint_stats in stats.items():
+            totals[(endpoint,)] = totals.get((endpoint,), 0) + endpoint_stats[field]
+    return totals
+
 @app.route('/outputs')
 def list_outputs():
-    """Get list of output files"""
-    return jsonify({'output_files': get_output_files()})
+    """Get a page of output files, optionally filtered by word, quality and date range.
+    
+    With ?since=<version> only the viewers added or removed since that version are
+    returned (304 when nothing changed). If the version is too old to diff against,
+    a full first page is returned with reset=true.
+    """
+    try:
+        since = request.args.get('since')
+        since = int(since) if since else None
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = int(request.args.get('limit', app.config['OUTPUTS_PAGE_SIZE']))
+        limit = min(max(limit, 1), app.config['OUTPUTS_MAX_PAGE_SIZE'])
+        date_from = parse_date_arg(request.args.get('from'))
+        date_to = parse_date_arg(request.args.get('to'), end_of_day=True)
+    except ValueError:
+        return jsonify({'error': 'since/offset/limit must be integers and from/to must be YYYY-MM-DD dates'}), 400
+    
+    # Read the version before the data: a change racing with this request is sent
+    # again on the next poll rather than lost
+    version = output_index.version
+    
+    if since is not None:
+        changes = output_index.changes_since(since)
+        if changes is not None:
+            added, removed = changes
+            if not added and not removed:
+                return make_outputs_response(None, version)
+            return make_outputs_response({
+                'version': version,
+                'added': [output_file_dict(entry) for entry in added],
+                'removed': removed
+            }, version)
+    
+    output_files, total = get_output_files(
+        word=request.args.get('word') or None,
+        quality=request.args.get('quality') or None,
+        date_from=date_from,
+        date_to=date_to,
+        offset=offset,
+        limit=limit
+    )
+    return make_outputs_response({
+        'version': version,
+        'reset': since is not None,
+        'output_files': output_files,
+        'total': total,
+        'offset': offset,
+        'limit': limit
+    }, version)
+
+@app.route('/catalog')
+def search_catalog():
+    """Search the generation history by word, character image, quality and date range"""
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = int(request.args.get('limit', app.config['OUTPUTS_PAGE_SIZE']))
+        limit = min(max(limit, 1), app.config['OUTPUTS_MAX_PAGE_SIZE'])
+        date_from = parse_date_arg(request.args.get('from'))
+        date_to = parse_date_arg(request.args.get('to'), end_of_day=True)
+    except ValueError:
+        return jsonify({'error': 'offset/limit must be integers and from/to must be YYYY-MM-DD dates'}), 400
+    
+    records = catalog.find(
+        word=request.args.get('word') or None,
+        character_image=request.args.get('character') or None,
+        quality=request.args.get('quality') or None,
+        date_from=date_from,
+        date_to=date_to,
+        offset=offset,
+        limit=limit
+    )
+    return jsonify({'records': records, 'offset': offset, 'limit': limit})
+
+@app.route('/catalog/costs')
+def catalog_costs():
+    """Report generation counts and costs, optionally grouped by day, word, quality or character image"""
+    try:
+        summary = catalog.cost_summary(
+            group_by=request.args.get('group_by') or None,
+            date_from=parse_date_arg(request.args.get('from')),
+            date_to=parse_date_arg(request.args.get('to'), end_of_day=True)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'summary': summary})
 
 @app.route('/view/<filename>')
 def view_output(filename):
     """Serve output HTML files"""
     file_path = os.path.join(app.config['OUTPUT_FOLDER'], secure_filename(filename))
     if os.path.exists(file_path):
-        return send_file(file_path)
+        return send_cached_file(file_path)
+    else:
+        return "File not found", 404
+
+@app.route('/view/assets/<filename>')
+def view_asset(filename):
+    """Serve shared viewer assets (content-hashed stylesheet)"""
+    file_path = os.path.join(app.config['OUTPUT_FOLDER'], HTMLGenerator.ASSETS_DIR, secure_filename(filename))
+    if os.path.exists(file_path):
+        return send_cached_file(file_path)
     else:
         return "File not found", 404
 
 @app.route('/view/images/<filename>')
 def view_image(filename):
-    """Serve generated images"""
-    file_path = os.path.join(app.config['OUTPUT_FOLDER'], 'images', secure_filename(filename))
-    if os.path.exists(file_path):
-        return send_file(file_path)
+    """Serve generated images and their thumbnail / WebP / AVIF renditions"""
+    images_dir = os.path.join(app.config['OUTPUT_FOLDER'], 'images')
+    filename = secure_filename(filename)
+    file_path = os.path.join(images_dir, filename)
+    if not os.path.exists(file_path):
+        # Renditions are built on first request when they do not exist yet
+        try:
+            file_path = derivatives.build_for_name(images_dir, filename)
+        except Exception as e:
+            print(f"Failed to build image rendition {filename}: {e}")
+            file_path = None
+    if file_path and os.path.exists(file_path):
+        return send_cached_file(file_path)
     else:
         return "Image not found", 404
 
-def parse_words(words_text):
-    """Parse words from text input, handling # notation for context"""
-    words = []
-    for line in words_text.strip().split('\n'):
-        line = line.strip()
-        if not line:
-            continue
-        
-        if '#' in line:
-            word, context = line.split('#', 1)
-            words.append({
-                'word': word.strip(),
-                'context': context.strip()
-            })
-        else:
-            words.append({
-                'word': line.strip(),
-                'context': ''
-            })
+def send_cached_file(file_path):
+    """Send a file with a strong ETag, conditional GET / Range support and cache headers"""
+    stat = os.stat(file_path)
+    immutable = FileETagCache.is_immutable(os.path.basename(file_path))
     
-    return words
+    # send_file answers If-None-Match / If-Modified-Since with 304 and Range with 206.
+    # Without max_age it sends "no-cache", so viewer pages (which can be regenerated
+    # under the same name) are always revalidated against the ETag.
+    response = send_file(
+        file_path,
+        etag=file_etags.get(file_path, stat),
+        last_modified=stat.st_mtime,
+        max_age=app.config['IMMUTABLE_MAX_AGE'] if immutable else None,
+        conditional=True
+    )
+    
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+def get_request_budget():
+    """Per-request budget from the form, clamped to the configured cap (None if unlimited)"""
+    cap = app.config['MAX_BATCH_BUDGET'] or None
+    try:
+        budget = float(request.form.get('budget', ''))
+    except ValueError:
+        return cap
+    if budget <= 0:
+        return cap
+    return min(budget, cap) if cap is not None else budget
+
+def estimate_batch(words, quality, base_image_path, concurrency):
+    """Estimated cost and wall-clock time of generating words"""
+    return cost_estimator.estimate(
+        len(words),
+        quality,
+        os.path.basename(base_image_path),
+        concurrency=concurrency,
+        image_requests_per_minute=app.config['OPENAI_IMAGE_RPM']
+    )
+
+def get_request_concurrency():
+    """Per-request concurrency from the form, clamped to the configured limit"""
+    limit = app.config['MAX_CONCURRENCY_PER_REQUEST']
+    try:
+        concurrency = int(request.form.get('concurrency', limit))
+    except ValueError:
+        concurrency = limit
+    return max(1, min(concurrency, limit))
+
+def parse_date_arg(value, end_of_day=False):
+    """Convert a YYYY-MM-DD query argument to a timestamp (None if missing)"""
+    if not value:
+        return None
+    day = datetime.strptime(value, '%Y-%m-%d')
+    if end_of_day:
+        day += timedelta(days=1)
+    return day.timestamp()
 
-def get_output_files():
-    """Get list of output HTML files with metadata"""
-    output_files = []
-    pattern = os.path.join(app.config['OUTPUT_FOLDER'], '*_viewer.html')
+def get_output_files(word=None, quality=None, date_from=None, date_to=None, offset=0, limit=None):
+    """Get a page of output HTML files with metadata (newest first) and the total match count"""
+    if limit is None:
+        limit = app.config['OUTPUTS_PAGE_SIZE']
     
-    for file_path in glob.glob(pattern):
-        filename = os.path.basename(file_path)
-        word = filename.replace('_viewer.html', '')
-        mtime = os.path.getmtime(file_path)
-        
-        output_files.append({
-            'filename': filename,
-            'word': word,
-            'modified': datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S'),
-            'url': url_for('view_output', filename=filename)
-        })
+    entries, total = output_index.query(word=word, quality=quality, date_from=date_from,
+                                        date_to=date_to, offset=offset, limit=limit)
+    return [output_file_dict(entry) for entry in entries], total
+
+def output_file_dict(entry):
+    """Convert an output index entry to the JSON shape used by /outputs"""
+    return {
+        'filename': entry.filename,
+        'word': entry.word,
+        'quality': entry.quality,
+        'modified': datetime.fromtimestamp(entry.mtime).strftime('%Y-%m-%d %H:%M:%S'),
+        'url': url_for('view_output', filename=entry.filename)
+    }
+
+def make_outputs_response(payload, version):
+    """Build an /outputs response tagged with the index version (None payload means 304)"""
+    if payload is None:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(payload)
     
-    # Sort by modification time (newest first)
-    output_files.sort(key=lambda x: x['modified'], reverse=True)
-    return output_files
+    # The ETag covers the query too, since each filter/page has its own body
+    response.set_etag(f"{version}-{request.query_string.decode('ascii', 'replace')}")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 if __name__ == '__main__':
     # Ensure output directories exist
     os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
     os.makedirs(os.path.join(app.config['OUTPUT_FOLDER'], 'images'), exist_ok=True)
+    init_storage()
     
     print("🚀 Word Image Maker Ver.2 - Web Application")
     print("📡 Starting server at http://localhost:5000")
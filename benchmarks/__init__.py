@@ -0,0 +1,7 @@
+"""
+オフラインのベンチマーク
+
+fake_openai は Chat Completions と画像編集のエンドポイントを真似るローカルの偽サーバー、
+run_benchmarks はそのサーバーに向けてCLIとWebアプリで一括生成を実行し、
+スループット・単語ごとの処理時間・最大メモリ使用量をJSONファイルに記録する。
+"""
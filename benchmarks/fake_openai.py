@@ -0,0 +1,375 @@
+"""
+OpenAI APIの偽サーバー
+
+/v1/chat/completions と /v1/images/edits だけを実装し、OpenAIClient が期待する形の応答
+（シーンのJSON、base64のPNG、usage、x-ratelimit-* ヘッダー）を返す。
+応答までの待ち時間の分布・エラー率・画像のサイズを指定できるので、料金をかけずに
+パイプラインのスループットを測れる。
+
+単体で起動する場合:
+    python -m benchmarks.fake_openai --port 8765 --image-latency lognormal:8,0.3
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python app.py
+"""
+
+import argparse
+import base64
+import itertools
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# 画像の出力トークン数（1024x1024）
+_IMAGE_OUTPUT_TOKENS = {"low": 272, "medium": 1056, "high": 4160, "auto": 1056}
+
+
+class LatencyDistribution:
+    def __init__(self, kind: str, params: List[float]):
+        """
+        応答までの待ち時間の分布
+
+        Args:
+            kind: fixed（秒）, uniform（最小,最大）, lognormal（中央値,σ）のいずれか
+            params: 分布のパラメータ
+        """
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected:
+            raise ValueError(f"待ち時間の分布が不正です: {kind}")
+        if len(params) != expected[kind]:
+            raise ValueError(f"{kind} のパラメータは{expected[kind]}個です: {params}")
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        """
+        「種類:パラメータ,...」形式の文字列から作成（数値だけの場合は fixed）
+
+        Args:
+            spec: 例 "0.5", "uniform:0.2,0.8", "lognormal:8,0.3"
+        """
+        kind, _, params = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+        return cls(kind.strip(), [float(value) for value in params.split(",") if value.strip()])
+
+    def sample(self, rng: random.Random) -> float:
+        """待ち時間（秒）を1つ取り出す"""
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(self.params[0], self.params[1])
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{','.join(format(value, 'g') for value in self.params)}"
+
+
+def make_png(approx_bytes: int, seed: int = 0, width: int = 1024) -> bytes:
+    """
+    おおよそ指定したサイズのPNGを作成
+
+    ランダムな画素は圧縮できないので、実際の生成画像と同じくらいのサイズになる。
+
+    Args:
+        approx_bytes: 目標のファイルサイズ（バイト）
+        seed: 画素の乱数の種
+        width: 画像の幅
+
+    Returns:
+        PNGのバイト列
+    """
+    rng = random.Random(seed)
+    row_bytes = width * 3
+    height = max(1, approx_bytes // (row_bytes + 1))
+    raw = b"".join(b"\x00" + rng.randbytes(row_bytes) for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b"")
+
+
+class FakeOpenAIServer:
+    # x-ratelimit-* ヘッダーで知らせる上限（クライアントのレート制限で律速しないよう大きくする）
+    RATE_LIMIT_REQUESTS = 100000
+    RATE_LIMIT_TOKENS = 100000000
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 chat_latency: str = "0.5", image_latency: str = "2",
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 image_bytes: int = 2 * 1024 * 1024, seed: int = 0):
+        """
+        偽サーバーを初期化
+
+        Args:
+            host: 待ち受けるアドレス
+            port: 待ち受けるポート（0 の場合は空いているポート）
+            chat_latency: Chat Completions の待ち時間の分布（LatencyDistribution.parse の形式）
+            image_latency: 画像編集の待ち時間の分布
+            error_rate: 500 を返す割合
+            rate_limit_rate: 429（retry-after-ms 付き）を返す割合
+            image_bytes: 返すPNGのおおよそのサイズ
+            seed: 待ち時間とエラーの乱数の種
+        """
+        self.chat_latency = LatencyDistribution.parse(chat_latency)
+        self.image_latency = LatencyDistribution.parse(image_latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.image_bytes = image_bytes
+        # 画像は1回だけ作ってbase64にしておく
+        self.image_b64 = base64.b64encode(make_png(image_bytes, seed)).decode("ascii")
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._stats = self._empty_stats()
+
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """OpenAIClient に渡すベースURL"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        """別スレッドで待ち受けを開始"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """現在のスレッドで待ち受ける（Ctrl+C などで止まるまで戻らない）"""
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        """待ち受けを終了"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self, reset: bool = False) -> Dict[str, Any]:
+        """
+        受けたリクエスト数・返したエラー数・送ったバイト数を取得
+
+        Args:
+            reset: True の場合は取得後に0に戻す
+        """
+        with self._lock:
+            stats = {key: dict(value) if isinstance(value, dict) else value for key, value in self._stats.items()}
+            if reset:
+                self._stats = self._empty_stats()
+        return stats
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def handle(self, endpoint: str, body: bytes):
+        """
+        1リクエスト分の応答を作成（待ち時間のあいだ呼び出し元のスレッドを止める）
+
+        Args:
+            endpoint: 'chat' または 'image'
+            body: リクエスト本文
+
+        Returns:
+            (ステータスコード, 追加ヘッダー, JSON化する応答)
+        """
+        with self._lock:
+            self._stats["requests"][endpoint] += 1
+            latency = (self.chat_latency if endpoint == "chat" else self.image_latency).sample(self._rng)
+            roll = self._rng.random()
+        time.sleep(latency)
+
+        if roll < self.rate_limit_rate:
+            self._count("rate_limited")
+            return 429, {"retry-after-ms": "100"}, _error("Rate limit reached (fake)", "requests", "rate_limit_exceeded")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self._count("errors")
+            return 500, {}, _error("The server had an error (fake)", "server_error", None)
+
+        payload = self._chat_response(body) if endpoint == "chat" else self._image_response(body)
+        headers = {
+            "x-ratelimit-limit-requests": str(self.RATE_LIMIT_REQUESTS),
+            "x-ratelimit-remaining-requests": str(self.RATE_LIMIT_REQUESTS - 1),
+            "x-ratelimit-limit-tokens": str(self.RATE_LIMIT_TOKENS),
+            "x-ratelimit-remaining-tokens": str(self.RATE_LIMIT_TOKENS - 1)
+        }
+        return 200, headers, payload
+
+    def _chat_response(self, body: bytes) -> Dict[str, Any]:
+        request = json.loads(body)
+        messages = request.get("messages", [])
+        system_prompt = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user_prompt = next((m["content"] for m in messages if m.get("role") == "user"), "")
+        words = [word.strip() for word in re.findall(r"英単語: ([^\n（]+)", user_prompt)]
+
+        scenes = [_scene(word) for word in words]
+        answer = scenes if "JSON配列" in system_prompt else (scenes[0] if scenes else {})
+        content = "```json\n" + json.dumps(answer, ensure_ascii=False, indent=2) + "\n```"
+
+        prompt_tokens = (len(system_prompt) + len(user_prompt)) // 2
+        completion_tokens = len(content) // 2
+        return {
+            "id": f"chatcmpl-fake-{next(self._ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", ""),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def _image_response(self, body: bytes) -> Dict[str, Any]:
+        # multipart の本文から品質とプロンプトの長さだけを読む
+        quality = re.search(rb'name="quality"\r\n\r\n(\w+)', body)
+        quality = quality.group(1).decode() if quality else "auto"
+        prompt = re.search(rb'name="prompt"\r\n\r\n(.*?)\r\n--', body, re.DOTALL)
+        text_tokens = len(prompt.group(1)) // 4 if prompt else 0
+        image_tokens = 323
+        output_tokens = _IMAGE_OUTPUT_TOKENS.get(quality, _IMAGE_OUTPUT_TOKENS["auto"])
+        self._count("image_bytes", len(self.image_b64))
+        return {
+            "created": int(time.time()),
+            "data": [{"b64_json": self.image_b64}],
+            "usage": {
+                "total_tokens": text_tokens + image_tokens + output_tokens,
+                "input_tokens": text_tokens + image_tokens,
+                "output_tokens": output_tokens,
+                "input_tokens_details": {"text_tokens": text_tokens, "image_tokens": image_tokens}
+            }
+        }
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, Any]:
+        return {"requests": {"chat": 0, "image": 0}, "errors": 0, "rate_limited": 0, "image_bytes": 0}
+
+
+def _scene(word: str) -> Dict[str, str]:
+    return {
+        "word": word,
+        "scene_description": f"猫とねずみが「{word}」を表す場面を演じている。猫は目を輝かせ、ねずみは隣で身を乗り出している。",
+        "core_image": f"「{word}」の中心的な意味を表すベンチマーク用のコアイメージ。",
+        "illustration_prompt": (f"A friendly cat and a small mouse acting out the meaning of '{word}' "
+                                "in a bright, simple picture-book style. No text, no words, no dialogue.")
+    }
+
+
+def _error(message: str, error_type: str, code: Optional[str]) -> Dict[str, Any]:
+    return {"error": {"message": message, "type": error_type, "param": None, "code": code}}
+
+
+def _make_handler(server: FakeOpenAIServer):
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive を有効にして、実際のAPIと同じく接続プールが再利用されるようにする
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self._read_body()
+            if self.path.endswith("/chat/completions"):
+                endpoint = "chat"
+            elif self.path.endswith("/images/edits"):
+                endpoint = "image"
+            else:
+                self._send(404, {}, _error(f"Unknown path: {self.path}", "invalid_request_error", None))
+                return
+            self._send(*server.handle(endpoint, body))
+
+        def _read_body(self) -> bytes:
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().split(b";")[0], 16)
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+                    if size == 0:
+                        return b"".join(chunks)
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _send(self, status: int, headers: Dict[str, str], payload: Dict[str, Any]):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            # リクエストごとのアクセスログは出さない
+            pass
+
+    return Handler
+
+
+def main():
+    """偽サーバーを単体で起動"""
+    parser = argparse.ArgumentParser(description="OpenAI APIの偽サーバー（ベンチマーク用）")
+    add_server_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=8765, help="待ち受けるポート")
+    args = parser.parse_args()
+
+    server = create_server(args, host=args.host, port=args.port)
+    print(f"偽サーバーを起動しました: {server.base_url}（Ctrl+C で終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats(), ensure_ascii=False))
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """偽サーバーの設定をコマンドライン引数に追加"""
+    parser.add_argument("--chat-latency", default="lognormal:2,0.3",
+                        help="Chat Completions の待ち時間（秒。fixed / uniform:最小,最大 / lognormal:中央値,σ）")
+    parser.add_argument("--image-latency", default="lognormal:8,0.3", help="画像編集の待ち時間（形式は同上）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500 を返す割合")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429 を返す割合")
+    parser.add_argument("--image-bytes", type=int, default=2 * 1024 * 1024, help="返すPNGのおおよそのサイズ（バイト）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+
+
+def create_server(args: argparse.Namespace, host: str = "127.0.0.1", port: int = 0) -> FakeOpenAIServer:
+    """add_server_arguments で追加した引数から偽サーバーを作成"""
+    return FakeOpenAIServer(
+        host=host,
+        port=port,
+        chat_latency=args.chat_latency,
+        image_latency=args.image_latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        image_bytes=args.image_bytes,
+        seed=args.seed
+    )
+
+
+if __name__ == "__main__":
+    main()
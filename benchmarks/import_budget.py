@@ -0,0 +1,179 @@
+"""
+起動時の読み込み時間の予算チェック
+
+CLI（src.main）とWebアプリ（app）を `python -X importtime` で読み込み、
+- openai・PIL・requests など重い依存を起動時に読み込んでいないこと
+- 読み込み時間（インタープリター自体の起動分を除く）の中央値が予算内であること
+- 読み込むだけでは output/ に何も書き込まないこと
+を確認する。生成済みのビューア・画像・一覧ページがある output/ を作業ディレクトリに用意して
+読み込むので、起動時の走査やページの作り直しも読み込み時間に表れる。
+満たさない場合は終了コード 1 で終わるので、CIやコミット前のチェックに使える。
+
+使用例:
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --cli-budget-ms 80 --runs 5 --outputs 2000
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Set, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 起動時に読み込んではいけないモジュール（最初に使うときに読み込む）
+LAZY_MODULES = ("openai", "PIL", "requests", "httpx", "pydantic")
+
+# 対象ごとの読み込むモジュールと、読み込み時間の予算（ミリ秒）の既定値
+TARGETS = {
+    "cli": ("src.main", 100.0),
+    "app": ("app", 400.0)
+}
+
+# 用意する output/ の生成済みビューアの数の既定値
+DEFAULT_OUTPUTS = 500
+
+
+def populate_output(cwd: str, count: int):
+    """
+    作業ディレクトリに生成済みの output/ を用意（ビューアHTML・元画像・一覧ページ）
+
+    Args:
+        cwd: 作業ディレクトリ
+        count: ビューアの数
+    """
+    output_dir = os.path.join(cwd, "output")
+    images_dir = os.path.join(output_dir, "images")
+    os.makedirs(images_dir, exist_ok=True)
+    for index in range(count):
+        image_name = f"word{index:05d}_20250101_000000.png"
+        with open(os.path.join(images_dir, image_name), "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+        with open(os.path.join(output_dir, f"word{index:05d}_auto_viewer.html"), "w", encoding="utf-8") as f:
+            f.write(f'<html><body><img src="images/{image_name}"></body></html>')
+    with open(os.path.join(output_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write('<html><head><meta http-equiv="refresh" content="0; url=gallery_0001.html"></head></html>')
+
+
+def snapshot(directory: str) -> Dict[str, Tuple[int, int]]:
+    """ディレクトリ以下のファイルごとの（サイズ, 更新時刻）。ディレクトリは有無だけを見る"""
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        for name in dirs:
+            files[os.path.relpath(os.path.join(root, name), directory) + os.sep] = (0, 0)
+        for name in names:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files[os.path.relpath(path, directory)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def measure(module: str, cwd: str) -> Tuple[float, Set[str]]:
+    """
+    モジュールを新しいインタープリターで読み込み、読み込み時間と読み込まれたモジュールを取得
+
+    Args:
+        module: 読み込むモジュール名
+        cwd: 作業ディレクトリ（populate_output で output/ を用意した一時ディレクトリ）
+
+    Returns:
+        (インタープリター起動分を除いた読み込み時間（ミリ秒）, 読み込まれたモジュール名)
+    """
+    baseline = _importtime("pass", cwd)
+    entries = _importtime(f"import {module}", cwd)
+    startup = {name for name, _, _ in baseline}
+    # 最上位の読み込みのうち、空のスクリプトでも読み込まれるもの（site など）を除いて合計する
+    total_us = sum(cumulative for name, cumulative, top_level in entries if top_level and name not in startup)
+    return total_us / 1000.0, {name for name, _, _ in entries}
+
+
+def _importtime(code: str, cwd: str) -> List[Tuple[str, int, bool]]:
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                               cwd=cwd, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"'{code}' の実行に失敗しました:\n{completed.stderr[-2000:]}")
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(cumulative), not name[1:].startswith(" ")))
+    return entries
+
+
+def check(target: str, budget_ms: float, runs: int, outputs: int = DEFAULT_OUTPUTS) -> Dict[str, object]:
+    """
+    1つの対象を runs 回計測して予算と比べる
+
+    Args:
+        target: TARGETS のキー
+        budget_ms: 読み込み時間の予算（ミリ秒）
+        runs: 計測回数
+        outputs: 用意する output/ の生成済みビューアの数
+
+    Returns:
+        計測結果（median_ms, budget_ms, eager_modules, output_changes, ok）
+    """
+    module = TARGETS[target][0]
+    timings = []
+    eager = set()
+    with tempfile.TemporaryDirectory(prefix="word-image-import-") as cwd:
+        populate_output(cwd, outputs)
+        before = snapshot(os.path.join(cwd, "output"))
+        for _ in range(runs):
+            elapsed, modules = measure(module, cwd)
+            timings.append(elapsed)
+            eager |= {name for name in modules if name.split(".")[0] in LAZY_MODULES}
+        after = snapshot(os.path.join(cwd, "output"))
+
+    median = statistics.median(timings)
+    top_level_eager = sorted({name.split(".")[0] for name in eager})
+    output_changes = sorted(path for path in before.keys() | after.keys() if before.get(path) != after.get(path))
+    return {
+        "target": target,
+        "module": module,
+        "median_ms": median,
+        "budget_ms": budget_ms,
+        "eager_modules": top_level_eager,
+        "output_changes": output_changes,
+        "ok": median <= budget_ms and not top_level_eager and not output_changes
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時の読み込み時間の予算チェック")
+    for target, (module, budget) in TARGETS.items():
+        parser.add_argument(f"--{target}-budget-ms", type=float, default=budget,
+                            help=f"{module} の読み込み時間の予算（ミリ秒）")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="チェックする対象（カンマ区切り）")
+    parser.add_argument("--runs", type=int, default=3, help="計測回数（中央値で比べる）")
+    parser.add_argument("--outputs", type=int, default=DEFAULT_OUTPUTS,
+                        help="作業ディレクトリの output/ に用意する生成済みビューアの数")
+    args = parser.parse_args()
+
+    failed = False
+    for target in [name.strip() for name in args.targets.split(",") if name.strip()]:
+        if target not in TARGETS:
+            parser.error(f"不明な対象です: {target}")
+        result = check(target, getattr(args, f"{target}_budget_ms"), max(args.runs, 1), max(args.outputs, 0))
+        status = "OK" if result["ok"] else "NG"
+        print(f"[{status}] {result['module']:<9} {result['median_ms']:7.1f} ms（予算 {result['budget_ms']:.0f} ms）")
+        if result["eager_modules"]:
+            print(f"       起動時に読み込まれた重い依存: {', '.join(result['eager_modules'])}")
+        if result["output_changes"]:
+            changes = result["output_changes"]
+            print(f"       読み込み時に変更された output/ のファイル: {', '.join(changes[:5])}"
+                  + (f" ほか {len(changes) - 5} 件" if len(changes) > 5 else ""))
+        failed = failed or not result["ok"]
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+偽サーバーを使ったスループットのベンチマーク
+
+CLI（python -m src.main）とWebアプリ（/generate から /jobs/<id> の完了まで）のそれぞれで、
+単語数と同時実行数の組み合わせごとに一括生成を実行する。Webアプリはサムネイルの作成方法
+（WORD_IMAGE_DERIVATIVES の eager / lazy）ごとにも実行する。シナリオは一時ディレクトリの
+別プロセスで実行し、次の値をJSONファイルに記録する。
+
+- generation_seconds: ジョブの開始（CLI はプロセスの起動、Webアプリは /generate の送信）から、
+  最後に成功した単語のトレースの終了まで
+- words_per_minute: generation_seconds あたりの成功した単語数
+- drain_seconds: 最後の単語の完了後、バックグラウンドのサムネイル作成が終わるまでの時間
+  （CLI は終了時にサムネイルを待つので、プロセスの終了まで）
+- latency_p50_seconds / latency_p95_seconds: 単語ごとのトレース（最初のスパンの開始から
+  最後のスパンの終了まで。Webアプリでは待ち行列の時間を含む）の百分位点
+- peak_rss_bytes: プロセスの最大常駐メモリ
+- Webアプリのみ startup_seconds / job_seconds: アプリの読み込みと output/ の準備（init_storage）、
+  ジョブの開始から完了までの時間
+
+偽サーバーの画像はランダムな画素なので、サムネイル・WebP版の作成は実際の画像より重くなる。
+CLI は単語を1つずつ処理するので、同時実行数とサムネイルの作成方法を変えるのはWebアプリだけ。
+
+使用例:
+    python -m benchmarks.run_benchmarks --batch-sizes 1,10,50 --concurrency 1,4,8
+    python -m benchmarks.run_benchmarks --paths web --derivatives lazy --error-rate 0.05 --output results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .fake_openai import add_server_arguments, create_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+CHARACTER_IMAGE = "cat_and_mouse.png"
+DERIVATIVES_MODES = ("eager", "lazy")
+
+
+def run_scenario(path: str, batch_size: int, concurrency: int, base_url: str, keep: bool = False,
+                 derivatives: str = "eager") -> Dict[str, Any]:
+    """
+    1つのシナリオを一時ディレクトリの別プロセスで実行
+
+    Args:
+        path: 'cli' または 'web'
+        batch_size: 生成する単語数
+        concurrency: 同時に生成する単語数（Webアプリのみ）
+        base_url: 偽サーバーのベースURL
+        keep: True の場合は一時ディレクトリを削除しない
+        derivatives: サムネイルの作成方法 'eager' または 'lazy'（Webアプリのみ）
+
+    Returns:
+        シナリオの計測結果
+    """
+    workdir = tempfile.mkdtemp(prefix=f"word-image-bench-{path}-")
+    try:
+        shutil.copytree(os.path.join(REPO_ROOT, "image"), os.path.join(workdir, "image"))
+        words_file = os.path.join(workdir, "words.txt")
+        with open(words_file, "w", encoding="utf-8") as f:
+            f.write("".join(f"bench{index:04d}\n" for index in range(batch_size)))
+        trace_file = os.path.join(workdir, "trace.json")
+
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT, OPENAI_BASE_URL=base_url, OPENAI_API_KEY="sk-benchmark")
+        if path == "cli":
+            command = [
+                sys.executable, "-m", "src.main",
+                "--words-file", words_file,
+                "--no-browser",
+                "--no-cache",
+                "--base-image", os.path.join("image", CHARACTER_IMAGE),
+                "--trace-file", trace_file
+            ]
+        else:
+            env.update({
+                "WORD_IMAGE_TRACE_FILE": trace_file,
+                "WORD_IMAGE_MAX_CONCURRENCY": str(concurrency),
+                "WORD_IMAGE_MAX_WORKERS": str(max(concurrency, 8)),
+                "WORD_IMAGE_MAX_BATCH_BUDGET": "0",
+                "WORD_IMAGE_KEY_DAILY_BUDGET": "0",
+                "WORD_IMAGE_DERIVATIVES": derivatives
+            })
+            command = [sys.executable, "-m", "benchmarks.run_benchmarks", "--web-worker", words_file,
+                       "--concurrency", str(concurrency)]
+        worker_file = os.path.join(workdir, "web_worker.json")
+
+        with open(os.path.join(workdir, "run.log"), "wb") as log:
+            started_at = time.time()
+            started = time.perf_counter()
+            exit_code, peak_rss = _run_process(command, workdir, env, log)
+            wall_seconds = time.perf_counter() - started
+            exited_at = time.time()
+
+        worker = {}
+        if path == "web" and os.path.exists(worker_file):
+            with open(worker_file, encoding="utf-8") as f:
+                worker = json.load(f)
+
+        succeeded = _succeeded_words(os.path.join(workdir, "output", "catalog.sqlite3"))
+        windows = {word: window for word, window in _word_windows(trace_file).items() if word in succeeded}
+        latencies = sorted(end - start for start, end in windows.values())
+        # 終了時に待つバックグラウンド処理を含めないよう、最後の単語の完了までで割る
+        job_started_at = worker.pop("job_started_at", started_at)
+        last_finished_at = max((end for _, end in windows.values()), default=None)
+        generation_seconds = last_finished_at - job_started_at if last_finished_at is not None else None
+        if path == "cli" and last_finished_at is not None:
+            drain_seconds = exited_at - last_finished_at
+        else:
+            drain_seconds = worker.pop("drain_seconds", None)
+
+        result = {
+            "path": path,
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+            "derivatives": derivatives if path == "web" else "eager",
+            "exit_code": exit_code,
+            "words_succeeded": len(succeeded),
+            "words_failed": batch_size - len(succeeded),
+            "wall_seconds": wall_seconds,
+            "generation_seconds": generation_seconds,
+            "words_per_minute": len(succeeded) * 60.0 / generation_seconds if generation_seconds else 0.0,
+            "drain_seconds": drain_seconds,
+            "latency_p50_seconds": percentile(latencies, 0.5),
+            "latency_p95_seconds": percentile(latencies, 0.95),
+            "peak_rss_bytes": peak_rss
+        }
+        result.update(worker)
+        if keep:
+            result["workdir"] = workdir
+        return result
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run_process(command: List[str], cwd: str, env: Dict[str, str], log) -> tuple:
+    """
+    プロセスを実行して終了を待つ
+
+    Returns:
+        (終了コード, 最大常駐メモリのバイト数。取得できない環境では None)
+    """
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+
+    # wait4 ならこのプロセスだけの使用量が取れる（RUSAGE_CHILDREN はそれまでの子プロセスの最大値）
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # Linux は KB 単位、macOS はバイト単位
+    peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return process.returncode, peak_rss
+
+
+def _succeeded_words(catalog_path: str) -> set:
+    """カタログに記録された（成功した）単語"""
+    if not os.path.exists(catalog_path):
+        return set()
+    conn = sqlite3.connect(catalog_path)
+    try:
+        return {row[0] for row in conn.execute("SELECT word FROM generations")}
+    finally:
+        conn.close()
+
+
+def _word_windows(trace_file: str) -> Dict[str, tuple]:
+    """トレースファイルから単語ごとの処理の開始・終了時刻（UNIX時刻の秒）を求める"""
+    if not os.path.exists(trace_file):
+        return {}
+    with open(trace_file, encoding="utf-8") as f:
+        # 閉じ括弧のない配列形式なので、最後のカンマを外して閉じる
+        events = json.loads(f.read().rstrip().rstrip(",") + "]")
+
+    spans: Dict[str, List[float]] = {}
+    for event in events:
+        if event.get("ph") != "X":
+            continue
+        word = event["args"]["word"]
+        start, end = event["ts"], event["ts"] + event["dur"]
+        if word in spans:
+            spans[word] = [min(spans[word][0], start), max(spans[word][1], end)]
+        else:
+            spans[word] = [start, end]
+    return {word: (start / 1_000_000, end / 1_000_000) for word, (start, end) in spans.items()}
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """昇順に並んだ値の百分位点（線形補間。値がなければ None）"""
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def web_worker(words_file: str, concurrency: int):
+    """
+    Webアプリを読み込み、テストクライアントで1つのジョブを最後まで実行する
+
+    別プロセス（run_scenario）から呼び出す。作業ディレクトリは一時ディレクトリになっている。
+    読み込みとジョブの所要時間、ジョブの開始時刻、ジョブの完了後にバックグラウンドの
+    サムネイル作成を待った時間は web_worker.json に書き出す。
+    """
+    started = time.perf_counter()
+    import app as web_app
+    web_app.init_storage()
+    client = web_app.app.test_client()
+    booted = time.perf_counter()
+
+    with open(words_file, encoding="utf-8") as f:
+        words = f.read()
+    job_started_at = time.time()
+    response = client.post("/generate", data={
+        "api_key": os.environ["OPENAI_API_KEY"],
+        "words": words,
+        "quality": "auto",
+        "character_image": CHARACTER_IMAGE,
+        "no_cache": "1",
+        "concurrency": str(concurrency)
+    })
+    if response.status_code != 202:
+        print(f"ジョブを開始できませんでした: {response.status_code} {response.get_data(as_text=True)}")
+        sys.exit(1)
+
+    status_url = response.get_json()["status_url"]
+    while True:
+        job = client.get(status_url).get_json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.05)
+    finished = time.perf_counter()
+    web_app.derivatives.wait()
+    drained = time.perf_counter()
+    print(f"起動 {booted - started:.2f} 秒、ジョブ {finished - booted:.2f} 秒、"
+          f"サムネイル待ち {drained - finished:.2f} 秒: {job['progress']}")
+    with open("web_worker.json", "w", encoding="utf-8") as f:
+        json.dump({"startup_seconds": booted - started, "job_seconds": finished - booted,
+                   "job_started_at": job_started_at, "drain_seconds": drained - finished}, f)
+
+
+def git_revision() -> Dict[str, Any]:
+    """現在のコミットと、未コミットの変更があるか"""
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+
+    try:
+        return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def print_result(result: Dict[str, Any]):
+    def seconds(value):
+        return "-" if value is None else f"{value:.2f}s"
+
+    rss = result["peak_rss_bytes"]
+    print(f"{result['path']:<4} words={result['batch_size']:<4} concurrency={result['concurrency']:<3} "
+          f"derivatives={result['derivatives']:<5} "
+          f"ok={result['words_succeeded']:<4} {result['words_per_minute']:7.1f} words/min  "
+          f"p50={seconds(result['latency_p50_seconds'])} p95={seconds(result['latency_p95_seconds'])}  "
+          f"drain={seconds(result['drain_seconds'])}  "
+          f"rss={'-' if rss is None else f'{rss / 1024 / 1024:.0f}MB'}")
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="偽のOpenAIサーバーを使ったスループットのベンチマーク")
+    parser.add_argument("--paths", default="cli,web", help="計測する経路（cli, web のカンマ区切り）")
+    parser.add_argument("--batch-sizes", type=parse_int_list, default=[1, 10, 50], help="単語数（カンマ区切り）")
+    parser.add_argument("--concurrency", type=parse_int_list, default=[1, 4, 8],
+                        help="Webアプリの同時実行数（カンマ区切り）")
+    parser.add_argument("--derivatives", default=",".join(DERIVATIVES_MODES),
+                        help="Webアプリのサムネイルの作成方法（eager, lazy のカンマ区切り）")
+    parser.add_argument("--output", help="結果のJSONファイル（省略時は benchmarks/results/<日時>_<コミット>.json）")
+    parser.add_argument("--keep", action="store_true", help="シナリオごとの一時ディレクトリを残す")
+    parser.add_argument("--web-worker", metavar="WORDS_FILE", help=argparse.SUPPRESS)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    if args.web_worker:
+        web_worker(args.web_worker, args.concurrency[0])
+        return
+
+    paths = [path.strip() for path in args.paths.split(",") if path.strip()]
+    unknown = set(paths) - {"cli", "web"}
+    if unknown:
+        parser.error(f"不明な経路です: {', '.join(sorted(unknown))}")
+    derivatives_modes = [mode.strip() for mode in args.derivatives.split(",") if mode.strip()]
+    unknown = set(derivatives_modes) - set(DERIVATIVES_MODES)
+    if unknown:
+        parser.error(f"不明なサムネイルの作成方法です: {', '.join(sorted(unknown))}")
+
+    revision = git_revision()
+    server = create_server(args)
+    results = []
+    with server:
+        print(f"偽サーバー: {server.base_url}（chat {server.chat_latency}, image {server.image_latency}）")
+        for path in paths:
+            for batch_size in args.batch_sizes:
+                for concurrency in (args.concurrency if path == "web" else [1]):
+                    for derivatives in (derivatives_modes if path == "web" else ["eager"]):
+                        result = run_scenario(path, batch_size, concurrency, server.base_url, keep=args.keep,
+                                              derivatives=derivatives)
+                        result["server"] = server.stats(reset=True)
+                        results.append(result)
+                        print_result(result)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "server": {
+            "chat_latency": str(server.chat_latency),
+            "image_latency": str(server.image_latency),
+            "error_rate": server.error_rate,
+            "rate_limit_rate": server.rate_limit_rate,
+            "image_bytes": server.image_bytes,
+            "seed": args.seed
+        },
+        "results": results
+    }
+
+    output = args.output
+    if not output:
+        commit = (revision["commit"] or "unknown")[:10] + ("-dirty" if revision["dirty"] else "")
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit}.json")
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {output}")
+
+
+if __name__ == "__main__":
+    main()
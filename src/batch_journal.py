@@ -0,0 +1,173 @@
+"""
+CLIの一括生成のチェックポイントジャーナル
+
+単語リストごとに追記専用のJSONLファイル（output/batches/batch_<ID>.jsonl）を持ち、
+単語の生成が終わるたびに成果物のパスとコストを1行追記する。途中で中断やクラッシュが
+起きても、--resume で再実行すれば完了済みの単語を飛ばし、APIの呼び出しを繰り返さない。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class BatchJournal:
+    # ジャーナルの保存先
+    JOURNAL_DIR = "output/batches"
+
+    def __init__(self, path: str, resume: bool = False):
+        """
+        ジャーナルを開く
+
+        Args:
+            path: ジャーナルファイルのパス
+            resume: True の場合は既存の記録を読み込んで追記する。
+                    False の場合は新しいバッチとして記録をやり直す
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._completed: Dict[tuple, Dict[str, Any]] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if resume:
+            self._load()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        if resume and self._file.tell() > 0 and not self._ends_with_newline():
+            # 中断で途切れた行の後ろに続けて書かないよう改行で区切る
+            self._file.write("\n")
+
+    @staticmethod
+    def batch_id(words: List[Dict[str, str]], base_image_path: str, quality: str) -> str:
+        """
+        単語リスト・ベース画像・品質からバッチIDを作成
+
+        Returns:
+            SHA-256 の先頭16文字
+        """
+        payload = json.dumps([words, os.path.basename(base_image_path), quality], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def for_batch(cls, words: List[Dict[str, str]], base_image_path: str, quality: str,
+                  resume: bool = False, journal_dir: str = JOURNAL_DIR) -> "BatchJournal":
+        """
+        単語リストに対応するジャーナルを開く
+
+        Args:
+            words: parse_words 形式の単語リスト
+            base_image_path: ベースキャラクター画像のパス
+            quality: 画像品質
+            resume: 既存の記録から再開するか
+            journal_dir: ジャーナルの保存先
+
+        Returns:
+            BatchJournal
+        """
+        batch_id = cls.batch_id(words, base_image_path, quality)
+        journal = cls(os.path.join(journal_dir, f"batch_{batch_id}.jsonl"), resume=resume)
+        journal.append({"event": "start", "batch_id": batch_id, "words": len(words), "resumed": resume})
+        return journal
+
+    def completed(self, word: str, context: str = "") -> Optional[Dict[str, Any]]:
+        """
+        完了済みの単語の記録を取得
+
+        成果物（画像とビューア）が消えている場合は未完了として扱う。
+
+        Args:
+            word: 英単語
+            context: 補足情報
+
+        Returns:
+            完了の記録（未完了の場合は None）
+        """
+        entry = self._completed.get((word, context))
+        if entry is None:
+            return None
+        if not (os.path.exists(entry["image_path"]) and os.path.exists(entry["html_path"])):
+            return None
+        return entry
+
+    def record_done(self, result: Dict[str, Any]):
+        """
+        単語の生成完了を記録
+
+        Args:
+            result: WordImageMaker.generate_word_image の成功結果
+        """
+        cost_info = result.get("cost_info", {})
+        entry = {
+            "event": "done",
+            "word": result["word"],
+            "context": result.get("context", ""),
+            "image_path": result["image_path"],
+            "html_path": result["html_path"],
+            "total_cost": cost_info.get("total_cost", 0.0),
+            "cost_info": {key: value for key, value in cost_info.items()
+                          if key not in ("image_usage", "image_attempts")},
+            "scene_data": result.get("scene_data", {})
+        }
+        self.append(entry)
+        self._completed[(entry["word"], entry["context"])] = entry
+
+    def record_failed(self, word: str, context: str, error: str):
+        """
+        単語の生成失敗を記録（再開時は再試行される）
+
+        Args:
+            word: 英単語
+            context: 補足情報
+            error: エラーメッセージ
+        """
+        self.append({"event": "failed", "word": word, "context": context, "error": error})
+
+    def append(self, entry: Dict[str, Any]):
+        """
+        1行追記してディスクに書き出す
+
+        Args:
+            entry: 記録する内容
+        """
+        entry = dict(entry, time=time.time())
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """ジャーナルを閉じる"""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 書き込み途中で中断された最終行は読み飛ばす
+                        continue
+                    if entry.get("event") == "done":
+                        self._completed[(entry["word"], entry.get("context", ""))] = entry
+        except FileNotFoundError:
+            pass
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
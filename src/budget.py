@@ -0,0 +1,124 @@
+"""
+生成コストの予算管理
+
+単語の生成を始める前に見込みコストを予約し、終わったら実際のコストで精算する。
+予約済みの分も使用済みとして数えるので、並列に実行していても上限を超えて
+新しい単語の生成を始めることはない。リクエストごとの予算の上にAPIキーごとの
+1日の予算を重ねられる。
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class Budget:
+    def __init__(self, limit: Optional[float], parent: Optional["Budget"] = None, daily: bool = False):
+        """
+        予算を初期化
+
+        Args:
+            limit: 上限（USD。None の場合は無制限）
+            parent: あわせて予約する上位の予算（APIキーごとの予算など）
+            daily: True の場合は日付が変わったら使用済みの額を0に戻す
+        """
+        self.limit = limit
+        self.parent = parent
+        self.daily = daily
+        self._spent = 0.0
+        self._reserved = 0.0
+        self._day = self._today()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> bool:
+        """
+        見込みコストを予約
+
+        Args:
+            amount: 予約する額（USD）
+
+        Returns:
+            予約できたか（上限を超える場合は False で、何も予約しない）
+        """
+        with self._lock:
+            self._roll_over()
+            if self.limit is not None and self._spent + self._reserved + amount > self.limit:
+                return False
+            self._reserved += amount
+
+        if self.parent is not None and not self.parent.reserve(amount):
+            with self._lock:
+                self._reserved -= amount
+            return False
+        return True
+
+    def settle(self, reserved: float, actual: float):
+        """
+        予約を実際のコストで精算
+
+        Args:
+            reserved: reserve で予約した額
+            actual: 実際にかかったコスト
+        """
+        with self._lock:
+            self._roll_over()
+            self._reserved = max(self._reserved - reserved, 0.0)
+            self._spent += actual
+        if self.parent is not None:
+            self.parent.settle(reserved, actual)
+
+    @property
+    def remaining(self) -> Optional[float]:
+        """予約分を除いた残りの額（無制限の場合は None。上位の予算も考慮する）"""
+        with self._lock:
+            self._roll_over()
+            remaining = None if self.limit is None else max(self.limit - self._spent - self._reserved, 0.0)
+        if self.parent is not None:
+            parent_remaining = self.parent.remaining
+            if parent_remaining is not None:
+                remaining = parent_remaining if remaining is None else min(remaining, parent_remaining)
+        return remaining
+
+    def stats(self) -> Dict[str, Any]:
+        """上限・使用済み・予約中の額を取得"""
+        with self._lock:
+            self._roll_over()
+            return {
+                "limit": self.limit,
+                "spent": self._spent,
+                "reserved": self._reserved
+            }
+
+    def _roll_over(self):
+        if not self.daily:
+            return
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._spent = 0.0
+
+    @staticmethod
+    def _today() -> str:
+        return time.strftime("%Y-%m-%d")
+
+
+class BudgetRegistry:
+    def __init__(self, daily_limit: Optional[float]):
+        """
+        APIキーごとの1日の予算を保持するレジストリ
+
+        Args:
+            daily_limit: APIキーごとの1日の上限（USD。None の場合は無制限）
+        """
+        self.daily_limit = daily_limit
+        self._budgets: Dict[str, Budget] = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str) -> Budget:
+        """APIキーに対応する予算を取得（なければ作成）"""
+        with self._lock:
+            budget = self._budgets.get(api_key)
+            if budget is None:
+                budget = Budget(self.daily_limit, daily=True)
+                self._budgets[api_key] = budget
+            return budget
@@ -0,0 +1,147 @@
+"""
+OpenAI APIの応答の記録と再生（カセット）
+
+record モードでは、実際のAPIの応答（usage を含む）をリクエストの内容から求めたキーで
+ディレクトリに1件1ファイルで保存する。replay モードでは、同じリクエストに対して記録済みの
+応答を返し、ネットワークにもレート制限にも触れない。同じ単語リスト・設定で実行し直せば
+シーン生成から画像保存・HTML生成・コスト計算までを無料で、毎回同じ結果で再現できる。
+
+キーはリクエストの全引数（プロンプト、モデル、温度、品質、ベース画像の内容のハッシュなど）から
+作るので、単語の順序や一括生成のまとめ方が変わると記録と一致しなくなる。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict
+
+from .errors import CassetteMissError
+
+
+class Cassette:
+    MODES = ("record", "replay")
+
+    def __init__(self, directory: str, mode: str):
+        """
+        カセットを開く
+
+        Args:
+            directory: 応答を保存するディレクトリ
+            mode: 'record'（実際に呼び出して保存）または 'replay'（保存済みの応答を返す）
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"カセットのモードが不正です: {mode}")
+        if mode == "replay" and not os.path.isdir(directory):
+            raise FileNotFoundError(f"カセットのディレクトリが見つかりません: {directory}")
+        self.directory = directory
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "replayed": 0, "missed": 0}
+
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @staticmethod
+    def make_key(endpoint: str, request: Dict[str, Any]) -> str:
+        """
+        リクエストからキーを生成
+
+        Args:
+            endpoint: 'chat' または 'image'
+            request: APIに渡す引数（アップロードするバイト列はハッシュに置き換える）
+
+        Returns:
+            SHA-256 の16進文字列
+        """
+        payload = json.dumps([endpoint, _normalize(request)], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def play(self, endpoint: str, request: Dict[str, Any]) -> Any:
+        """
+        記録済みの応答を返す
+
+        Args:
+            endpoint: 'chat' または 'image'
+            request: APIに渡すはずだった引数
+
+        Returns:
+            SDKの応答オブジェクト（ChatCompletion または ImagesResponse）
+
+        Raises:
+            CassetteMissError: 同じリクエストの記録がない場合
+        """
+        key = self.make_key(endpoint, request)
+        try:
+            with open(self._path(endpoint, key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            self._count("missed")
+            raise CassetteMissError(
+                f"カセットに同じリクエストの記録がありません（{endpoint}, {key[:12]}）: {str(e)}", e
+            ) from e
+
+        self._count("replayed")
+        return _response_type(endpoint).model_validate(entry["response"])
+
+    def record(self, endpoint: str, request: Dict[str, Any], response: Any):
+        """
+        応答を保存（失敗してもAPIの呼び出し結果には影響させない）
+
+        Args:
+            endpoint: 'chat' または 'image'
+            request: APIに渡した引数
+            response: SDKの応答オブジェクト
+        """
+        key = self.make_key(endpoint, request)
+        entry = {
+            "endpoint": endpoint,
+            "recorded_at": time.time(),
+            "request": _normalize(request),
+            "response": response.model_dump(mode="json")
+        }
+        path = self._path(endpoint, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"カセットへの記録に失敗しました: {str(e)}")
+            return
+        self._count("recorded")
+
+    def stats(self) -> Dict[str, Any]:
+        """モードと、記録・再生・記録なしの件数を取得"""
+        with self._lock:
+            return dict(self._stats, mode=self.mode, directory=self.directory)
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _path(self, endpoint: str, key: str) -> str:
+        return os.path.join(self.directory, endpoint, f"{key}.json")
+
+
+def _normalize(value: Any) -> Any:
+    """JSONにできる形に変換（バイト列は内容のハッシュにする）"""
+    if isinstance(value, (bytes, bytearray)):
+        return {"sha256": hashlib.sha256(value).hexdigest(), "bytes": len(value)}
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def _response_type(endpoint: str):
+    from openai.types import ImagesResponse
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion if endpoint == "chat" else ImagesResponse
@@ -0,0 +1,362 @@
+"""
+生成履歴のSQLiteカタログ
+
+単語ごとの生成が成功するたびに、単語・補足情報・キャラクター・品質・シーンデータ・
+使用量・コスト内訳・生成ファイルのパス・処理時間を1行として記録する。
+一覧・検索・コスト集計を、ファイル走査やHTMLの読み取りではなくインデックス付きの
+クエリで行えるようにする。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    word TEXT NOT NULL COLLATE NOCASE,
+    context TEXT NOT NULL DEFAULT '',
+    character_image TEXT NOT NULL DEFAULT '',
+    character_description TEXT NOT NULL DEFAULT '',
+    quality TEXT NOT NULL,
+    scene_data TEXT NOT NULL,
+    usage TEXT NOT NULL,
+    cost TEXT NOT NULL,
+    total_cost REAL NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    image_path TEXT NOT NULL,
+    thumbnail_path TEXT,
+    html_path TEXT NOT NULL,
+    timings TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_generations_word ON generations (word, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_character ON generations (character_image, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_quality ON generations (quality, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_created_at ON generations (created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_html_path ON generations (html_path, id);
+"""
+
+# JSONとして保存している列
+_JSON_COLUMNS = ("scene_data", "usage", "cost", "timings")
+
+# cost_summary で集計できる単位
+_GROUP_COLUMNS = {
+    "day": "date(created_at, 'unixepoch', 'localtime')",
+    "word": "word",
+    "quality": "quality",
+    "character_image": "character_image"
+}
+
+
+class Catalog:
+    def __init__(self, db_path: str = "output/catalog.sqlite3"):
+        """
+        カタログを開く（なければ作成）
+
+        Args:
+            db_path: SQLiteデータベースのパス
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._listeners = []
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 複数のワーカースレッドから書き込むため、1つの接続をロックで共有する
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+    def add_listener(self, callback):
+        """
+        生成を記録したときに呼び出す関数を登録
+
+        Args:
+            callback: 記録した行のIDを受け取る関数
+        """
+        self._listeners.append(callback)
+
+    def record(self, word: str, context: str, character_image: str, character_description: str,
+               quality: str, scene_data: Dict[str, Any], cost_info: Dict[str, Any],
+               image_path: str, html_path: str, thumbnail_path: Optional[str] = None,
+               timings: Optional[Dict[str, float]] = None, created_at: Optional[float] = None) -> int:
+        """
+        成功した生成を1件記録
+
+        Args:
+            word: 英単語
+            context: 補足情報
+            character_image: ベースキャラクター画像のファイル名
+            character_description: キャラクターの説明
+            quality: 画像品質
+            scene_data: シーンデータ（usage を含む）
+            cost_info: CostCalculator.calculate_total_cost の結果
+            image_path: 生成画像のパス
+            html_path: ビューアHTMLのパス
+            thumbnail_path: サムネイルのパス
+            timings: 工程ごとの処理時間（秒）
+            created_at: 生成日時（UNIX時刻。省略時は現在時刻）
+
+        Returns:
+            記録した行のID
+        """
+        scene = {key: value for key, value in scene_data.items() if key != "usage"}
+        usage = {
+            "chat": scene_data.get("usage", {}),
+            "image": cost_info.get("image_usage", {})
+        }
+        cost = {key: value for key, value in cost_info.items() if key not in ("image_usage", "image_attempts")}
+        cached = bool(cost.get("image_cost", {}).get("cached"))
+        if created_at is None:
+            created_at = time.time()
+
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO generations (
+                    created_at, word, context, character_image, character_description, quality,
+                    scene_data, usage, cost, total_cost, cached,
+                    image_path, thumbnail_path, html_path, timings
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    created_at, word, context or "", character_image or "", character_description or "",
+                    quality, _dumps(scene), _dumps(usage), _dumps(cost),
+                    cost.get("total_cost", 0.0), int(cached),
+                    image_path, thumbnail_path, html_path, _dumps(timings or {})
+                )
+            )
+            self._conn.commit()
+            row_id = cursor.lastrowid
+
+        self._notify(row_id)
+        return row_id
+
+    def get(self, row_id: int) -> Optional[Dict[str, Any]]:
+        """IDで1件取得"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM generations WHERE id = ?", (row_id,)).fetchone()
+        return _row_to_dict(row) if row is not None else None
+
+    def max_id(self) -> int:
+        """最後に記録した行のID（記録がなければ 0）"""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(id) FROM generations").fetchone()
+        return row[0] or 0
+
+    def range(self, first_id: int, last_id: int, latest_only: bool = False) -> List[Dict[str, Any]]:
+        """
+        IDの範囲で取得（ID順）
+
+        Args:
+            first_id: 最初のID
+            last_id: 最後のID（この値を含む）
+            latest_only: 同じビューアHTMLを後から作り直した行（上書き済みの記録）を除くか
+
+        Returns:
+            生成履歴のリスト
+        """
+        where = "WHERE id BETWEEN ? AND ?"
+        if latest_only:
+            where += (" AND NOT EXISTS (SELECT 1 FROM generations AS newer"
+                      " WHERE newer.html_path = generations.html_path AND newer.id > generations.id)")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM generations {where} ORDER BY id",
+                (first_id, last_id)
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def previous_id(self, html_path: str, before_id: int) -> Optional[int]:
+        """
+        同じビューアHTMLを指す、指定IDより前の最新の行ID
+
+        Args:
+            html_path: ビューアHTMLのパス
+            before_id: この行IDより前を探す
+
+        Returns:
+            行ID（なければ None）
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(id) FROM generations WHERE html_path = ? AND id < ?",
+                (html_path, before_id)
+            ).fetchone()
+        return row[0]
+
+    def html_filenames(self) -> set:
+        """記録済みのビューアHTMLのファイル名"""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT html_path FROM generations").fetchall()
+        return {os.path.basename(row[0]) for row in rows}
+
+    def find(self, word: Optional[str] = None, character_image: Optional[str] = None,
+             quality: Optional[str] = None, date_from: Optional[float] = None,
+             date_to: Optional[float] = None, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        生成履歴を新しい順に検索
+
+        Args:
+            word: 英単語（大文字小文字を区別しない）
+            character_image: ベースキャラクター画像のファイル名
+            quality: 画像品質
+            date_from: この日時（UNIX時刻）以降に生成されたもの
+            date_to: この日時（UNIX時刻）より前に生成されたもの
+            offset: 先頭から飛ばす件数
+            limit: 返す最大件数
+
+        Returns:
+            生成履歴のリスト
+        """
+        where, params = _build_filters(word, character_image, quality, date_from, date_to)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM generations {where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def latest(self, word: str, context: Optional[str] = None, character_image: Optional[str] = None,
+               quality: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        条件に合う最新の生成を取得
+
+        Args:
+            word: 英単語（大文字小文字を区別しない）
+            context: 補足情報（None の場合は問わない）
+            character_image: ベースキャラクター画像のファイル名（None の場合は問わない）
+            quality: 画像品質（None の場合は問わない）
+
+        Returns:
+            最新の生成履歴（なければ None）
+        """
+        where, params = _build_filters(word, character_image, quality, None, None)
+        if context is not None:
+            where += " AND context = ?"
+            params.append(context)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM generations {where} ORDER BY created_at DESC, id DESC LIMIT 1",
+                params
+            ).fetchone()
+        return _row_to_dict(row) if row is not None else None
+
+    def usage_samples(self, quality: Optional[str] = None, character_image: Optional[str] = None,
+                      limit: int = 200) -> List[Dict[str, Any]]:
+        """
+        実際にAPIを呼んだ（キャッシュでない）最近の生成のコストと処理時間を取得
+
+        Args:
+            quality: 画像品質（None の場合は問わない）
+            character_image: ベースキャラクター画像のファイル名（None の場合は問わない）
+            limit: 取得する最大件数
+
+        Returns:
+            新しい順のリスト（total_cost, timings）
+        """
+        where, params = _build_filters(None, character_image, quality, None, None)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT total_cost, timings FROM generations {where} AND cached = 0 AND total_cost > 0
+                ORDER BY created_at DESC, id DESC LIMIT ?
+                """,
+                params + [limit]
+            ).fetchall()
+        return [
+            {"total_cost": row["total_cost"], "timings": json.loads(row["timings"]) if row["timings"] else {}}
+            for row in rows
+        ]
+
+    def cost_summary(self, group_by: Optional[str] = None, date_from: Optional[float] = None,
+                     date_to: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        生成件数とコストを集計
+
+        Args:
+            group_by: 集計単位（day, word, quality, character_image。None の場合は全体）
+            date_from: この日時（UNIX時刻）以降に生成されたもの
+            date_to: この日時（UNIX時刻）より前に生成されたもの
+
+        Returns:
+            集計結果のリスト（group, count, cached_count, total_cost）
+        """
+        if group_by is not None and group_by not in _GROUP_COLUMNS:
+            raise ValueError(f"集計単位が不正です: {group_by}")
+
+        group_expr = _GROUP_COLUMNS[group_by] if group_by else "NULL"
+        where, params = _build_filters(None, None, None, date_from, date_to)
+        group_clause = "GROUP BY 1 ORDER BY 1" if group_by else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT {group_expr} AS grp, COUNT(*) AS count, SUM(cached) AS cached_count,
+                       COALESCE(SUM(total_cost), 0) AS total_cost
+                FROM generations {where} {group_clause}
+                """,
+                params
+            ).fetchall()
+        return [
+            {
+                "group": row["grp"],
+                "count": row["count"],
+                "cached_count": row["cached_count"] or 0,
+                "total_cost": row["total_cost"]
+            }
+            for row in rows
+        ]
+
+    def _notify(self, row_id: int):
+        for callback in self._listeners:
+            try:
+                callback(row_id)
+            except Exception as e:
+                print(f"生成履歴の通知中にエラーが発生しました: {str(e)}")
+
+    def close(self):
+        """データベース接続を閉じる"""
+        with self._lock:
+            self._conn.close()
+
+
+def _build_filters(word, character_image, quality, date_from, date_to):
+    clauses = ["1 = 1"]
+    params = []
+    if word is not None:
+        clauses.append("word = ?")
+        params.append(word)
+    if character_image is not None:
+        clauses.append("character_image = ?")
+        params.append(character_image)
+    if quality is not None:
+        clauses.append("quality = ?")
+        params.append(quality)
+    if date_from is not None:
+        clauses.append("created_at >= ?")
+        params.append(date_from)
+    if date_to is not None:
+        clauses.append("created_at < ?")
+        params.append(date_to)
+    return "WHERE " + " AND ".join(clauses), params
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    record = dict(row)
+    for column in _JSON_COLUMNS:
+        record[column] = json.loads(record[column]) if record.get(column) else {}
+    record["cached"] = bool(record["cached"])
+    return record
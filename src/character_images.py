@@ -0,0 +1,101 @@
+"""
+ベースキャラクター画像のレジストリ
+
+image/ 以下のキャラクター画像を一度だけ読み込んでメモリに保持し、
+内容のハッシュ（キャッシュキーや変更検知用）とともに提供する。
+ファイルの更新日時やサイズが変わった場合は自動で読み直す。
+"""
+
+import hashlib
+import os
+import threading
+from typing import Tuple
+
+
+class CharacterImage:
+    def __init__(self, path: str, data: bytes, mtime: float, size: int):
+        """
+        読み込み済みのキャラクター画像
+
+        Args:
+            path: 画像のパス
+            data: 画像のバイト列
+            mtime: 読み込み時のファイル更新日時
+            size: 読み込み時のファイルサイズ
+        """
+        self.path = path
+        self.data = data
+        self.mtime = mtime
+        self.size = size
+        self.sha256 = hashlib.sha256(data).hexdigest()
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    def as_upload(self) -> Tuple[str, bytes, str]:
+        """
+        OpenAI SDK にそのまま渡せるアップロード用タプルを取得
+
+        Returns:
+            (ファイル名, バイト列, MIMEタイプ)
+        """
+        return (self.filename, self.data, "image/png")
+
+
+class CharacterImageRegistry:
+    def __init__(self, image_dir: str = "image"):
+        """
+        キャラクター画像レジストリを初期化
+
+        Args:
+            image_dir: キャラクター画像の置き場所
+        """
+        self.image_dir = image_dir
+        self._images = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name: str) -> str:
+        """
+        フォームなどで指定された画像名を image_dir 内のパスに変換
+
+        Args:
+            name: 画像のファイル名
+
+        Returns:
+            画像のパス
+
+        Raises:
+            FileNotFoundError: 画像が存在しない場合
+        """
+        # ディレクトリ部分は無視して image_dir の外を参照させない
+        path = os.path.join(self.image_dir, os.path.basename(name))
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"キャラクター画像 '{name}' が見つかりません")
+        return path
+
+    def get(self, path: str) -> CharacterImage:
+        """
+        キャラクター画像を取得（未読み込み、またはファイルが更新されていれば読み込む）
+
+        Args:
+            path: 画像のパス
+
+        Returns:
+            読み込み済みのキャラクター画像
+        """
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None and image.mtime == stat.st_mtime and image.size == stat.st_size:
+                return image
+
+        with open(path, "rb") as f:
+            data = f.read()
+        image = CharacterImage(path, data, stat.st_mtime, stat.st_size)
+
+        with self._lock:
+            self._images[key] = image
+        return image
@@ -0,0 +1,112 @@
+"""
+APIキーごとのOpenAIクライアントをプロセス全体で共有するレジストリ
+
+リクエストごとにクライアントを作り直すとHTTP接続プールが毎回空になり、
+TLSハンドシェイクが繰り返される。同じAPIキーのリクエスト間でクライアントを
+再利用し、一定時間使われなかったものだけを閉じる。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List
+
+
+class _Entry:
+    def __init__(self, value: Any):
+        self.value = value
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+
+class ClientRegistry:
+    def __init__(self, factory: Callable[[str], Any], idle_ttl: float = 600.0, max_clients: int = 32):
+        """
+        レジストリを初期化
+
+        Args:
+            factory: APIキーからクライアントを作る関数
+            idle_ttl: 使用されていないクライアントを閉じるまでの秒数
+            max_clients: 保持するクライアント数の上限（超えた場合は使用中でない古いものから閉じる）
+        """
+        self.factory = factory
+        self.idle_ttl = idle_ttl
+        self.max_clients = max_clients
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, api_key: str) -> Iterator[Any]:
+        """
+        APIキーに対応するクライアントを借りる
+
+        借りている間はアイドル扱いにならず、閉じられることはない。
+
+        Args:
+            api_key: OpenAI API キー
+
+        Yields:
+            factory が作成したクライアント
+        """
+        with self._lock:
+            self._prune()
+            entry = self._entries.get(api_key)
+            if entry is None:
+                entry = _Entry(self.factory(api_key))
+                self._entries[api_key] = entry
+            entry.in_use += 1
+
+        try:
+            yield entry.value
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    def stats(self) -> Dict[str, int]:
+        """保持しているクライアント数と使用中の数を取得"""
+        with self._lock:
+            return {
+                "clients": len(self._entries),
+                "in_use": sum(1 for entry in self._entries.values() if entry.in_use)
+            }
+
+    def collect(self, fn: Callable[[Any], Any]) -> List[Any]:
+        """
+        保持しているクライアントそれぞれに fn を適用した結果を取得（APIキーは含めない）
+
+        Args:
+            fn: クライアントを受け取る関数
+        """
+        with self._lock:
+            clients = [entry.value for entry in self._entries.values()]
+        return [fn(client) for client in clients]
+
+    def close_all(self):
+        """使用中でないクライアントをすべて閉じる"""
+        with self._lock:
+            for api_key, entry in list(self._entries.items()):
+                if not entry.in_use:
+                    self._close(api_key)
+
+    def _prune(self):
+        """アイドル時間を超えた、または上限を超えた未使用クライアントを閉じる"""
+        now = time.monotonic()
+        idle = sorted(
+            ((entry.last_used, api_key) for api_key, entry in self._entries.items() if not entry.in_use)
+        )
+
+        excess = len(self._entries) - self.max_clients + 1
+        for last_used, api_key in idle:
+            if now - last_used > self.idle_ttl or excess > 0:
+                self._close(api_key)
+                excess -= 1
+
+    def _close(self, api_key: str):
+        entry = self._entries.pop(api_key)
+        close = getattr(entry.value, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                print(f"クライアントのクローズ中にエラーが発生しました: {str(e)}")
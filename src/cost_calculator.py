@@ -5,48 +5,52 @@ OpenAI APIの使用量とコストを計算するユーティリティ
 from typing import Dict, Any
 
 
-class CostCalculator:
-    def __init__(self):
-        """コスト計算機を初期化"""
-        # OpenAI API料金表 (2025年7月11日時点)
-        self.pricing = {
-            "gpt-4o-mini": {
-                "input": 0.000600,   # $0.60 per 1M tokens
-                "output": 0.002400   # $2.40 per 1M tokens
-            },
-            "gpt-4o": {
-                "input": 0.005000,   # $5.00 per 1M tokens
-                "output": 0.020000   # $20.00 per 1M tokens
+# OpenAI API料金表 (2025年7月11日時点)
+PRICING = {
+    "gpt-4o-mini": {
+        "input": 0.000600,   # $0.60 per 1M tokens
+        "output": 0.002400   # $2.40 per 1M tokens
+    },
+    "gpt-4o": {
+        "input": 0.005000,   # $5.00 per 1M tokens
+        "output": 0.020000   # $20.00 per 1M tokens
+    },
+    "gpt-4": {
+        "input": 0.030000,   # $30.00 per 1M tokens
+        "output": 0.060000   # $60.00 per 1M tokens
+    },
+    "gpt-image-1": {
+        "text_input": 0.005000,   # $5.00 per 1M tokens (テキストプロンプト)
+        "image_input": 0.010000,  # $10.00 per 1M tokens (ベース画像)
+        "output": {
+            "1024x1024": {
+                "low": 0.011,
+                "medium": 0.042,
+                "high": 0.167,
+                "auto": 0.042  # 推定中品質
             },
-            "gpt-4": {
-                "input": 0.030000,   # $30.00 per 1M tokens
-                "output": 0.060000   # $60.00 per 1M tokens
+            "1024x1536": {
+                "low": 0.016,
+                "medium": 0.063,
+                "high": 0.25,
+                "auto": 0.063
             },
-            "gpt-image-1": {
-                "text_input": 0.005000,   # $5.00 per 1M tokens (テキストプロンプト)
-                "image_input": 0.010000,  # $10.00 per 1M tokens (ベース画像)
-                "output": {
-                    "1024x1024": {
-                        "low": 0.011,
-                        "medium": 0.042,
-                        "high": 0.167,
-                        "auto": 0.042  # 推定中品質
-                    },
-                    "1024x1536": {
-                        "low": 0.016,
-                        "medium": 0.063,
-                        "high": 0.25,
-                        "auto": 0.063
-                    },
-                    "1536x1024": {
-                        "low": 0.016,
-                        "medium": 0.063,
-                        "high": 0.25,
-                        "auto": 0.063
-                    }
-                }
+            "1536x1024": {
+                "low": 0.016,
+                "medium": 0.063,
+                "high": 0.25,
+                "auto": 0.063
             }
         }
+    }
+}
+
+
+class CostCalculator:
+    def __init__(self):
+        """コスト計算機を初期化"""
+        # 料金表は全インスタンスで共有する（読み取り専用）
+        self.pricing = PRICING
     
     def calculate_chat_cost(self, usage: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -62,6 +66,8 @@ class CostCalculator:
         prompt_tokens = usage["prompt_tokens"]
         completion_tokens = usage["completion_tokens"]
         total_tokens = usage["total_tokens"]
+        # キャッシュから返されたシーンはAPIを呼んでいない
+        cached = usage.get("cached", False)
         
         if model not in self.pricing:
             return {
@@ -72,6 +78,7 @@ class CostCalculator:
                 "input_cost": 0.0,
                 "output_cost": 0.0,
                 "total_cost": 0.0,
+                "cached": cached,
                 "error": f"Unknown model: {model}"
             }
         
@@ -87,13 +94,14 @@ class CostCalculator:
             "total_tokens": total_tokens,
             "input_cost": input_cost,
             "output_cost": output_cost,
-            "total_cost": total_cost
+            "total_cost": total_cost,
+            "cached": cached
         }
     
     def calculate_image_cost(self, model: str = "gpt-image-1", quality: str = "auto", 
                            size: str = "1024x1024", count: int = 1, 
                            prompt_tokens: int = 0, image_tokens: int = 0, 
-                           output_tokens: int = 0) -> Dict[str, Any]:
+                           output_tokens: int = 0, cached: bool = False) -> Dict[str, Any]:
         """
         Image Generation APIのコストを計算
         
@@ -105,6 +113,7 @@ class CostCalculator:
             prompt_tokens: テキストプロンプトのトークン数
             image_tokens: ベース画像のトークン数
             output_tokens: 出力トークン数
+            cached: キャッシュから返された画像か（APIを呼んでいないためコストは0）
             
         Returns:
             コスト情報の辞書
@@ -144,6 +153,11 @@ class CostCalculator:
                 cost_per_image = self.pricing[model]["output"]["1024x1024"]["auto"]
             output_cost = cost_per_image * count
         
+        # キャッシュヒットはトークン数を元の生成時のまま残し、コストのみ0にする
+        if cached:
+            input_cost = 0.0
+            output_cost = 0.0
+        
         total_cost = input_cost + output_cost
         
         return {
@@ -156,7 +170,8 @@ class CostCalculator:
             "output_tokens": output_tokens,
             "input_cost": input_cost,
             "output_cost": output_cost,
-            "total_cost": total_cost
+            "total_cost": total_cost,
+            "cached": cached
         }
     
     def _estimate_quality_from_cost(self, token_cost: float, size: str = "1024x1024") -> str:
@@ -227,11 +242,14 @@ class CostCalculator:
         chat_cost = cost_info.get("chat_cost", {})
         image_cost = cost_info.get("image_cost", {})
         
+        chat_note = "キャッシュ" if chat_cost.get('cached') else f"{chat_cost.get('total_tokens', 0)} tokens"
+        image_note = "、キャッシュ" if image_cost.get('cached') else ""
+        
         format_str = f"""
 💰 生成コスト詳細
-・チャット生成: ${chat_cost.get('total_cost', 0.0):.6f} ({chat_cost.get('total_tokens', 0)} tokens)
-・画像生成入力: ${image_cost.get('input_cost', 0.0):.6f} ({image_cost.get('prompt_tokens', 0)} prompt + {image_cost.get('image_tokens', 0)} image tokens)
-・画像生成出力: ${image_cost.get('output_cost', 0.0):.6f} ({image_cost.get('output_tokens', 0)} tokens → {image_cost.get('quality', 'auto')} quality, {image_cost.get('size', '1024x1024')})
+・チャット生成: ${chat_cost.get('total_cost', 0.0):.6f} ({chat_note})
+・画像生成入力: ${image_cost.get('input_cost', 0.0):.6f} ({image_cost.get('prompt_tokens', 0)} prompt + {image_cost.get('image_tokens', 0)} image tokens{image_note})
+・画像生成出力: ${image_cost.get('output_cost', 0.0):.6f} ({image_cost.get('output_tokens', 0)} tokens → {image_cost.get('quality', 'auto')} quality, {image_cost.get('size', '1024x1024')}{image_note})
 ・総コスト: ${total_usd:.6f}
         """.strip()
         
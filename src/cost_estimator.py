@@ -0,0 +1,120 @@
+"""
+生成前のコスト・所要時間の見積もり
+
+カタログに記録された実際の生成（キャッシュでないもの）から、品質とキャラクター画像ごとの
+1単語あたりのコストと処理時間を求める。同じ組み合わせの履歴が少ない場合は品質だけで、
+それも少ない場合は料金表と標準的なトークン数から見積もる。
+キャッシュから返される単語も有料として数えるので、見積もりは高めに出る。
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+from .catalog import Catalog
+from .cost_calculator import CostCalculator
+from .image_generator import ImageGenerator
+from .openai_client import OpenAIClient
+
+
+class CostEstimator:
+    # 履歴から見積もるのに必要な件数
+    MIN_SAMPLES = 5
+    # 見積もりに使う最近の生成の件数
+    HISTORY_LIMIT = 200
+    # 予算の予約に使う高めの見積もり（この割合の生成がこの額以下に収まる）
+    HIGH_PERCENTILE = 0.9
+    # 履歴がない場合の1単語あたりのトークン数と処理時間
+    DEFAULT_CHAT_PROMPT_TOKENS = 900
+    DEFAULT_CHAT_COMPLETION_TOKENS = 450
+    DEFAULT_IMAGE_PROMPT_TOKENS = 300
+    DEFAULT_IMAGE_INPUT_TOKENS = 400
+    DEFAULT_WORD_SECONDS = 45.0
+
+    def __init__(self, catalog: Catalog, cost_calculator: Optional[CostCalculator] = None):
+        """
+        見積もり器を初期化
+
+        Args:
+            catalog: 生成履歴カタログ
+            cost_calculator: 料金表から見積もる場合のコスト計算機
+        """
+        self.catalog = catalog
+        self.cost_calculator = cost_calculator or CostCalculator()
+
+    def estimate(self, word_count: int, quality: str, character_image: str,
+                 concurrency: int = 1, image_requests_per_minute: Optional[float] = None) -> Dict[str, Any]:
+        """
+        単語数ぶんのコストと所要時間を見積もる
+
+        Args:
+            word_count: 生成する単語数
+            quality: 画像品質
+            character_image: ベースキャラクター画像のファイル名
+            concurrency: 同時に生成する単語数
+            image_requests_per_minute: 画像APIの1分あたりのリクエスト数の上限
+
+        Returns:
+            見積もりの辞書（per_word_cost, per_word_cost_high, total_cost, total_cost_high,
+            per_word_seconds, estimated_seconds, basis, samples）
+        """
+        samples = self.catalog.usage_samples(quality, character_image, limit=self.HISTORY_LIMIT)
+        basis = "history"
+        if len(samples) < self.MIN_SAMPLES:
+            samples = self.catalog.usage_samples(quality, limit=self.HISTORY_LIMIT)
+            basis = "history_quality"
+
+        if len(samples) >= self.MIN_SAMPLES:
+            costs = sorted(sample["total_cost"] for sample in samples)
+            per_word_cost = sum(costs) / len(costs)
+            per_word_cost_high = _percentile(costs, self.HIGH_PERCENTILE)
+            seconds = sorted(sample["timings"]["total_seconds"] for sample in samples
+                             if sample["timings"].get("total_seconds"))
+            per_word_seconds = _percentile(seconds, 0.5) if seconds else self.DEFAULT_WORD_SECONDS
+        else:
+            basis = "price_table"
+            per_word_cost = per_word_cost_high = self._price_table_cost(quality)
+            per_word_seconds = self.DEFAULT_WORD_SECONDS
+
+        # 同時実行数ぶんずつ進む時間と、画像APIのレート制限で決まる時間の長い方
+        waves = math.ceil(word_count / max(concurrency, 1))
+        estimated_seconds = waves * per_word_seconds
+        if image_requests_per_minute:
+            estimated_seconds = max(estimated_seconds, word_count * 60.0 / image_requests_per_minute)
+
+        return {
+            "words": word_count,
+            "quality": quality,
+            "character_image": character_image,
+            "basis": basis,
+            "samples": len(samples) if basis != "price_table" else 0,
+            "per_word_cost": per_word_cost,
+            "per_word_cost_high": per_word_cost_high,
+            "total_cost": per_word_cost * word_count,
+            "total_cost_high": per_word_cost_high * word_count,
+            "per_word_seconds": per_word_seconds,
+            "estimated_seconds": estimated_seconds if word_count else 0.0
+        }
+
+    def _price_table_cost(self, quality: str) -> float:
+        chat_cost = self.cost_calculator.calculate_chat_cost({
+            "model": OpenAIClient.SCENE_MODEL,
+            "prompt_tokens": self.DEFAULT_CHAT_PROMPT_TOKENS,
+            "completion_tokens": self.DEFAULT_CHAT_COMPLETION_TOKENS,
+            "total_tokens": self.DEFAULT_CHAT_PROMPT_TOKENS + self.DEFAULT_CHAT_COMPLETION_TOKENS
+        })
+        image_input_cost = self.cost_calculator.calculate_image_cost(
+            ImageGenerator.IMAGE_MODEL,
+            quality,
+            ImageGenerator.IMAGE_SIZE,
+            prompt_tokens=self.DEFAULT_IMAGE_PROMPT_TOKENS,
+            image_tokens=self.DEFAULT_IMAGE_INPUT_TOKENS
+        )
+        output_prices = self.cost_calculator.pricing[ImageGenerator.IMAGE_MODEL]["output"][ImageGenerator.IMAGE_SIZE]
+        output_cost = output_prices.get(quality, output_prices["auto"])
+        return chat_cost["total_cost"] + image_input_cost["input_cost"] + output_cost
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """昇順に並んだ値の百分位点（最も近い順位の値）"""
+    index = min(max(math.ceil(fraction * len(values)) - 1, 0), len(values) - 1)
+    return values[index]
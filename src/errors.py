@@ -0,0 +1,128 @@
+"""
+生成処理のエラー型
+
+OpenAI API の例外やJSONの解析失敗を、再試行すれば回復しうるもの（retryable）と
+再試行しても結果が変わらないものに分類する。メッセージは従来どおり
+「〜中にエラーが発生しました: 元のエラー」の形式を保つ。
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+class WordImageError(Exception):
+    # 再試行で回復しうるか
+    retryable = False
+
+    def __init__(self, message: str, cause: Optional[BaseException] = None,
+                 retry_after: Optional[float] = None):
+        """
+        Args:
+            message: エラーメッセージ
+            cause: 元の例外
+            retry_after: サーバーが指定した再試行までの秒数
+        """
+        super().__init__(message)
+        self.cause = cause
+        self.retry_after = retry_after
+        # RetryPolicy が試行ごとの記録を設定する
+        self.attempts: List[Dict[str, Any]] = []
+
+
+class TransientAPIError(WordImageError):
+    """タイムアウト・接続エラー・5xx"""
+    retryable = True
+
+
+class RateLimitedError(TransientAPIError):
+    """429（レート制限）"""
+
+
+class RateLimitExhaustedError(RateLimitedError):
+    """429 が続き、OpenAIClient のレート制限による再送が上限に達した（さらには再試行しない）"""
+    retryable = False
+
+
+class SceneParseError(WordImageError):
+    """Chatモデルの応答が期待したJSONでない"""
+    retryable = True
+
+
+class ContentPolicyError(WordImageError):
+    """安全性ポリシーによる拒否"""
+
+
+class InvalidRequestError(WordImageError):
+    """リクエスト内容の誤り（400/404/422 など）"""
+
+
+class APIKeyError(WordImageError):
+    """APIキーが無効、または権限がない"""
+
+
+class QuotaExceededError(WordImageError):
+    """利用上限（insufficient_quota）に達している"""
+
+
+class CassetteMissError(WordImageError):
+    """リプレイ中に、同じリクエストの応答がカセットに記録されていない"""
+
+
+# 安全性ポリシーによる拒否を表すエラーコード
+_CONTENT_POLICY_CODES = ("content_policy_violation", "moderation_blocked", "safety_violation")
+
+
+def classify_error(error: BaseException, message: str) -> WordImageError:
+    """
+    例外を WordImageError のサブクラスに変換
+
+    Args:
+        error: 元の例外
+        message: メッセージの前置き（例: "画像生成中にエラーが発生しました"）
+
+    Returns:
+        分類済みのエラー
+    """
+    text = f"{message}: {str(error)}"
+
+    if isinstance(error, (json.JSONDecodeError, SceneParseError)):
+        return SceneParseError(text, error)
+
+    if isinstance(error, WordImageError):
+        return error
+
+    # 起動を速くするため openai は使うときに読み込む（APIの例外が届く時点で読み込み済み）
+    import openai
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return TransientAPIError(text, error)
+
+    if isinstance(error, openai.RateLimitError):
+        if getattr(error, "code", None) == "insufficient_quota":
+            return QuotaExceededError(text, error)
+        return RateLimitedError(text, error, retry_after=retry_after_seconds(error.response.headers))
+
+    if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError)):
+        return APIKeyError(text, error)
+
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code >= 500 or error.status_code in (408, 409):
+            return TransientAPIError(text, error, retry_after=retry_after_seconds(error.response.headers))
+        if getattr(error, "code", None) in _CONTENT_POLICY_CODES:
+            return ContentPolicyError(text, error)
+        return InvalidRequestError(text, error)
+
+    return WordImageError(text, error)
+
+
+def retry_after_seconds(headers: Any) -> Optional[float]:
+    """Retry-After / retry-after-ms ヘッダーを秒に変換（ない場合は None）"""
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value) * scale
+        except ValueError:
+            continue
+    return None
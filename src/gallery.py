@@ -0,0 +1,153 @@
+"""
+生成履歴全体をページ分けして表示するギャラリー（output/index.html）
+
+ページはカタログの行IDから決まる固定サイズの区切り（1ページ目が最も古い）で、
+単語が記録されるたびにその単語が入るページだけを書き直す。新しいページができたときだけ、
+ひとつ前のページ（「新しい単語」へのリンクを追加するため）と index.html も書き直す。
+
+同じ単語・品質を作り直すとビューアHTMLは上書きされるので、カードはビューアHTMLごとに
+最新の行だけを載せる（作り直す前の行のページからはカードを外す）。
+"""
+
+import os
+import re
+import threading
+from typing import Optional
+
+from .catalog import Catalog
+from .html_generator import HTMLGenerator
+from .image_derivatives import ImageDerivatives
+from .output_index import parse_viewer_filename
+
+# 旧ビューアHTMLから元画像のパスを取り出す
+_IMG_SRC_PATTERN = re.compile(r'<img src="([^"]+)"')
+
+
+class Gallery:
+    # 1ページに載せる単語数
+    PAGE_SIZE = 48
+
+    def __init__(self, html_generator: HTMLGenerator, catalog: Catalog, page_size: int = PAGE_SIZE):
+        """
+        ギャラリーを初期化
+
+        Args:
+            html_generator: ページを描画するHTML生成器
+            catalog: 生成履歴カタログ
+            page_size: 1ページに載せる単語数
+        """
+        self.html_generator = html_generator
+        self.catalog = catalog
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._latest_page = self.page_of(catalog.max_id())
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.html_generator.output_dir, "index.html")
+
+    @staticmethod
+    def page_filename(page: int) -> str:
+        return f"gallery_{page:04d}.html"
+
+    def page_of(self, row_id: int) -> int:
+        """行IDが入るページ番号（記録がない場合は 1）"""
+        return max((row_id - 1) // self.page_size + 1, 1)
+
+    def add(self, row_id: int):
+        """
+        記録された単語のページを更新（Catalog のリスナーとして登録する）
+
+        Args:
+            row_id: カタログの行ID
+        """
+        page = self.page_of(row_id)
+        record = self.catalog.get(row_id)
+        previous_id = self.catalog.previous_id(record["html_path"], row_id) if record is not None else None
+        with self._lock:
+            latest = max(self.page_of(self.catalog.max_id()), self._latest_page)
+            self._write_page(page, latest)
+            # 作り直す前のカードを外す
+            if previous_id is not None and self.page_of(previous_id) != page:
+                self._write_page(self.page_of(previous_id), latest)
+
+            if latest != self._latest_page:
+                # 前の最新ページに「新しい単語」へのリンクを付け、index.html の移動先を変える
+                if self._latest_page != page:
+                    self._write_page(self._latest_page, latest)
+                self._latest_page = latest
+                self.html_generator.generate_gallery_index(self.page_filename(latest))
+            elif not os.path.exists(self.index_path):
+                self.html_generator.generate_gallery_index(self.page_filename(latest))
+
+    def rebuild(self):
+        """すべてのページと index.html を作り直す"""
+        with self._lock:
+            latest = self.page_of(self.catalog.max_id())
+            for page in range(1, latest + 1):
+                self._write_page(page, latest)
+            self._latest_page = latest
+            self.html_generator.generate_gallery_index(self.page_filename(latest))
+
+    def ensure_built(self):
+        """index.html がなければ、旧ビューアを取り込んだうえでギャラリーを作成"""
+        if os.path.exists(self.index_path):
+            return
+        self.backfill()
+        self.rebuild()
+
+    def backfill(self) -> int:
+        """
+        カタログに記録されていない既存のビューアHTMLを（更新日時の古い順に）取り込む
+
+        シーンデータやコストはHTMLに埋め込まれているだけなので取り込まず、
+        単語・品質・画像・ビューアのパスだけを記録する。
+
+        Returns:
+            取り込んだ件数
+        """
+        output_dir = self.html_generator.output_dir
+        known = self.catalog.html_filenames()
+
+        viewers = []
+        with os.scandir(output_dir) as it:
+            for dir_entry in it:
+                parsed = parse_viewer_filename(dir_entry.name)
+                if parsed is None or dir_entry.name in known or not dir_entry.is_file():
+                    continue
+                viewers.append((dir_entry.stat().st_mtime, dir_entry.name, parsed))
+
+        imported = 0
+        for mtime, filename, (word, quality) in sorted(viewers):
+            html_path = os.path.join(output_dir, filename)
+            image_path = self._find_image_path(html_path)
+            if image_path is None:
+                continue
+            # サムネイルは /view/images で初めて要求されたときに作成される
+            thumbnail_path = os.path.join(os.path.dirname(image_path),
+                                          ImageDerivatives.thumbnail_name(os.path.basename(image_path)))
+            self.catalog.record(word, "", "", "", quality or "auto", {}, {}, image_path, html_path,
+                                thumbnail_path=thumbnail_path, created_at=mtime)
+            imported += 1
+        return imported
+
+    def _find_image_path(self, html_path: str) -> Optional[str]:
+        try:
+            with open(html_path, "r", encoding="utf-8") as f:
+                match = _IMG_SRC_PATTERN.search(f.read())
+        except OSError:
+            return None
+        if match is None:
+            return None
+        return os.path.join(self.html_generator.output_dir, *match.group(1).split("/"))
+
+    def _write_page(self, page: int, latest: int):
+        first_id = (page - 1) * self.page_size + 1
+        records = self.catalog.range(first_id, first_id + self.page_size - 1, latest_only=True)
+        self.html_generator.generate_gallery_page(
+            self.page_filename(page),
+            page,
+            records,
+            newer_filename=self.page_filename(page + 1) if page < latest else None,
+            older_filename=self.page_filename(page - 1) if page > 1 else None
+        )
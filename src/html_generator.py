@@ -1,18 +1,44 @@
+import json
 import os
-from typing import Dict, Any
+import tempfile
+from datetime import datetime
+from html import escape
+from typing import Dict, Any, List, Optional
 from .cost_calculator import CostCalculator
+from .image_derivatives import ImageDerivatives
+from .html_templates import (STYLESHEET_CSS, STYLESHEET_NAME, VIEWER_TEMPLATE, COST_SECTION_TEMPLATE,
+                             TIMING_SECTION_TEMPLATE, TIMING_ROW_TEMPLATE,
+                             GALLERY_PAGE_TEMPLATE, GALLERY_ITEM_TEMPLATE, GALLERY_PAGER_LINK_TEMPLATE,
+                             GALLERY_INDEX_TEMPLATE)
 
 
 class HTMLGenerator:
-    def __init__(self, output_dir: str = "output"):
-        """HTML生成器を初期化"""
+    # 生成画像の幅（srcset の元サイズ）
+    IMAGE_WIDTH = 1024
+    # 共有スタイルシートなどの置き場所（output_dir からの相対パス）
+    ASSETS_DIR = "assets"
+
+    def __init__(self, output_dir: str = "output", cost_calculator: Optional[CostCalculator] = None,
+                 responsive_images: bool = False):
+        """
+        HTML生成器を初期化
+        
+        Args:
+            output_dir: HTMLの出力先
+            cost_calculator: 共有するコスト計算機（省略時は新規作成）
+            responsive_images: 画像を <picture> で出力し、WebP/AVIFの派生ファイルを参照するか
+        """
         self.output_dir = output_dir
-        self.cost_calculator = CostCalculator()
+        self.cost_calculator = cost_calculator or CostCalculator()
+        self.responsive_images = responsive_images
+        self._listeners = []
         
         # 出力ディレクトリが存在しない場合は作成
         os.makedirs(self.output_dir, exist_ok=True)
+        self.stylesheet_href = self._ensure_stylesheet()
     
-    def generate_viewer_html(self, scene_data: Dict[str, Any], image_path: str, cost_info: Dict[str, Any] = None, quality: str = "auto") -> str:
+    def generate_viewer_html(self, scene_data: Dict[str, Any], image_path: str, cost_info: Dict[str, Any] = None, quality: str = "auto",
+                             spans: Optional[List[Dict[str, Any]]] = None) -> str:
         """
         画像確認用のHTMLファイルを生成
         
@@ -21,6 +47,7 @@ class HTMLGenerator:
             image_path: 生成された画像のパス
             cost_info: コスト情報（オプション）
             quality: 画像品質（auto, low, medium, high）
+            spans: 処理時間の内訳（WordTrace.to_list の結果。オプション）
             
         Returns:
             生成されたHTMLファイルのパス
@@ -29,22 +56,39 @@ class HTMLGenerator:
         html_filename = f"{word}_{quality}_viewer.html"
         html_path = os.path.join(self.output_dir, html_filename)
         
-        # 画像パスを相対パスに変換
-        relative_image_path = os.path.relpath(image_path, self.output_dir)
+        # 画像パスを相対パスに変換（HTMLから参照するため区切り文字は / に統一）
+        relative_image_path = self._relative_url(image_path)
         
-        html_content = self._create_html_content(scene_data, relative_image_path, cost_info)
+        html_content = self._create_html_content(scene_data, relative_image_path, cost_info, spans)
         
         try:
-            with open(html_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            
+            # 同じ単語を作り直している間も、配信中・表示中のビューアが途中までの内容にならないようにする
+            self._write_atomic(html_path, html_content)
             print(f"HTML確認用ファイルを生成しました: {html_path}")
-            return html_path
-            
         except Exception as e:
             raise Exception(f"HTMLファイルの生成中にエラーが発生しました: {str(e)}")
+        
+        self._notify(html_path)
+        return html_path
     
-    def _create_html_content(self, scene_data: Dict[str, Any], image_path: str, cost_info: Dict[str, Any] = None) -> str:
+    def add_listener(self, callback):
+        """
+        ビューアHTMLを書き込んだときに呼び出す関数を登録
+        
+        Args:
+            callback: 書き込んだHTMLのパスを受け取る関数
+        """
+        self._listeners.append(callback)
+    
+    def _notify(self, html_path: str):
+        for callback in self._listeners:
+            try:
+                callback(html_path)
+            except Exception as e:
+                print(f"HTML生成の通知中にエラーが発生しました: {str(e)}")
+    
+    def _create_html_content(self, scene_data: Dict[str, Any], image_path: str, cost_info: Dict[str, Any] = None,
+                             spans: Optional[List[Dict[str, Any]]] = None) -> str:
         """
         HTML内容を生成
         
@@ -52,202 +96,66 @@ class HTMLGenerator:
             scene_data: シーンデータ
             image_path: 画像の相対パス
             cost_info: コスト情報（オプション）
+            spans: 処理時間の内訳（オプション）
             
         Returns:
             HTML内容の文字列
         """
-        html_template = f"""<!DOCTYPE html>
-<html lang="ja">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Word Image Maker - {scene_data['word']}</title>
-    <style>
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }}
-        
-        .container {{
-            background-color: white;
-            border-radius: 12px;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-            padding: 30px;
-            margin-bottom: 20px;
-        }}
-        
-        .header {{
-            text-align: center;
-            margin-bottom: 30px;
-        }}
-        
-        .word-title {{
-            font-size: 3em;
-            color: #2c3e50;
-            margin: 0;
-            font-weight: bold;
-        }}
-        
-        .subtitle {{
-            font-size: 1.2em;
-            color: #7f8c8d;
-            margin-top: 10px;
-        }}
-        
-        .content {{
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 30px;
-            align-items: start;
-        }}
-        
-        .image-section {{
-            text-align: center;
-        }}
-        
-        .generated-image {{
-            max-width: 100%;
-            height: auto;
-            border-radius: 8px;
-            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.15);
-            border: 3px solid #3498db;
-        }}
-        
-        .info-section {{
-            background-color: #f8f9fa;
-            padding: 20px;
-            border-radius: 8px;
-            border-left: 4px solid #3498db;
-        }}
-        
-        .info-item {{
-            margin-bottom: 20px;
-        }}
-        
-        .info-label {{
-            font-weight: bold;
-            color: #2c3e50;
-            font-size: 1.1em;
-            margin-bottom: 8px;
-            display: block;
-        }}
-        
-        .info-content {{
-            color: #34495e;
-            line-height: 1.6;
-            font-size: 1em;
-        }}
-        
-        .scene-description {{
-            background-color: #e8f5e8;
-            padding: 15px;
-            border-radius: 6px;
-            border-left: 4px solid #27ae60;
-        }}
-        
-        .core-image {{
-            background-color: #fff3cd;
-            padding: 15px;
-            border-radius: 6px;
-            border-left: 4px solid #ffc107;
-        }}
-        
-        .prompt {{
-            background-color: #e7f3ff;
-            padding: 15px;
-            border-radius: 6px;
-            border-left: 4px solid #007bff;
-            font-family: 'Courier New', monospace;
-            font-size: 0.9em;
-        }}
+        return VIEWER_TEMPLATE.substitute(
+            word=escape(scene_data['word']),
+            stylesheet=escape(self.stylesheet_href),
+            image_markup=self._generate_image_markup(scene_data['word'], image_path),
+            scene_description=escape(scene_data['scene_description']),
+            core_image=escape(scene_data['core_image']),
+            illustration_prompt=escape(scene_data['illustration_prompt']),
+            cost_section=self._generate_cost_section(cost_info),
+            timing_section=self._generate_timing_section(spans),
+            generated_at=self._get_current_timestamp()
+        )
+    
+    def _ensure_stylesheet(self) -> str:
+        """
+        共有スタイルシートを書き出す（同じ内容のものがあれば何もしない）
         
-        .cost-info {{
-            background-color: #f0f8ff;
-            padding: 15px;
-            border-radius: 6px;
-            border-left: 4px solid #20a5ff;
-            font-family: 'Courier New', monospace;
-            font-size: 0.85em;
-        }}
+        Returns:
+            HTMLから参照するスタイルシートの相対パス
+        """
+        assets_dir = os.path.join(self.output_dir, self.ASSETS_DIR)
+        stylesheet_path = os.path.join(assets_dir, STYLESHEET_NAME)
         
-        .cost-info pre {{
-            margin: 0;
-            white-space: pre-wrap;
-            color: #1e3a8a;
-        }}
+        if not os.path.exists(stylesheet_path):
+            os.makedirs(assets_dir, exist_ok=True)
+            self._write_atomic(stylesheet_path, STYLESHEET_CSS)
         
-        .footer {{
-            text-align: center;
-            margin-top: 30px;
-            padding-top: 20px;
-            border-top: 1px solid #dee2e6;
-            color: #6c757d;
-        }}
+        return f"{self.ASSETS_DIR}/{STYLESHEET_NAME}"
+    
+    def _generate_image_markup(self, word: str, image_path: str) -> str:
+        """
+        生成画像の表示用HTMLを生成
         
-        @media (max-width: 768px) {{
-            .content {{
-                grid-template-columns: 1fr;
-            }}
-            
-            .word-title {{
-                font-size: 2.5em;
-            }}
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1 class="word-title">{scene_data['word']}</h1>
-            <p class="subtitle">英単語イメージイラスト</p>
-        </div>
+        responsive_images が有効な場合は <picture> と srcset で派生ファイルを参照し、
+        ブラウザが表示サイズと対応形式に合った最小のファイルを選べるようにする。
         
-        <div class="content">
-            <div class="image-section">
-                <img src="{image_path}" alt="{scene_data['word']} illustration" class="generated-image">
-                <p style="margin-top: 15px; color: #6c757d; font-style: italic;">
-                    生成されたイラスト
-                </p>
-            </div>
+        Args:
+            word: 英単語
+            image_path: 画像の相対パス
             
-            <div class="info-section">
-                <div class="info-item">
-                    <span class="info-label">🎬 シーンの内容</span>
-                    <div class="info-content scene-description">
-                        {scene_data['scene_description']}
-                    </div>
-                </div>
-                
-                <div class="info-item">
-                    <span class="info-label">🎯 表すコアイメージ</span>
-                    <div class="info-content core-image">
-                        {scene_data['core_image']}
-                    </div>
-                </div>
-                
-                <div class="info-item">
-                    <span class="info-label">🤖 生成プロンプト</span>
-                    <div class="info-content prompt">
-                        {scene_data['illustration_prompt']}
-                    </div>
-                </div>
-                
-                {self._generate_cost_section(cost_info)}
-            </div>
-        </div>
-        
-        <div class="footer">
-            <p>Word Image Maker - 英単語学習支援ツール</p>
-            <p>Generated on: {self._get_current_timestamp()}</p>
-        </div>
-    </div>
-</body>
-</html>"""
-        
-        return html_template
+        Returns:
+            HTML文字列
+        """
+        img_tag = (f'<img src="{escape(image_path)}" alt="{escape(word)} illustration" class="generated-image" '
+                   f'width="{self.IMAGE_WIDTH}" height="{self.IMAGE_WIDTH}" decoding="async">')
+        
+        if not self.responsive_images:
+            return img_tag
+        
+        sources = "".join(
+            f'\n                    <source type="{mime}" srcset="{escape(srcset)}" sizes="(max-width: 768px) 100vw, 540px">'
+            for mime, srcset in ImageDerivatives.picture_sources(image_path, self.IMAGE_WIDTH)
+        )
+        return f"""<picture>{sources}
+                    {img_tag}
+                </picture>"""
     
     def _generate_cost_section(self, cost_info: Dict[str, Any] = None) -> str:
         """
@@ -264,18 +172,35 @@ class HTMLGenerator:
         
         cost_display = self.cost_calculator.format_cost_display(cost_info)
         
-        return f"""
-                <div class="info-item">
-                    <span class="info-label">💰 生成コスト</span>
-                    <div class="info-content cost-info">
-                        <pre>{cost_display}</pre>
-                    </div>
-                </div>
+        return COST_SECTION_TEMPLATE.substitute(cost_display=escape(cost_display))
+    
+    def _generate_timing_section(self, spans: Optional[List[Dict[str, Any]]] = None) -> str:
         """
+        処理時間の内訳のHTMLセクションを生成（スパンごとに開始位置と長さを帯で示す）
+        
+        Args:
+            spans: 処理時間の内訳
+            
+        Returns:
+            HTML文字列
+        """
+        if not spans:
+            return ""
+        
+        total_ms = max(span["start_ms"] + span["duration_ms"] for span in spans) or 1.0
+        rows = "".join(
+            TIMING_ROW_TEMPLATE.substitute(
+                name=escape(span["name"]),
+                left=f"{span['start_ms'] / total_ms * 100:.2f}",
+                width=f"{span['duration_ms'] / total_ms * 100:.2f}",
+                duration=escape(_format_ms(span["duration_ms"]))
+            )
+            for span in spans
+        )
+        return TIMING_SECTION_TEMPLATE.substitute(total=escape(_format_ms(total_ms)), rows=rows)
     
     def _get_current_timestamp(self) -> str:
         """現在の日時を文字列で取得"""
-        from datetime import datetime
         return datetime.now().strftime("%Y年%m月%d日 %H:%M:%S")
     
     def open_html_file(self, html_path: str):
@@ -294,91 +219,100 @@ class HTMLGenerator:
             print(f"HTMLファイルを開けませんでした: {str(e)}")
             print(f"手動で開いてください: file://{os.path.abspath(html_path)}")
     
-    def generate_index_html(self, generated_words: list) -> str:
+    def generate_gallery_page(self, filename: str, page: int, records: list,
+                              newer_filename: Optional[str] = None,
+                              older_filename: Optional[str] = None) -> str:
+        """
+        ギャラリーの1ページ分のHTMLを生成
+        
+        Args:
+            filename: ページのファイル名
+            page: ページ番号
+            records: ページに載せる生成履歴（Catalog の行。新しい順に表示する）
+            newer_filename: 新しい側のページのファイル名
+            older_filename: 古い側のページのファイル名
+            
+        Returns:
+            ページのHTMLファイルのパス
+        """
+        items = "".join(self._generate_gallery_item(record) for record in reversed(records))
+        newer_link = (GALLERY_PAGER_LINK_TEMPLATE.substitute(href=escape(newer_filename), label="← 新しい単語")
+                      if newer_filename else "<span></span>")
+        older_link = (GALLERY_PAGER_LINK_TEMPLATE.substitute(href=escape(older_filename), label="古い単語 →")
+                      if older_filename else "<span></span>")
+        
+        html_content = GALLERY_PAGE_TEMPLATE.substitute(
+            page=page,
+            stylesheet=escape(self.stylesheet_href),
+            newer_link=newer_link,
+            older_link=older_link,
+            items=items
+        )
+        
+        html_path = os.path.join(self.output_dir, filename)
+        try:
+            self._write_atomic(html_path, html_content)
+        except Exception as e:
+            raise Exception(f"一覧ページの生成中にエラーが発生しました: {str(e)}")
+        return html_path
+    
+    def generate_gallery_index(self, latest_filename: str) -> str:
         """
-        生成した全ての単語のインデックスHTMLを生成
+        最新のギャラリーページへ移動する index.html を生成
         
         Args:
-            generated_words: 生成した単語のリスト
+            latest_filename: 最新ページのファイル名
             
         Returns:
             インデックスHTMLファイルのパス
         """
         html_path = os.path.join(self.output_dir, "index.html")
-        
-        word_links = ""
-        for word in generated_words:
-            word_links += f'<li><a href="{word}_viewer.html">{word}</a></li>\\n'
-        
-        html_content = f"""<!DOCTYPE html>
-<html lang="ja">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Word Image Maker - 単語一覧</title>
-    <style>
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }}
-        
-        .container {{
-            background-color: white;
-            border-radius: 12px;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-            padding: 30px;
-        }}
-        
-        h1 {{
-            color: #2c3e50;
-            text-align: center;
-            margin-bottom: 30px;
-        }}
-        
-        ul {{
-            list-style-type: none;
-            padding: 0;
-        }}
-        
-        li {{
-            margin-bottom: 10px;
-            padding: 10px;
-            background-color: #f8f9fa;
-            border-radius: 6px;
-            border-left: 4px solid #3498db;
-        }}
-        
-        a {{
-            text-decoration: none;
-            color: #2c3e50;
-            font-weight: bold;
-            font-size: 1.1em;
-        }}
-        
-        a:hover {{
-            color: #3498db;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>Word Image Maker - 生成した単語一覧</h1>
-        <ul>
-            {word_links}
-        </ul>
-    </div>
-</body>
-</html>"""
+        html_content = GALLERY_INDEX_TEMPLATE.substitute(stylesheet=escape(self.stylesheet_href),
+                                                         href=escape(latest_filename))
         
         try:
-            with open(html_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            
+            self._write_atomic(html_path, html_content)
             print(f"インデックスHTMLファイルを生成しました: {html_path}")
             return html_path
             
         except Exception as e:
-            raise Exception(f"インデックスHTMLファイルの生成中にエラーが発生しました: {str(e)}")
\ No newline at end of file
+            raise Exception(f"インデックスHTMLファイルの生成中にエラーが発生しました: {str(e)}")
+    
+    def _generate_gallery_item(self, record: Dict[str, Any]) -> str:
+        """ギャラリーの1単語分のHTMLを生成"""
+        image_url = self._relative_url(record["image_path"])
+        thumbnail_url = self._relative_url(record["thumbnail_path"]) if record.get("thumbnail_path") else image_url
+        
+        return GALLERY_ITEM_TEMPLATE.substitute(
+            href=escape(os.path.basename(record["html_path"])),
+            thumbnail=escape(thumbnail_url),
+            image_js=escape(json.dumps(image_url)),
+            word=escape(record["word"]),
+            quality=escape(record["quality"]),
+            created_at=datetime.fromtimestamp(record["created_at"]).strftime("%Y-%m-%d %H:%M")
+        )
+    
+    def _relative_url(self, path: str) -> str:
+        """output_dir からの相対URL（区切り文字は /）"""
+        return os.path.relpath(path, self.output_dir).replace(os.sep, "/")
+    
+    def _write_atomic(self, path: str, content: str):
+        """表示中のページが壊れないよう、一時ファイルに書いてから置き換える"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            # mkstemp は所有者のみ読める権限で作るので、open() で書いた場合と同じ権限に戻す
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def _format_ms(milliseconds: float) -> str:
+    """ミリ秒を表示用に整形（1秒以上は秒で表示）"""
+    if milliseconds >= 1000:
+        return f"{milliseconds / 1000:.2f} s"
+    return f"{milliseconds:.0f} ms"
@@ -0,0 +1,399 @@
+"""
+ビューア・インデックスHTMLのテンプレートと共有スタイルシート
+
+CSSはすべてのページで共通の外部ファイル（内容のハッシュ付きファイル名）にまとめ、
+ブラウザがギャラリー全体で1度だけ取得・キャッシュできるようにする。
+テンプレートはモジュール読み込み時に1度だけ作成し、描画は1回の置換で行う。
+値のHTMLエスケープは呼び出し側（HTMLGenerator）で行う。
+"""
+
+import hashlib
+from string import Template
+
+STYLESHEET_CSS = """body {
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    max-width: 1200px;
+    margin: 0 auto;
+    padding: 20px;
+    background-color: #f5f5f5;
+}
+
+.container {
+    background-color: white;
+    border-radius: 12px;
+    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+    padding: 30px;
+    margin-bottom: 20px;
+}
+
+.header {
+    text-align: center;
+    margin-bottom: 30px;
+}
+
+.word-title {
+    font-size: 3em;
+    color: #2c3e50;
+    margin: 0;
+    font-weight: bold;
+}
+
+.subtitle {
+    font-size: 1.2em;
+    color: #7f8c8d;
+    margin-top: 10px;
+}
+
+.content {
+    display: grid;
+    grid-template-columns: 1fr 1fr;
+    gap: 30px;
+    align-items: start;
+}
+
+.image-section {
+    text-align: center;
+}
+
+.image-caption {
+    margin-top: 15px;
+    color: #6c757d;
+    font-style: italic;
+}
+
+.generated-image {
+    max-width: 100%;
+    height: auto;
+    border-radius: 8px;
+    box-shadow: 0 2px 8px rgba(0, 0, 0, 0.15);
+    border: 3px solid #3498db;
+}
+
+.info-section {
+    background-color: #f8f9fa;
+    padding: 20px;
+    border-radius: 8px;
+    border-left: 4px solid #3498db;
+}
+
+.info-item {
+    margin-bottom: 20px;
+}
+
+.info-label {
+    font-weight: bold;
+    color: #2c3e50;
+    font-size: 1.1em;
+    margin-bottom: 8px;
+    display: block;
+}
+
+.info-content {
+    color: #34495e;
+    line-height: 1.6;
+    font-size: 1em;
+}
+
+.scene-description {
+    background-color: #e8f5e8;
+    padding: 15px;
+    border-radius: 6px;
+    border-left: 4px solid #27ae60;
+}
+
+.core-image {
+    background-color: #fff3cd;
+    padding: 15px;
+    border-radius: 6px;
+    border-left: 4px solid #ffc107;
+}
+
+.prompt {
+    background-color: #e7f3ff;
+    padding: 15px;
+    border-radius: 6px;
+    border-left: 4px solid #007bff;
+    font-family: 'Courier New', monospace;
+    font-size: 0.9em;
+}
+
+.cost-info {
+    background-color: #f0f8ff;
+    padding: 15px;
+    border-radius: 6px;
+    border-left: 4px solid #20a5ff;
+    font-family: 'Courier New', monospace;
+    font-size: 0.85em;
+}
+
+.cost-info pre {
+    margin: 0;
+    white-space: pre-wrap;
+    color: #1e3a8a;
+}
+
+.timing-info {
+    background-color: #f8f9fa;
+    padding: 15px;
+    border-radius: 6px;
+    border-left: 4px solid #6c757d;
+    font-size: 0.85em;
+}
+
+.timing-row {
+    display: grid;
+    grid-template-columns: 9em 1fr 5.5em;
+    align-items: center;
+    gap: 8px;
+    margin: 3px 0;
+}
+
+.timing-name {
+    font-family: 'Courier New', monospace;
+    color: #495057;
+}
+
+.timing-track {
+    position: relative;
+    height: 10px;
+    background-color: #e9ecef;
+    border-radius: 3px;
+}
+
+.timing-bar {
+    position: absolute;
+    top: 0;
+    bottom: 0;
+    min-width: 2px;
+    background-color: #6c757d;
+    border-radius: 3px;
+}
+
+.timing-duration {
+    text-align: right;
+    font-family: 'Courier New', monospace;
+    color: #495057;
+}
+
+.footer {
+    text-align: center;
+    margin-top: 30px;
+    padding-top: 20px;
+    border-top: 1px solid #dee2e6;
+    color: #6c757d;
+}
+
+@media (max-width: 768px) {
+    .content {
+        grid-template-columns: 1fr;
+    }
+
+    .word-title {
+        font-size: 2.5em;
+    }
+}
+
+/* インデックスページ */
+body.index-page {
+    max-width: 800px;
+}
+
+.index-page h1 {
+    color: #2c3e50;
+    text-align: center;
+    margin-bottom: 30px;
+}
+
+.index-page ul {
+    list-style-type: none;
+    padding: 0;
+}
+
+.index-page li {
+    margin-bottom: 10px;
+    padding: 10px;
+    background-color: #f8f9fa;
+    border-radius: 6px;
+    border-left: 4px solid #3498db;
+}
+
+.index-page a {
+    text-decoration: none;
+    color: #2c3e50;
+    font-weight: bold;
+    font-size: 1.1em;
+}
+
+.index-page a:hover {
+    color: #3498db;
+}
+
+/* ギャラリーページ */
+body.gallery-page {
+    max-width: 1200px;
+}
+
+.gallery-page .gallery {
+    display: grid;
+    grid-template-columns: repeat(auto-fill, minmax(180px, 1fr));
+    gap: 16px;
+}
+
+.gallery-page .gallery li {
+    margin: 0;
+    text-align: center;
+}
+
+.gallery-page .gallery img {
+    width: 100%;
+    height: auto;
+    border-radius: 6px;
+    display: block;
+    margin-bottom: 8px;
+}
+
+.gallery-page .gallery small {
+    display: block;
+    color: #6c757d;
+    font-weight: normal;
+}
+
+.gallery-page .pager {
+    display: flex;
+    justify-content: space-between;
+    margin: 20px 0;
+}
+"""
+
+# 内容が変わるとファイル名も変わるので、ブラウザは無期限にキャッシュできる
+STYLESHEET_NAME = f"viewer-{hashlib.sha256(STYLESHEET_CSS.encode('utf-8')).hexdigest()[:10]}.css"
+
+VIEWER_TEMPLATE = Template("""<!DOCTYPE html>
+<html lang="ja">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Word Image Maker - $word</title>
+    <link rel="stylesheet" href="$stylesheet">
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1 class="word-title">$word</h1>
+            <p class="subtitle">英単語イメージイラスト</p>
+        </div>
+
+        <div class="content">
+            <div class="image-section">
+                $image_markup
+                <p class="image-caption">
+                    生成されたイラスト
+                </p>
+            </div>
+
+            <div class="info-section">
+                <div class="info-item">
+                    <span class="info-label">🎬 シーンの内容</span>
+                    <div class="info-content scene-description">
+                        $scene_description
+                    </div>
+                </div>
+
+                <div class="info-item">
+                    <span class="info-label">🎯 表すコアイメージ</span>
+                    <div class="info-content core-image">
+                        $core_image
+                    </div>
+                </div>
+
+                <div class="info-item">
+                    <span class="info-label">🤖 生成プロンプト</span>
+                    <div class="info-content prompt">
+                        $illustration_prompt
+                    </div>
+                </div>
+
+                $cost_section
+                $timing_section
+            </div>
+        </div>
+
+        <div class="footer">
+            <p>Word Image Maker - 英単語学習支援ツール</p>
+            <p>Generated on: $generated_at</p>
+        </div>
+    </div>
+</body>
+</html>""")
+
+COST_SECTION_TEMPLATE = Template("""
+                <div class="info-item">
+                    <span class="info-label">💰 生成コスト</span>
+                    <div class="info-content cost-info">
+                        <pre>$cost_display</pre>
+                    </div>
+                </div>
+        """)
+
+TIMING_SECTION_TEMPLATE = Template("""
+                <div class="info-item">
+                    <span class="info-label">⏱️ 処理時間の内訳（合計 $total）</span>
+                    <div class="info-content timing-info">$rows
+                    </div>
+                </div>
+        """)
+
+TIMING_ROW_TEMPLATE = Template("""
+                        <div class="timing-row">
+                            <span class="timing-name">$name</span>
+                            <span class="timing-track"><span class="timing-bar" style="left: $left%; width: $width%"></span></span>
+                            <span class="timing-duration">$duration</span>
+                        </div>""")
+
+GALLERY_PAGE_TEMPLATE = Template("""<!DOCTYPE html>
+<html lang="ja">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Word Image Maker - 単語一覧 ($page)</title>
+    <link rel="stylesheet" href="$stylesheet">
+</head>
+<body class="index-page gallery-page">
+    <div class="container">
+        <h1>Word Image Maker - 生成した単語一覧</h1>
+        <nav class="pager">$newer_link $older_link</nav>
+        <ul class="gallery">
+            $items
+        </ul>
+        <nav class="pager">$newer_link $older_link</nav>
+    </div>
+</body>
+</html>""")
+
+GALLERY_ITEM_TEMPLATE = Template("""<li>
+                <a href="$href">
+                    <img src="$thumbnail" alt="$word" width="256" height="256" loading="lazy" decoding="async"
+                         onerror="this.onerror=null;this.src=$image_js">
+                    $word
+                    <small>$quality $created_at</small>
+                </a>
+            </li>
+            """)
+
+GALLERY_PAGER_LINK_TEMPLATE = Template('<a href="$href">$label</a>')
+
+GALLERY_INDEX_TEMPLATE = Template("""<!DOCTYPE html>
+<html lang="ja">
+<head>
+    <meta charset="UTF-8">
+    <meta http-equiv="refresh" content="0; url=$href">
+    <title>Word Image Maker - 単語一覧</title>
+    <link rel="stylesheet" href="$stylesheet">
+</head>
+<body class="index-page">
+    <div class="container">
+        <h1>Word Image Maker - 生成した単語一覧</h1>
+        <p><a href="$href">最新の一覧ページを開く</a></p>
+    </div>
+</body>
+</html>""")
@@ -0,0 +1,67 @@
+"""
+配信ファイルの強いETagを計算・キャッシュするユーティリティ
+
+ファイル内容のSHA-256をETagにするが、毎回ハッシュを計算しないよう
+(パス, 更新日時, サイズ) が変わらない限り計算済みの値を再利用する。
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+
+class FileETagCache:
+    # タイムスタンプ付きで生成され、以後書き換えられない画像ファイル名
+    # （例: beg_20250711_153352.png, beg_20250711_153352_2_w256.webp）
+    # および内容のハッシュ付きの共有アセット（例: viewer-1a2b3c4d5e.css）
+    IMMUTABLE_PATTERN = re.compile(r"(?:_\d{8}_\d{6}(?:_\d+)?(?:_w\d+)?\.(?:png|webp|avif)"
+                                   r"|-[0-9a-f]{10}\.css)$")
+
+    def __init__(self, max_entries: int = 4096):
+        """
+        ETagキャッシュを初期化
+
+        Args:
+            max_entries: 保持するエントリ数の上限
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def is_immutable(cls, filename: str) -> bool:
+        """ファイル名から、内容が変わらないファイルかどうかを判定"""
+        return bool(cls.IMMUTABLE_PATTERN.search(filename))
+
+    def get(self, path: str, stat: os.stat_result) -> str:
+        """
+        ファイルのETagを取得
+
+        Args:
+            path: ファイルのパス
+            stat: os.stat の結果
+
+        Returns:
+            ETag（引用符なし）
+        """
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            etag = self._entries.get(key)
+            if etag is not None:
+                self._entries.move_to_end(key)
+                return etag
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        etag = digest.hexdigest()[:32]
+
+        with self._lock:
+            self._entries[key] = etag
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
@@ -0,0 +1,184 @@
+"""
+生成画像のコンテンツアドレス型キャッシュ
+
+ベース画像・プロンプト・サイズ・品質・モデルが同じ画像編集リクエストに対して、
+以前に生成したPNGと使用量情報を返し、images.edit の呼び出しを省く。
+
+キャッシュ画像は output/images の生成画像とハードリンクで共有するため、容量の上限は
+キャッシュだけが持っている（リンク数が1の）画像に対して適用する。共有中の画像を削除しても
+ディスクは空かないので、削除の対象にもしない。
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+class ImageCache:
+    # ヒット時の最終利用時刻をインデックスに書き出す最短間隔（秒）
+    INDEX_FLUSH_INTERVAL = 30.0
+
+    def __init__(self, cache_dir: str = "output/cache/images", max_bytes: int = 500 * 1024 * 1024):
+        """
+        画像キャッシュを初期化
+
+        Args:
+            cache_dir: キャッシュ画像とインデックスの保存先
+            max_bytes: キャッシュだけが持つ画像の合計サイズ上限（超えた場合は最終利用の古いものから削除）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        # 書き出していない最終利用時刻の更新があるか
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._entries = self._load_index()
+        # 最後の更新はプロセス終了時に書き出す
+        atexit.register(self.flush)
+
+    @staticmethod
+    def make_key(base_image_hash: str, prompt: str, size: str, quality: str, model: str) -> str:
+        """
+        キャッシュキーを生成
+
+        Args:
+            base_image_hash: ベース画像バイト列のSHA-256
+            prompt: イラスト作成プロンプト
+            size: 画像サイズ
+            quality: 画像品質
+            model: 画像モデル
+
+        Returns:
+            SHA-256 の16進文字列
+        """
+        payload = json.dumps([base_image_hash, prompt, size, quality, model], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, dest_path: str) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュされた画像を dest_path に配置して使用量情報を返す
+
+        Args:
+            key: make_key で生成したキー
+            dest_path: 画像の配置先
+
+        Returns:
+            元の生成時の使用量情報（キャッシュにない場合は None）
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            blob_path = os.path.join(self.cache_dir, entry["blob"])
+            try:
+                self._link_or_copy(blob_path, dest_path)
+            except OSError:
+                # ファイルが外部で削除された場合はエントリを破棄
+                del self._entries[key]
+                self._save_index()
+                return None
+
+            # 最終利用時刻はまとめて書き出す（ヒットのたびにインデックス全体を書き直さない）
+            entry["last_access"] = time.time()
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.INDEX_FLUSH_INTERVAL:
+                self._save_index()
+            return dict(entry["usage"])
+
+    def put(self, key: str, image_path: str, usage: Dict[str, Any]):
+        """
+        生成した画像をキャッシュに登録
+
+        Args:
+            key: make_key で生成したキー
+            image_path: 生成された画像のパス
+            usage: images.edit の使用量情報
+        """
+        blob = f"{key}.png"
+        blob_path = os.path.join(self.cache_dir, blob)
+
+        with self._lock:
+            try:
+                self._link_or_copy(image_path, blob_path)
+                size = os.path.getsize(blob_path)
+            except OSError as e:
+                print(f"画像キャッシュの保存に失敗しました: {str(e)}")
+                return
+
+            self._entries[key] = {
+                "blob": blob,
+                "usage": usage,
+                "size": size,
+                "last_access": time.time()
+            }
+            self._evict()
+            self._save_index()
+
+    def flush(self):
+        """まだ書き出していない最終利用時刻をインデックスに保存"""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _evict(self):
+        """
+        キャッシュだけが持つ画像の合計サイズが上限を超えていれば、最終利用の古いものから削除
+
+        生成画像とハードリンクで共有している画像は削除しても容量が空かないので数えない。
+        """
+        owned = []
+        for key, entry in self._entries.items():
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, entry["blob"]))
+            except OSError:
+                continue
+            if stat.st_nlink == 1:
+                owned.append((entry["last_access"], key, stat.st_size))
+
+        total = sum(size for _, _, size in owned)
+        for _, key, size in sorted(owned):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, self._entries[key]["blob"]))
+            except OSError:
+                pass
+            total -= size
+            del self._entries[key]
+
+    def _link_or_copy(self, src: str, dest: str):
+        # ハードリンクならディスクを消費しない（未対応のファイルシステムではコピー）
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copyfile(src, dest)
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"画像キャッシュのインデックス保存に失敗しました: {str(e)}")
@@ -0,0 +1,275 @@
+"""
+生成画像の派生ファイル（サムネイル・WebP/AVIF版）を作成するユーティリティ
+
+元のPNG（1.5〜3MB）の代わりにブラウザが最小の適切なファイルを選べるよう、
+縮小したWebPと、対応環境ではAVIFの派生ファイルを元画像と同じフォルダに作成する。
+
+派生ファイル名（AVIFは avif_enabled を有効にし、Pillowが対応している場合のみ作成）:
+    {元のファイル名}_w256.webp / .avif  サムネイル
+    {元のファイル名}_w512.webp / .avif  中サイズ
+    {元のファイル名}.webp / .avif       元サイズ
+
+すべての派生ファイルの作成には1枚あたり1秒以上かかるため、保存直後（process）には
+一覧ページで使うサムネイルだけを作成し、残りは最初に要求されたときに1つずつ作成する。
+"""
+
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class ImageDerivatives:
+    # サムネイルの幅
+    THUMBNAIL_WIDTH = 256
+    # 縮小版を作成する幅（サムネイルを含む）
+    WIDTHS = (256, 512)
+    # バックグラウンドで作成するスレッド数の既定値
+    DEFAULT_MAX_WORKERS = max(2, min(4, os.cpu_count() or 1))
+    # AVIFも作成するか（エンコードが重いため既定では作成しない）
+    avif_enabled = False
+
+    _DERIVATIVE_PATTERN = re.compile(r"^(?P<stem>.+?)(?:_w(?P<width>\d+))?\.(?P<format>webp|avif)$")
+    _avif_supported = None
+
+    def __init__(self, background: bool = True, webp_quality: int = 80, avif_quality: int = 60,
+                 max_workers: Optional[int] = None, eager_all: bool = False):
+        """
+        派生ファイル作成器を初期化
+
+        Args:
+            background: process() でバックグラウンド作成するか（False の場合はその場で作成）
+            webp_quality: WebPの品質（0-100）
+            avif_quality: AVIFの品質（0-100）
+            max_workers: バックグラウンドで作成するスレッド数（省略時は DEFAULT_MAX_WORKERS）
+            eager_all: True の場合は process() ですべての派生ファイルを作成する（既定はサムネイルのみ）
+        """
+        self.background = background
+        self.webp_quality = webp_quality
+        self.avif_quality = avif_quality
+        self.max_workers = max_workers or self.DEFAULT_MAX_WORKERS
+        self.eager_all = eager_all
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def avif_supported(cls) -> bool:
+        """PillowがAVIFの書き出しに対応しているか"""
+        if cls._avif_supported is None:
+            try:
+                from PIL import features
+                cls._avif_supported = bool(features.check("avif"))
+            except Exception:
+                cls._avif_supported = False
+        return cls._avif_supported
+
+    @classmethod
+    def thumbnail_name(cls, image_filename: str) -> str:
+        """元画像のファイル名からサムネイルのファイル名を取得"""
+        return cls.derivative_name(image_filename, cls.THUMBNAIL_WIDTH)
+
+    @staticmethod
+    def derivative_name(image_filename: str, width: Optional[int] = None, image_format: str = "webp") -> str:
+        """
+        元画像のファイル名から派生ファイル名を取得
+
+        Args:
+            image_filename: 元画像のファイル名
+            width: 縮小後の幅（None の場合は元サイズ）
+            image_format: webp または avif
+
+        Returns:
+            派生ファイル名
+        """
+        stem = os.path.splitext(image_filename)[0]
+        if width:
+            return f"{stem}_w{width}.{image_format}"
+        return f"{stem}.{image_format}"
+
+    @classmethod
+    def formats(cls) -> List[str]:
+        """作成する形式（ブラウザに優先して選ばせたい順）"""
+        return ["avif", "webp"] if cls.avif_enabled and cls.avif_supported() else ["webp"]
+
+    @classmethod
+    def renditions(cls, image_filename: str) -> List[Tuple[str, Optional[int], str]]:
+        """
+        作成する派生ファイルの一覧を取得
+
+        Returns:
+            (ファイル名, 幅または None, 形式) のリスト
+        """
+        return [
+            (cls.derivative_name(image_filename, width, image_format), width, image_format)
+            for image_format in cls.formats()
+            for width in cls.WIDTHS + (None,)
+        ]
+
+    @classmethod
+    def picture_sources(cls, image_url: str, full_width: int) -> List[Tuple[str, str]]:
+        """
+        <picture> の <source> に指定する形式ごとの srcset を取得
+
+        Args:
+            image_url: HTMLから参照する元画像（PNG）のURL（相対パス可）
+            full_width: 元画像の幅
+
+        Returns:
+            (MIMEタイプ, srcset) のリスト
+        """
+        directory, filename = image_url.rsplit("/", 1) if "/" in image_url else ("", image_url)
+        prefix = f"{directory}/" if directory else ""
+
+        sources = []
+        for image_format in cls.formats():
+            candidates = [
+                f"{prefix}{cls.derivative_name(filename, width, image_format)} {width}w"
+                for width in cls.WIDTHS if width < full_width
+            ]
+            candidates.append(f"{prefix}{cls.derivative_name(filename, image_format=image_format)} {full_width}w")
+            sources.append((f"image/{image_format}", ", ".join(candidates)))
+        return sources
+
+    @classmethod
+    def parse_derivative_name(cls, filename: str) -> Optional[str]:
+        """
+        派生ファイル名から元画像（PNG）のファイル名を取得
+
+        Returns:
+            元画像のファイル名（派生ファイル名でない場合は None）
+        """
+        match = cls._DERIVATIVE_PATTERN.match(filename)
+        if not match:
+            return None
+        width = match.group("width")
+        if width and int(width) not in cls.WIDTHS:
+            return None
+        return f"{match.group('stem')}.png"
+
+    def build(self, image_path: str, names: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """
+        元画像の派生ファイルを作成（作成済みのものはスキップ）
+
+        Args:
+            image_path: 元画像（PNG）のパス
+            names: 作成する派生ファイル名（省略時はすべて）
+
+        Returns:
+            派生ファイル名からパスへの辞書（names を指定しなかったものは未作成の場合がある）
+        """
+        from PIL import Image
+
+        directory = os.path.dirname(image_path)
+        filename = os.path.basename(image_path)
+        wanted = set(names) if names is not None else None
+        missing = [
+            (os.path.join(directory, name), width, image_format)
+            for name, width, image_format in self.renditions(filename)
+            if (wanted is None or name in wanted) and not os.path.exists(os.path.join(directory, name))
+        ]
+
+        if missing:
+            with Image.open(image_path) as source:
+                source.load()
+                for path, width, image_format in missing:
+                    self._write_rendition(source, path, width, image_format)
+
+        return {name: os.path.join(directory, name) for name, _, _ in self.renditions(filename)}
+
+    def build_for_name(self, images_dir: str, filename: str) -> Optional[str]:
+        """
+        リクエストされた派生ファイルを必要に応じて作成（遅延作成）
+
+        Args:
+            images_dir: 画像フォルダ
+            filename: 派生ファイル名
+
+        Returns:
+            派生ファイルのパス（元画像がない、または派生ファイル名でない場合は None）
+        """
+        source_name = self.parse_derivative_name(filename)
+        if source_name is None:
+            return None
+
+        source_path = os.path.join(images_dir, source_name)
+        if not os.path.exists(source_path):
+            return None
+
+        return self.build(source_path, [filename]).get(filename)
+
+    def process(self, image_path: str):
+        """
+        新しく保存された画像のサムネイル（eager_all の場合はすべての派生ファイル）を作成
+        （background 設定に応じて同期/非同期）
+
+        Args:
+            image_path: 元画像（PNG）のパス
+        """
+        names = None if self.eager_all else [self.thumbnail_name(os.path.basename(image_path))]
+        if self.background:
+            self.schedule(image_path, names)
+            return
+
+        try:
+            self.build(image_path, names)
+        except Exception as e:
+            print(f"派生画像の作成中にエラーが発生しました: {str(e)}")
+
+    def schedule(self, image_path: str, names: Optional[Iterable[str]] = None):
+        """
+        派生ファイルの作成をバックグラウンドで開始
+
+        Args:
+            image_path: 元画像（PNG）のパス
+            names: 作成する派生ファイル名（省略時はすべて）
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="derivatives")
+            future = self._executor.submit(self.build, image_path, names)
+            self._pending.add(future)
+        future.add_done_callback(self._finished)
+
+    def wait(self):
+        """バックグラウンドで作成中の派生ファイルがすべてできるまで待つ"""
+        with self._lock:
+            pending = list(self._pending)
+        wait_futures(pending)
+
+    def pending_count(self) -> int:
+        """バックグラウンドで作成待ち・作成中の画像の数"""
+        with self._lock:
+            return len(self._pending)
+
+    def _finished(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        error = future.exception()
+        if error is not None:
+            print(f"派生画像の作成中にエラーが発生しました: {str(error)}")
+
+    def _write_rendition(self, source, path: str, width: Optional[int], image_format: str):
+        from PIL import Image
+
+        image = source
+        if width and source.width > width:
+            height = round(source.height * width / source.width)
+            image = source.resize((width, height), Image.LANCZOS)
+
+        directory = os.path.dirname(path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if image_format == "avif":
+                    image.save(f, format="AVIF", quality=self.avif_quality)
+                else:
+                    image.save(f, format="WEBP", quality=self.webp_quality, method=4)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -1,22 +1,77 @@
 import os
-import requests
+import sys
+import time
+import tempfile
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from .openai_client import OpenAIClient
 from .cost_calculator import CostCalculator
+from .image_cache import ImageCache
+from .character_images import CharacterImageRegistry
+from .image_derivatives import ImageDerivatives
+from .errors import WordImageError
+from . import tracing
+
+
+def _process_peak_rss_bytes() -> Optional[int]:
+    """
+    プロセス全体の最大常駐メモリ（バイト）を取得（取得できない環境では None）
+    
+    プロセス起動からの最大値で下がることはないため、1枚の保存で使ったメモリではない。
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB 単位、macOS はバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _remove_if_exists(path: str):
+    """ファイルを削除（既にない場合は何もしない）"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
 
 class ImageGenerator:
-    def __init__(self, openai_client: OpenAIClient, output_dir: str = "output/images"):
-        """イメージ生成器を初期化"""
+    # 画像生成に使用するモデルとサイズ
+    IMAGE_MODEL = "gpt-image-1"
+    IMAGE_SIZE = "1024x1024"
+    # 一度にデコードするbase64文字数（4の倍数）
+    DECODE_CHUNK_CHARS = 256 * 1024
+
+    def __init__(self, openai_client: OpenAIClient, output_dir: str = "output/images",
+                 image_cache: Optional[ImageCache] = None,
+                 cost_calculator: Optional[CostCalculator] = None,
+                 character_images: Optional[CharacterImageRegistry] = None,
+                 derivatives: Optional[ImageDerivatives] = None):
+        """
+        イメージ生成器を初期化
+        
+        Args:
+            openai_client: OpenAI APIクライアント
+            output_dir: 画像の出力先
+            image_cache: 生成画像のキャッシュ（省略時はキャッシュしない）
+            cost_calculator: 共有するコスト計算機（省略時は新規作成）
+            character_images: ベース画像のレジストリ（省略時は新規作成）
+            derivatives: 保存後にサムネイル・WebP版を作成する場合に指定
+        """
         self.openai_client = openai_client
         self.output_dir = output_dir
-        self.cost_calculator = CostCalculator()
+        self.cost_calculator = cost_calculator or CostCalculator()
+        self.image_cache = image_cache
+        self.character_images = character_images or CharacterImageRegistry()
+        self.derivatives = derivatives
         
         # 出力ディレクトリが存在しない場合は作成
         os.makedirs(self.output_dir, exist_ok=True)
     
-    def generate_image(self, base_image_path: str, scene_data: Dict[str, Any], quality: str = "auto") -> str:
+    def generate_image(self, base_image_path: str, scene_data: Dict[str, Any], quality: str = "auto",
+                       use_cache: bool = True) -> str:
         """
         シーンデータを基にイラストを生成
         
@@ -24,6 +79,7 @@ class ImageGenerator:
             base_image_path: ベースとなるキャラクター画像のパス（参考用）
             scene_data: シーンデータ
             quality: 画像品質（auto, low, medium, high）
+            use_cache: Falseの場合はキャッシュを使わず新しい画像を生成する
             
         Returns:
             生成された画像のローカルパス
@@ -36,43 +92,112 @@ class ImageGenerator:
         print(f"品質設定: {quality}")
         
         try:
-            # gpt-image-1でベース画像を編集
-            image_result = self.openai_client.create_image_edit(
-                image_path=base_image_path,
-                prompt=prompt,
-                size="1024x1024",
-                quality=quality
-            )
+            cache_key = None
+            image_usage = None
+            if self.image_cache is not None:
+                # ベース画像のハッシュはレジストリが読み込み時に計算済み
+                base_image_hash = self.character_images.get(base_image_path).sha256
+                cache_key = ImageCache.make_key(base_image_hash, prompt,
+                                                self.IMAGE_SIZE, quality, self.IMAGE_MODEL)
+                if use_cache:
+                    image_path = self._new_image_path(word)
+                    try:
+                        with tracing.span("image_cache"):
+                            image_usage = self.image_cache.get(cache_key, image_path)
+                    except BaseException:
+                        # 予約した空ファイルを壊れた画像として残さない
+                        _remove_if_exists(image_path)
+                        raise
+                    if image_usage is not None:
+                        print(f"キャッシュ済みのイラストを使用します: {image_path}")
+                    else:
+                        _remove_if_exists(image_path)
             
-            # 生成された画像をbase64から保存
-            image_path = self._save_image_from_base64(image_result["image_data"], word)
+            cached = image_usage is not None
+            image_attempts = []
+            if cached:
+                image_stats = {"bytes": os.path.getsize(image_path), "cached": True}
+            else:
+                # gpt-image-1でベース画像を編集
+                image_result = self.openai_client.create_image_edit(
+                    image_path=base_image_path,
+                    prompt=prompt,
+                    size=self.IMAGE_SIZE,
+                    quality=quality
+                )
+                
+                # 生成された画像をbase64から保存（辞書からは外すので、保存が終われば base64 文字列への参照は残らない。
+                # デコード中は _save_image_from_base64 の引数として全体を保持している）
+                with tracing.span("image_save"):
+                    image_path, image_stats = self._save_image_from_base64(image_result.pop("image_data"), word)
+                image_usage = image_result.get("usage", {})
+                image_attempts = image_result.get("attempts", [])
+                
+                if cache_key is not None:
+                    self.image_cache.put(cache_key, image_path, image_usage)
+            
+            # サムネイル・WebP版を作成
+            if self.derivatives is not None:
+                with tracing.span("derivatives"):
+                    self.derivatives.process(image_path)
             
             # コスト計算を追加
             chat_cost = self.cost_calculator.calculate_chat_cost(scene_data.get("usage", {}))
             
-            # APIレスポンスから正確なトークン数を取得
-            image_usage = image_result.get("usage", {})
+            # APIレスポンス（キャッシュ時は元の生成時）から正確なトークン数を取得
             text_tokens = image_usage.get("input_tokens_details", {}).get("text_tokens", 0)
             image_tokens = image_usage.get("input_tokens_details", {}).get("image_tokens", 0)
             output_tokens = image_usage.get("output_tokens", 0)
             
             image_cost = self.cost_calculator.calculate_image_cost(
-                model="gpt-image-1", 
+                model=self.IMAGE_MODEL, 
                 quality=quality,
-                size="1024x1024",
+                size=self.IMAGE_SIZE,
                 count=1,
                 prompt_tokens=text_tokens,
                 image_tokens=image_tokens,
-                output_tokens=output_tokens
+                output_tokens=output_tokens,
+                cached=cached
             )
             total_cost = self.cost_calculator.calculate_total_cost(chat_cost, image_cost)
+            total_cost["image_stats"] = image_stats
+            total_cost["image_usage"] = image_usage
+            total_cost["image_attempts"] = image_attempts
             
             print(f"イラスト生成完了: {image_path}")
             return image_path, total_cost
             
+        except WordImageError:
+            # 再試行の可否などの分類を呼び出し側に残す
+            raise
         except Exception as e:
             raise Exception(f"イラスト生成中にエラーが発生しました: {str(e)}")
     
+    def _new_image_path(self, word: str) -> str:
+        """
+        新しい画像の保存先パスを生成
+        
+        同じ秒に同じ単語の画像が複数生成されても上書きしないよう、
+        空ファイルを排他的に作成してパスを確保する。
+        
+        Args:
+            word: 英単語（ファイル名用）
+            
+        Returns:
+            タイムスタンプ付きの画像パス
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = ""
+        counter = 1
+        while True:
+            filepath = os.path.join(self.output_dir, f"{word}_{timestamp}{suffix}.png")
+            try:
+                os.close(os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return filepath
+            except FileExistsError:
+                counter += 1
+                suffix = f"_{counter}"
+    
     def _download_image(self, image_url: str, word: str) -> str:
         """
         画像URLから画像をダウンロードして保存
@@ -84,11 +209,11 @@ class ImageGenerator:
         Returns:
             保存された画像のパス
         """
+        import requests
+        
         try:
             # ファイル名を生成（タイムスタンプ付き）
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{word}_{timestamp}.png"
-            filepath = os.path.join(self.output_dir, filename)
+            filepath = self._new_image_path(word)
             
             # 画像をダウンロード
             response = requests.get(image_url, timeout=30)
@@ -105,33 +230,59 @@ class ImageGenerator:
         except Exception as e:
             raise Exception(f"画像の保存中にエラーが発生しました: {str(e)}")
     
-    def _save_image_from_base64(self, image_b64: str, word: str) -> str:
+    def _save_image_from_base64(self, image_b64: str, word: str) -> Tuple[str, Dict[str, Any]]:
         """
         base64データから画像を保存
         
+        デコード結果全体をメモリに持たないよう、チャンク単位でデコードしながら
+        一時ファイルに書き込み、完了後に保存先へアトミックに置き換える。
+        
         Args:
             image_b64: base64エンコードされた画像データ
             word: 英単語（ファイル名用）
             
         Returns:
-            保存された画像のパス
+            (保存された画像のパス, 保存時の統計情報)
         """
         try:
             import base64
-            from datetime import datetime
+            
+            start = time.perf_counter()
             
             # ファイル名を生成（タイムスタンプ付き）
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{word}_{timestamp}.png"
-            filepath = os.path.join(self.output_dir, filename)
+            filepath = self._new_image_path(word)
             
-            # base64データをデコードして保存
-            image_data = base64.b64decode(image_b64)
+            # base64データをチャンクごとにデコードして一時ファイルに保存
+            tmp_path = None
+            written = 0
+            # 一度に持つ作業用バッファ（base64の切り出しとデコード結果）の最大サイズ
+            buffer_peak = 0
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, suffix=".tmp")
+                with os.fdopen(fd, 'wb') as f:
+                    for offset in range(0, len(image_b64), self.DECODE_CHUNK_CHARS):
+                        encoded = image_b64[offset:offset + self.DECODE_CHUNK_CHARS]
+                        chunk = base64.b64decode(encoded)
+                        buffer_peak = max(buffer_peak, len(encoded) + len(chunk))
+                        f.write(chunk)
+                        written += len(chunk)
+                os.replace(tmp_path, filepath)
+            except BaseException:
+                # 一時ファイルと、予約した空ファイルを壊れた画像として残さない
+                if tmp_path is not None:
+                    _remove_if_exists(tmp_path)
+                _remove_if_exists(filepath)
+                raise
             
-            with open(filepath, 'wb') as f:
-                f.write(image_data)
-            
-            return filepath
+            stats = {
+                "bytes": written,
+                "save_seconds": time.perf_counter() - start,
+                # この保存で使った作業用バッファ（base64文字列自体は含まない）
+                "decode_buffer_bytes": buffer_peak,
+                # プロセス全体の最大値（並列に保存している他の単語やそれ以前の処理を含む）
+                "process_peak_rss_bytes": _process_peak_rss_bytes()
+            }
+            return filepath, stats
             
         except Exception as e:
             raise Exception(f"base64画像の保存中にエラーが発生しました: {str(e)}")
@@ -0,0 +1,193 @@
+"""
+生成バッチをバックグラウンドで実行する非同期ジョブキュー
+
+HTTPリクエストとは独立したスレッドでジョブを実行し、単語ごとの進捗・
+途中結果・コストをジョブIDで参照できるようにする。
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable
+
+
+class Job:
+    def __init__(self, words: List[Dict[str, str]], input_report: Optional[Dict[str, Any]] = None):
+        """
+        ジョブを初期化
+
+        Args:
+            words: parse_words 形式の単語リスト
+            input_report: 入力処理の報告（まとめた重複・生成済みで外した単語）
+        """
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.total_cost = 0.0
+        self.input_report = input_report or {}
+        self.items = [
+            {
+                "word": word_info["word"],
+                "context": word_info.get("context", ""),
+                "status": "pending"
+            }
+            for word_info in words
+        ]
+        self._lock = threading.Lock()
+
+    def mark_running(self):
+        """ジョブを実行中にする"""
+        with self._lock:
+            self.status = "running"
+            self.started_at = time.time()
+
+    def mark_word_running(self, index: int):
+        """単語の処理開始を記録"""
+        with self._lock:
+            self.items[index]["status"] = "running"
+
+    def record_result(self, index: int, result: Dict[str, Any]):
+        """単語の処理結果を記録"""
+        with self._lock:
+            self.items[index] = dict(result)
+            self.total_cost += result.get("cost", 0.0)
+
+    def mark_finished(self, error: Optional[str] = None):
+        """ジョブを終了状態にする"""
+        with self._lock:
+            self.finished_at = time.time()
+            if error:
+                self.status = "failed"
+                self.error = error
+            else:
+                self.status = "completed"
+
+    def pending_count(self) -> int:
+        """まだ始まっていない単語数"""
+        with self._lock:
+            return sum(1 for item in self.items if item["status"] == "pending")
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        ジョブの状態をJSON化可能な辞書で取得
+
+        Returns:
+            ジョブ状態の辞書
+        """
+        with self._lock:
+            items = [dict(item) for item in self.items]
+            succeeded = sum(1 for item in items if item["status"] == "success")
+            failed = sum(1 for item in items if item["status"] == "error")
+            skipped = sum(1 for item in items if item["status"] == "skipped")
+
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+                "progress": {
+                    "total": len(items),
+                    "completed": succeeded + failed + skipped,
+                    "succeeded": succeeded,
+                    "failed": failed,
+                    "skipped": skipped
+                },
+                "results": items,
+                "input": self.input_report,
+                "total_cost": self.total_cost
+            }
+
+
+class JobManager:
+    def __init__(self, max_running_jobs: int = 2, retention_seconds: float = 24 * 60 * 60,
+                 max_jobs: int = 500):
+        """
+        ジョブマネージャーを初期化
+
+        Args:
+            max_running_jobs: 同時に実行するジョブ数
+            retention_seconds: 終了したジョブを保持する秒数
+            max_jobs: 保持するジョブ数の上限（超えた場合は古い終了済みジョブから削除）
+        """
+        self.retention_seconds = retention_seconds
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_running_jobs, thread_name_prefix="job")
+
+    def submit(self, words: List[Dict[str, str]], runner: Callable[[Job], None],
+               input_report: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        ジョブを登録してバックグラウンドで実行
+
+        Args:
+            words: parse_words 形式の単語リスト
+            runner: ジョブを受け取り、単語ごとの結果を記録しながら処理する関数
+            input_report: 入力処理の報告（ジョブの状態に含める）
+
+        Returns:
+            登録されたジョブ
+        """
+        job = Job(words, input_report=input_report)
+
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+
+        self._executor.submit(self._run, job, runner)
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        """
+        状態ごとのジョブ数と、まだ始まっていない単語数を取得
+
+        Returns:
+            queued, running, finished, pending_words
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {"queued": 0, "running": 0, "finished": 0, "pending_words": 0}
+        for job in jobs:
+            if job.is_finished:
+                counts["finished"] += 1
+                continue
+            counts[job.status] += 1
+            counts["pending_words"] += job.pending_count()
+        return counts
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """ジョブIDからジョブを取得"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, runner: Callable[[Job], None]):
+        job.mark_running()
+        try:
+            runner(job)
+            job.mark_finished()
+        except Exception as e:
+            job.mark_finished(error=str(e))
+
+    def _prune(self):
+        """保持期間を過ぎた、または上限を超えた終了済みジョブを削除"""
+        now = time.time()
+        finished = sorted(
+            (job for job in self._jobs.values() if job.is_finished),
+            key=lambda job: job.finished_at
+        )
+
+        excess = len(self._jobs) - self.max_jobs + 1
+        for job in finished:
+            if now - job.finished_at > self.retention_seconds or excess > 0:
+                del self._jobs[job.id]
+                excess -= 1
@@ -8,6 +8,7 @@ Word Image Maker - 英単語イメージイラスト生成ツール
 import os
 import sys
 import argparse
+import time
 import traceback
 from typing import Optional
 
@@ -18,47 +19,117 @@ from .openai_client import OpenAIClient
 from .scene_generator import SceneGenerator
 from .image_generator import ImageGenerator
 from .html_generator import HTMLGenerator
+from .scene_cache import SceneCache
+from .image_cache import ImageCache
+from .character_images import CharacterImageRegistry
+from .image_derivatives import ImageDerivatives
+from .catalog import Catalog
+from .gallery import Gallery
+from .batch_journal import BatchJournal
+from .word_input import WordList
+from .tracing import TraceFileWriter, WordTrace
+from .cassette import Cassette
 
 
 class WordImageMaker:
-    def __init__(self, api_key: str, base_image_path: str):
-        """Word Image Maker を初期化"""
+    def __init__(self, api_key: str, base_image_path: str, use_cache: bool = True,
+                 trace_file: Optional[str] = None, base_url: Optional[str] = None,
+                 cassette: Optional[Cassette] = None):
+        """
+        Word Image Maker を初期化
+        
+        Args:
+            api_key: OpenAI API キー
+            base_image_path: ベースキャラクター画像のパス
+            use_cache: Falseの場合はキャッシュを使わず新しく生成する
+            trace_file: 単語ごとの処理時間の内訳を書き出すトレースファイル（Chrome形式）
+            base_url: OpenAI APIのベースURL（省略時は OPENAI_BASE_URL か公式のURL）
+            cassette: APIの応答を記録する、または記録済みの応答を再生するカセット
+        """
         self.api_key = api_key
         self.base_image_path = base_image_path
+        self.use_cache = use_cache
+        self.trace_writer = TraceFileWriter(trace_file) if trace_file else None
+        self.character_description = '仲の良い猫とねずみ'
         
         # コンポーネントを初期化
-        self.openai_client = OpenAIClient(api_key)
+        character_images = CharacterImageRegistry()
+        self.openai_client = OpenAIClient(api_key, scene_cache=SceneCache(), character_images=character_images,
+                                          base_url=base_url, cassette=cassette)
         self.scene_generator = SceneGenerator(self.openai_client)
-        self.image_generator = ImageGenerator(self.openai_client)
+        # 一覧ページのサムネイルはバックグラウンドで作成し、最後にまとめて待つ
+        # （ビューアはローカルのファイルを開くので元のPNGを参照し、派生ファイルを待たない）
+        self.derivatives = ImageDerivatives(background=True)
+        self.image_generator = ImageGenerator(self.openai_client, image_cache=ImageCache(),
+                                              character_images=character_images,
+                                              derivatives=self.derivatives)
         self.html_generator = HTMLGenerator()
+        self.catalog = Catalog()
+        self.gallery = Gallery(self.html_generator, self.catalog)
+        self.gallery.ensure_built()
+        self.catalog.add_listener(self.gallery.add)
         
         # 生成した単語のリストを記録
         self.generated_words = []
     
-    def generate_word_image(self, word: str, open_browser: bool = True) -> dict:
+    def generate_word_image(self, word: str, open_browser: bool = True, scene_data: Optional[dict] = None,
+                            context: str = "") -> dict:
         """
         英単語のイメージイラストを生成
         
         Args:
             word: 対象の英単語
             open_browser: 生成後にブラウザで開くか
+            scene_data: 一括生成済みのシーンデータ（None の場合はこの単語だけ生成する）
+            context: 補足情報（意味の指定など）
             
         Returns:
-            生成結果の辞書
+            生成結果の辞書（spans に処理時間の内訳を含む）
         """
+        trace = WordTrace(word, context=context, quality="auto")
+        with trace.activate():
+            result = self._generate_word_image(word, open_browser, scene_data, context, trace)
+        result["spans"] = trace.to_list()
+        
+        if self.trace_writer is not None:
+            try:
+                self.trace_writer.write(trace)
+            except Exception as e:
+                print(f"トレースの書き出し中にエラーが発生しました: {str(e)}")
+        return result
+    
+    def _generate_word_image(self, word: str, open_browser: bool, scene_data: Optional[dict], context: str,
+                             trace: WordTrace) -> dict:
         try:
             print(f"\\n=== '{word}' のイメージイラスト生成を開始 ===")
             
-            # 1. シーンデータを生成
-            scene_data = self.scene_generator.generate_scene_data(word)
+            timings = {}
+            started = time.perf_counter()
+            
+            # 1. シーンデータを生成（一括生成で得られなかった場合はここで生成）
+            if scene_data is None:
+                with trace.span("scene"):
+                    scene_data = self.scene_generator.generate_scene_data(word, self.character_description, context,
+                                                                          use_cache=self.use_cache)
+                timings["scene_seconds"] = time.perf_counter() - started
             self.scene_generator.display_scene_info(scene_data)
             
             # 2. イラストを生成
-            image_path, cost_info = self.image_generator.generate_image(self.base_image_path, scene_data, quality="auto")
+            stage_started = time.perf_counter()
+            with trace.span("image"):
+                image_path, cost_info = self.image_generator.generate_image(self.base_image_path, scene_data,
+                                                                            quality="auto", use_cache=self.use_cache)
+            timings["image_seconds"] = time.perf_counter() - stage_started
             self.image_generator.display_image_info(image_path)
             
             # 3. HTMLファイルを生成
-            html_path = self.html_generator.generate_viewer_html(scene_data, image_path, cost_info, quality="auto")
+            stage_started = time.perf_counter()
+            with trace.span("html_render"):
+                html_path = self.html_generator.generate_viewer_html(scene_data, image_path, cost_info, quality="auto",
+                                                                     spans=trace.to_list())
+            timings["html_seconds"] = time.perf_counter() - stage_started
+            timings["total_seconds"] = time.perf_counter() - started
+            self._record(word, context, scene_data, cost_info, image_path, html_path, timings)
             
             # 4. ブラウザで開く
             if open_browser:
@@ -69,6 +140,7 @@ class WordImageMaker:
             
             result = {
                 "word": word,
+                "context": context,
                 "scene_data": scene_data,
                 "image_path": image_path,
                 "html_path": html_path,
@@ -76,6 +148,9 @@ class WordImageMaker:
                 "success": True
             }
             
+            print("処理時間の内訳:")
+            for span in trace.to_list():
+                print(f"  {span['name']:<16} {span['duration_ms']:>10.0f} ms")
             print(f"\\n=== '{word}' のイラスト生成完了 ===")
             return result
             
@@ -86,46 +161,115 @@ class WordImageMaker:
             
             return {
                 "word": word,
+                "context": context,
                 "error": error_msg,
                 "success": False
             }
     
-    def generate_multiple_words(self, words: list, open_browser: bool = True) -> list:
+    def generate_multiple_words(self, words: list, open_browser: bool = True,
+                                journal: Optional[BatchJournal] = None) -> list:
         """
         複数の英単語のイメージイラストを生成
         
         Args:
-            words: 対象の英単語リスト
+            words: 対象の英単語リスト（英単語、または parse_words 形式の単語情報）
             open_browser: 生成後にブラウザで開くか
+            journal: 進捗を記録するジャーナル（完了済みの単語は生成せずに記録から復元する）
             
         Returns:
             生成結果のリスト
         """
-        results = []
+        words = [item if isinstance(item, dict) else {"word": item, "context": ""} for item in words]
+        results = [None] * len(words)
+        
+        # 再開時は完了済みの単語をジャーナルから復元し、残りだけを生成する
+        pending = []
+        known_html = self.catalog.html_filenames() if journal is not None else set()
+        for index, word_info in enumerate(words):
+            entry = journal.completed(word_info["word"], word_info["context"]) if journal is not None else None
+            if entry is None:
+                pending.append((index, word_info))
+            else:
+                results[index] = self._restore_result(entry, known_html)
+        if journal is not None and len(pending) < len(words):
+            print(f"完了済みの {len(words) - len(pending)} 語を飛ばして再開します（残り {len(pending)} 語）")
+        
+        # 単語数が多い場合はシーンをまとめて生成してChat APIの往復を減らす
+        if len(pending) >= SceneGenerator.BATCH_MIN_WORDS:
+            scenes = self.scene_generator.generate_scene_data_batch(
+                [word_info for _, word_info in pending],
+                self.character_description,
+                use_cache=self.use_cache
+            )
+        else:
+            scenes = [None] * len(pending)
         
-        for i, word in enumerate(words, 1):
+        for i, ((index, word_info), scene_data) in enumerate(zip(pending, scenes), 1):
+            word = word_info["word"]
             print(f"\\n{'='*50}")
-            print(f"進捗: {i}/{len(words)} - '{word}'")
+            print(f"進捗: {i}/{len(pending)} - '{word}'")
             print(f"{'='*50}")
             
-            result = self.generate_word_image(word, open_browser=False)
-            results.append(result)
+            result = self.generate_word_image(word, open_browser=False, scene_data=scene_data,
+                                              context=word_info["context"])
+            results[index] = result
+            
+            if journal is not None:
+                if result["success"]:
+                    journal.record_done(result)
+                else:
+                    journal.record_failed(word, word_info["context"], result["error"])
             
             if not result["success"]:
                 print(f"'{word}' の生成に失敗しました。次の単語に進みます...")
                 continue
         
-        # インデックスHTMLを生成
-        if self.generated_words:
-            try:
-                index_path = self.html_generator.generate_index_html(self.generated_words)
-                if open_browser:
-                    self.html_generator.open_html_file(index_path)
-            except Exception as e:
-                print(f"インデックスHTML生成中にエラーが発生しました: {str(e)}")
+        # 一覧ページ（単語ごとに更新済み）を開く
+        self.wait_for_derivatives()
+        if self.generated_words and open_browser and os.path.exists(self.gallery.index_path):
+            self.html_generator.open_html_file(self.gallery.index_path)
         
         return results
     
+    def wait_for_derivatives(self):
+        """バックグラウンドで作成中のサムネイルがすべてできるまで待つ"""
+        pending = self.derivatives.pending_count()
+        if pending:
+            print(f"サムネイルの作成を待っています（{pending} 枚）...")
+            self.derivatives.wait()
+    
+    def _restore_result(self, entry: dict, known_html: set) -> dict:
+        """ジャーナルの完了記録から生成結果を復元（カタログにない場合は記録し直して一覧に載せる）"""
+        word = entry["word"]
+        html_filename = os.path.basename(entry["html_path"])
+        if html_filename not in known_html:
+            self._record(word, entry.get("context", ""), entry.get("scene_data", {}), entry.get("cost_info", {}),
+                         entry["image_path"], entry["html_path"], {})
+            known_html.add(html_filename)
+        self.generated_words.append(word)
+        return {
+            "word": word,
+            "context": entry.get("context", ""),
+            "scene_data": entry.get("scene_data", {}),
+            "image_path": entry["image_path"],
+            "html_path": entry["html_path"],
+            "cost_info": entry.get("cost_info", {}),
+            "success": True,
+            "resumed": True
+        }
+    
+    def _record(self, word: str, context: str, scene_data: dict, cost_info: dict, image_path: str, html_path: str,
+                timings: dict):
+        """生成履歴カタログに記録（失敗しても生成自体は成功として扱う）"""
+        thumbnail_path = os.path.join(os.path.dirname(image_path),
+                                      ImageDerivatives.thumbnail_name(os.path.basename(image_path)))
+        try:
+            self.catalog.record(word, context, os.path.basename(self.base_image_path), self.character_description,
+                                "auto", scene_data, cost_info, image_path, html_path,
+                                thumbnail_path=thumbnail_path, timings=timings)
+        except Exception as e:
+            print(f"生成履歴の記録中にエラーが発生しました: {str(e)}")
+    
     def print_summary(self, results: list):
         """生成結果のサマリーを表示"""
         total = len(results)
@@ -149,7 +293,8 @@ class WordImageMaker:
             print("\\n成功した単語:")
             for result in results:
                 if result["success"]:
-                    print(f"  - {result['word']}")
+                    suffix = "（前回の実行で完了）" if result.get("resumed") else ""
+                    print(f"  - {result['word']}{suffix}")
 
 
 def main():
@@ -163,6 +308,11 @@ def main():
   python main.py hello world           # 複数の単語を生成
   python main.py --words words.txt     # ファイルから単語を読み込み
   python main.py --no-browser beg      # ブラウザを開かずに生成
+  python main.py --words words.txt --resume  # 中断した一括生成を再開
+  python main.py --words words.txt --skip-existing  # 生成済みの単語を飛ばす
+  python main.py "bank#金融機関"        # 「単語#補足情報」で意味を指定
+  python main.py --words words.txt --record cassettes/words  # APIの応答を記録
+  python main.py --words words.txt --replay cassettes/words --no-cache  # 記録した応答で無料で再実行
         """
     )
     
@@ -175,7 +325,7 @@ def main():
     parser.add_argument(
         "--words-file",
         type=str,
-        help="英単語リストファイル（1行1単語）"
+        help="英単語リストファイル（1行1単語。「単語#補足情報」で意味を指定可能）"
     )
     
     parser.add_argument(
@@ -184,12 +334,54 @@ def main():
         help="生成後にブラウザで開かない"
     )
     
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="キャッシュを使わずに新しいシーンとイラストを生成する"
+    )
+    
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="同じ単語リストの前回の一括生成を、完了済みの単語を飛ばして再開する"
+    )
+    
+    parser.add_argument(
+        "--skip-existing",
+        action="store_true",
+        help="同じベース画像・品質で生成済みの単語を飛ばす"
+    )
+    
+    parser.add_argument(
+        "--trace-file",
+        type=str,
+        help="単語ごとの処理時間の内訳を Chrome のトレース形式で追記するファイル（chrome://tracing で表示）"
+    )
+    
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument(
+        "--record",
+        metavar="DIR",
+        help="OpenAI APIの応答（usage を含む）をこのディレクトリに記録する"
+    )
+    cassette_group.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="--record で記録した応答を再生し、APIを呼び出さずに実行する（--no-cache と併用すると全工程をやり直す）"
+    )
+    
     parser.add_argument(
         "--api-key",
         type=str,
         help="OpenAI API キー（環境変数 OPENAI_API_KEY でも設定可能）"
     )
     
+    parser.add_argument(
+        "--base-url",
+        type=str,
+        help="OpenAI APIのベースURL（互換サーバーやベンチマーク用の偽サーバーを使う場合。環境変数 OPENAI_BASE_URL でも設定可能）"
+    )
+    
     parser.add_argument(
         "--base-image",
         type=str,
@@ -199,17 +391,16 @@ def main():
     
     args = parser.parse_args()
     
-    # 単語リストを構築
-    words = []
+    # 単語リストを構築（正規化して重複をまとめる）
+    lines = []
     
     if args.words:
-        words.extend(args.words)
+        lines.extend(args.words)
     
     if args.words_file:
         try:
             with open(args.words_file, 'r', encoding='utf-8') as f:
-                file_words = [line.strip() for line in f if line.strip()]
-                words.extend(file_words)
+                lines.extend(f)
         except FileNotFoundError:
             print(f"エラー: ファイル '{args.words_file}' が見つかりません")
             sys.exit(1)
@@ -217,6 +408,9 @@ def main():
             print(f"エラー: ファイル読み込み中にエラーが発生しました: {str(e)}")
             sys.exit(1)
     
+    word_list = WordList.from_lines(lines)
+    words = word_list.words
+    
     if not words:
         print("エラー: 生成する英単語が指定されていません")
         parser.print_help()
@@ -224,6 +418,9 @@ def main():
     
     # API キーを取得
     api_key = args.api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key and args.replay:
+        # 再生時はAPIを呼び出さないのでキーは使われない
+        api_key = "replay"
     if not api_key:
         print("エラー: OpenAI API キーが設定されていません")
         print("以下のいずれかの方法で API キーを設定してください:")
@@ -237,22 +434,50 @@ def main():
         print(f"エラー: ベース画像 '{args.base_image}' が見つかりません")
         sys.exit(1)
     
+    # ジャーナルは生成済みの単語を外す前の単語リストで特定する
+    batch_words = list(words)
+    
     try:
+        cassette = None
+        if args.record or args.replay:
+            cassette = Cassette(args.record or args.replay, "record" if args.record else "replay")
+        
         # Word Image Maker を初期化
-        maker = WordImageMaker(api_key, args.base_image)
+        maker = WordImageMaker(api_key, args.base_image, use_cache=not args.no_cache,
+                               trace_file=args.trace_file, base_url=args.base_url, cassette=cassette)
+        
+        if args.skip_existing:
+            word_list.skip_existing(maker.catalog, os.path.basename(args.base_image), "auto")
+            words = word_list.words
+        word_list.print_report()
         
         # 生成実行
-        if len(words) == 1:
-            result = maker.generate_word_image(words[0], open_browser=not args.no_browser)
+        if not words:
+            results = []
+        elif len(batch_words) == 1:
+            result = maker.generate_word_image(words[0]["word"], open_browser=not args.no_browser,
+                                               context=words[0]["context"])
             results = [result]
         else:
-            results = maker.generate_multiple_words(words, open_browser=not args.no_browser)
+            # 中断しても --resume で再開できるよう、単語ごとの完了をジャーナルに記録する
+            journal = BatchJournal.for_batch(batch_words, args.base_image, "auto", resume=args.resume)
+            print(f"進捗ジャーナル: {journal.path}")
+            with journal:
+                results = maker.generate_multiple_words(words, open_browser=not args.no_browser,
+                                                        journal=journal)
         
         # サマリーを表示
+        maker.wait_for_derivatives()
         maker.print_summary(results)
+        if cassette is not None:
+            stats = cassette.stats()
+            print(f"カセット（{stats['mode']}）: 記録 {stats['recorded']} 件、再生 {stats['replayed']} 件、"
+                  f"記録なし {stats['missed']} 件 - {stats['directory']}")
         
     except KeyboardInterrupt:
         print("\\n\\n処理が中断されました")
+        if len(batch_words) > 1:
+            print("同じ単語リストに --resume を付けて実行すると、完了済みの単語を飛ばして再開できます")
         sys.exit(1)
     except Exception as e:
         print(f"\\n予期しないエラーが発生しました: {str(e)}")
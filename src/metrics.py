@@ -0,0 +1,312 @@
+"""
+Prometheus形式のメトリクス
+
+外部ライブラリに頼らず、カウンター・ゲージ・ヒストグラムとテキスト形式（version 0.0.4）の
+出力だけを実装する。PipelineMetrics は生成パイプラインの工程ごとの処理時間・トークン数・
+コスト・キャッシュヒット・再試行・失敗を1か所で記録する。
+"""
+
+import math
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# 処理時間ヒストグラムの既定の区切り（秒）
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class _Metric:
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        """値を増やす（負の値は無視する）"""
+        if amount <= 0:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(_Metric):
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            callback: 出力時に現在値を返す関数（ラベルがある場合はラベル値のタプルから値への辞書）
+        """
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> List[str]:
+        if self.callback is not None:
+            value = self.callback()
+            values = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        else:
+            with self._lock:
+                values = sorted(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        """値を1件記録"""
+        key = self._key(labels)
+        with self._lock:
+            # 各区切り以下の件数（累積でなく区間ごと）、最後の2つは合計値と件数
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 3)
+                self._series[key] = series
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), values):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _format_value(bound)
+                lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', le))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {_format_value(values[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """メトリクスの登録先"""
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], Any]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式で出力"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # 1つのメトリクスの取得に失敗しても、ほかは出力する
+                lines.append(f"# {metric.name} の取得中にエラーが発生しました: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+
+class PipelineMetrics:
+    # 失敗した工程と、再試行を数えるAPIの対応
+    _STAGE_APIS = {"scene": "chat", "image": "image"}
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, prefix: str = "word_image"):
+        """
+        生成パイプラインのメトリクスを初期化
+
+        Args:
+            registry: 登録先（省略時は新しく作成）
+            prefix: メトリクス名の接頭辞
+        """
+        self.registry = registry or MetricsRegistry()
+        self.prefix = prefix
+        self.stage_seconds = self.registry.histogram(
+            f"{prefix}_stage_seconds",
+            "Latency of each generation stage (scene, scene_batch, image_edit, image_save, html, word)",
+            ["stage"]
+        )
+        self.tokens = self.registry.counter(
+            f"{prefix}_tokens_total", "Tokens billed by the OpenAI API", ["api", "kind"]
+        )
+        self.cost = self.registry.counter(
+            f"{prefix}_cost_dollars_total", "Dollars spent according to CostCalculator", ["api"]
+        )
+        self.cache_requests = self.registry.counter(
+            f"{prefix}_cache_requests_total", "Scene/image cache lookups by result", ["cache", "result"]
+        )
+        self.retries = self.registry.counter(
+            f"{prefix}_retries_total", "API calls retried after a transient error", ["api"]
+        )
+        self.failures = self.registry.counter(
+            f"{prefix}_failures_total", "Words that failed, by error type and stage", ["error_type", "stage"]
+        )
+        self.words = self.registry.counter(
+            f"{prefix}_words_total", "Words processed, by final status", ["status"]
+        )
+        self.in_flight = self.registry.gauge(
+            f"{prefix}_words_in_flight", "Words currently being generated"
+        )
+        self.in_flight.set(0)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], Any]] = None) -> Gauge:
+        """接頭辞付きのゲージを登録（出力時に callback で値を取得する）"""
+        return self.registry.gauge(f"{self.prefix}_{name}", documentation, labelnames, callback)
+
+    def observe_scene_batch(self, seconds: float, scenes: List[Optional[Dict[str, Any]]]):
+        """
+        シーン一括生成1回分を記録
+
+        Args:
+            seconds: 所要時間
+            scenes: generate_scene_data_batch の結果
+        """
+        self.stage_seconds.observe(seconds, stage="scene_batch")
+        generated = [scene for scene in scenes if scene is not None and scene.get("usage", {}).get("batched")]
+        if generated:
+            # 試行の記録は一括生成した全シーンで共有されている
+            self.retries.inc(len(generated[0]["usage"].get("attempts", [])) - 1, api="chat")
+
+    def observe_success(self, scene_data: Dict[str, Any], cost_info: Dict[str, Any], timings: Dict[str, Any]):
+        """
+        成功した単語1件を記録
+
+        Args:
+            scene_data: シーンデータ（usage を含む）
+            cost_info: ImageGenerator.generate_image が返したコスト情報
+            timings: WordPipeline.process_word の工程ごとの処理時間
+        """
+        self.words.inc(status="success")
+        usage = scene_data.get("usage", {})
+        chat_cost = cost_info.get("chat_cost", {})
+        image_cost = cost_info.get("image_cost", {})
+
+        for stage, key in (("scene", "scene_seconds"), ("html", "html_seconds"), ("word", "total_seconds")):
+            if key in timings:
+                self.stage_seconds.observe(timings[key], stage=stage)
+
+        scene_cached = bool(usage.get("cached"))
+        self.cache_requests.inc(cache="scene", result="hit" if scene_cached else "miss")
+        if not scene_cached:
+            self.tokens.inc(usage.get("prompt_tokens", 0), api="chat", kind="prompt")
+            self.tokens.inc(usage.get("completion_tokens", 0), api="chat", kind="completion")
+            if not usage.get("batched"):
+                self.retries.inc(len(usage.get("attempts", [])) - 1, api="chat")
+
+        image_cached = bool(image_cost.get("cached"))
+        self.cache_requests.inc(cache="image", result="hit" if image_cached else "miss")
+        if not image_cached:
+            attempts = cost_info.get("image_attempts", [])
+            for attempt in attempts:
+                self.stage_seconds.observe(attempt["seconds"], stage="image_edit")
+            self.retries.inc(len(attempts) - 1, api="image")
+            save_seconds = (cost_info.get("image_stats") or {}).get("save_seconds")
+            if save_seconds is not None:
+                self.stage_seconds.observe(save_seconds, stage="image_save")
+            self.tokens.inc(image_cost.get("prompt_tokens", 0), api="image", kind="text_input")
+            self.tokens.inc(image_cost.get("image_tokens", 0), api="image", kind="image_input")
+            self.tokens.inc(image_cost.get("output_tokens", 0), api="image", kind="output")
+
+        self.cost.inc(chat_cost.get("total_cost", 0.0), api="chat")
+        self.cost.inc(image_cost.get("total_cost", 0.0), api="image")
+
+    def observe_failure(self, error: BaseException, stage: str):
+        """
+        失敗した単語1件を記録
+
+        Args:
+            error: 発生した例外（WordImageError の場合は attempts から再試行回数も記録する）
+            stage: 失敗した工程（scene, image, html）
+        """
+        self.words.inc(status="error")
+        self.failures.inc(error_type=type(error).__name__, stage=stage)
+        attempts = getattr(error, "attempts", [])
+        if attempts and stage in self._STAGE_APIS:
+            self.retries.inc(len(attempts) - 1, api=self._STAGE_APIS[stage])
+
+    def observe_skipped(self):
+        """予算超過で生成しなかった単語1件を記録"""
+        self.words.inc(status="skipped")
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
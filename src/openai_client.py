@@ -1,38 +1,339 @@
-import openai
 import json
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional
+
+from .scene_cache import SceneCache
+from .character_images import CharacterImageRegistry
+from .rate_limiter import RateLimiter
+from .retry import RetryPolicy, record_inner_retry
+from .cassette import Cassette
+from .errors import RateLimitExhaustedError, SceneParseError, classify_error, retry_after_seconds
+from . import tracing
 
 
 class OpenAIClient:
-    def __init__(self, api_key: str):
-        """OpenAI APIクライアントを初期化"""
-        self.client = openai.OpenAI(api_key=api_key)
+    # シーン生成に使用するモデルと温度
+    SCENE_MODEL = "gpt-4o-mini"
+    SCENE_TEMPERATURE = 0.7
+    # レート制限の初期値（応答ヘッダーの x-ratelimit-* で実際の上限に合わせて調整される）
+    CHAT_REQUESTS_PER_MINUTE = 500
+    CHAT_TOKENS_PER_MINUTE = 200000
+    IMAGE_REQUESTS_PER_MINUTE = 50
+    # 429 を受けたときに Retry-After だけ待って再送する回数
+    RATE_LIMIT_RETRIES = 5
+
+    def __init__(self, api_key: str, scene_cache: Optional[SceneCache] = None,
+                 character_images: Optional[CharacterImageRegistry] = None,
+                 rate_limits: Optional[Dict[str, RateLimiter]] = None,
+                 retry_policy: Optional[RetryPolicy] = None, base_url: Optional[str] = None,
+                 cassette: Optional[Cassette] = None):
+        """
+        OpenAI APIクライアントを初期化
+        
+        Args:
+            api_key: OpenAI API キー
+            scene_cache: シーン生成結果のキャッシュ（省略時はキャッシュしない）
+            character_images: ベース画像のレジストリ（省略時は新規作成）
+            rate_limits: 'chat' と 'image' のレート制限（省略時はクラス定数の初期値で作成）
+            retry_policy: 一時的なエラーの再試行ポリシー（省略時は既定値で作成）
+            base_url: APIのベースURL（ベンチマーク用の偽サーバーなど。省略時は OPENAI_BASE_URL か公式のURL）
+            cassette: 応答を記録する、または記録済みの応答を再生するカセット
+        """
+        # openai.OpenAI は内部にHTTP接続プールを持つため、インスタンスを使い回すと
+        # keep-alive 接続が再利用される（ClientRegistry 参照）。
+        # 再試行は RetryPolicy と レート制限で行うため SDK 自身の再試行は無効にする
+        # （openai の読み込みには時間がかかるので、--help などで使わない場合に払わないよう最初の作成時に読み込む）
+        import openai
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.scene_cache = scene_cache
+        self.character_images = character_images or CharacterImageRegistry()
+        self.rate_limits = rate_limits or self.create_rate_limits()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cassette = cassette
     
-    def generate_scene_prompt(self, word: str, character_description: str = "仲の良い猫とねずみ", context: str = "") -> Dict[str, Any]:
+    @classmethod
+    def create_rate_limits(cls, chat_rpm: Optional[float] = None, chat_tpm: Optional[float] = None,
+                           image_rpm: Optional[float] = None) -> Dict[str, RateLimiter]:
+        """
+        chat と image のレート制限を作成
+        
+        Args:
+            chat_rpm: Chat APIの1分あたりのリクエスト数
+            chat_tpm: Chat APIの1分あたりのトークン数
+            image_rpm: 画像APIの1分あたりのリクエスト数
+            
+        Returns:
+            エンドポイント名からレート制限への辞書
+        """
+        return {
+            "chat": RateLimiter("chat", chat_rpm or cls.CHAT_REQUESTS_PER_MINUTE,
+                                chat_tpm or cls.CHAT_TOKENS_PER_MINUTE),
+            "image": RateLimiter("image", image_rpm or cls.IMAGE_REQUESTS_PER_MINUTE)
+        }
+    
+    def rate_limit_stats(self) -> Dict[str, Dict[str, Any]]:
+        """エンドポイントごとの待ち行列の長さと待ち時間を取得"""
+        return {name: limiter.stats() for name, limiter in self.rate_limits.items()}
+    
+    def close(self):
+        """HTTP接続プールを閉じる"""
+        self.client.close()
+    
+    def generate_scene_prompt(self, word: str, character_description: str = "仲の良い猫とねずみ", context: str = "",
+                              use_cache: bool = True) -> Dict[str, Any]:
         """
         英単語からシーンとイラスト作成プロンプトを生成
         
         Args:
             word: 対象の英単語
             character_description: キャラクターの説明
+            context: 補足情報
+            use_cache: Falseの場合はキャッシュを使わず新しいシーンを生成する
             
         Returns:
             シーン内容とプロンプトを含む辞書
+            
+        Raises:
+            WordImageError: 一時的なエラーを再試行しても失敗した場合、または再試行しないエラーの場合
         """
-        system_prompt = f"""あなたは英語教育のためのイラスト作成を支援するAIです。
-英単語の意味を視覚的に表現するシーンを考案し、イラスト作成用のプロンプトを生成してください。
-
-キャラクター: {character_description}
+        cache_key = self._scene_cache_key(word, context, character_description)
+        if cache_key is not None and use_cache:
+            cached = self._get_cached_scene(cache_key)
+            if cached is not None:
+                return cached
+        
+        system_prompt = self._build_scene_system_prompt(character_description)
 
-以下の形式で回答してください：
-```json
-{{
+        user_prompt = f"英単語: {word}"
+        if context:
+            user_prompt += f"\n補足情報: {context}"
+        user_prompt += f"\n\nこの単語のコアイメージを表現するシーンを考案してください。"
+        
+        def request():
+            response = self._create_chat_completion(system_prompt, user_prompt, max_tokens=1000)
+            scene = self._extract_json(response.choices[0].message.content)
+            if not isinstance(scene, dict) or not all(key in scene for key in SceneCache.REQUIRED_KEYS):
+                raise SceneParseError(f"必要なキーを含むJSONオブジェクトが返されませんでした: {scene!r:.200}")
+            return scene, response.usage
+        
+        # 一時的なエラーや壊れたJSONは再試行する（試行ごとの記録は usage に残す）
+        (result, usage), attempts = self.retry_policy.call(request, "シーン生成中にエラーが発生しました")
+        
+        # 新しく生成したシーンはキャッシュに保存（キャッシュ不使用時も最新の結果で上書き）
+        self._cache_scene(cache_key, result)
+        
+        # 使用量情報を結果に追加
+        result["usage"] = {
+            "model": self.SCENE_MODEL,
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+            "attempts": attempts
+        }
+        
+        return result
+    
+    def generate_scene_prompts_batch(self, word_infos: List[Dict[str, str]],
+                                     character_description: str = "仲の良い猫とねずみ",
+                                     use_cache: bool = True) -> List[Optional[Dict[str, Any]]]:
+        """
+        複数の英単語のシーンを1回のChat Completionでまとめて生成
+        
+        システムプロンプトの送信と往復を単語数に関わらず1回にまとめる。
+        応答の要素が欠けていた単語や別の単語のシーンが返された単語は None になるため、呼び出し側で
+        generate_scene_prompt による単語ごとの生成にフォールバックすること。
+        
+        Args:
+            word_infos: {'word': 英単語, 'context': 補足情報} のリスト
+            character_description: キャラクターの説明
+            use_cache: Falseの場合はキャッシュを使わず新しいシーンを生成する
+            
+        Returns:
+            入力順に並んだシーンデータ（生成できなかった単語は None）のリスト
+            
+        Raises:
+            WordImageError: 一括生成の呼び出し自体が失敗した場合
+        """
+        results = [None] * len(word_infos)
+        cache_keys = []
+        pending = []
+        
+        for index, word_info in enumerate(word_infos):
+            cache_key = self._scene_cache_key(word_info["word"], word_info.get("context", ""),
+                                              character_description)
+            cache_keys.append(cache_key)
+            if cache_key is not None and use_cache:
+                results[index] = self._get_cached_scene(cache_key)
+            if results[index] is None:
+                pending.append(index)
+        
+        if not pending:
+            return results
+        
+        system_prompt = self._build_scene_system_prompt(character_description, batch=True)
+        
+        lines = []
+        for number, index in enumerate(pending, 1):
+            word_info = word_infos[index]
+            line = f"{number}. 英単語: {word_info['word']}"
+            if word_info.get("context"):
+                line += f"（補足情報: {word_info['context']}）"
+            lines.append(line)
+        user_prompt = "\n".join(lines)
+        user_prompt += f"\n\n以上の{len(pending)}個の単語それぞれについて、コアイメージを表現するシーンを考案してください。"
+        
+        def request():
+            response = self._create_chat_completion(system_prompt, user_prompt,
+                                                    max_tokens=min(1000 * len(pending), 16000))
+            scenes = self._extract_json(response.choices[0].message.content)
+            if not isinstance(scenes, list):
+                raise SceneParseError("JSON配列が返されませんでした")
+            return scenes, response.usage
+        
+        (scenes, usage), attempts = self.retry_policy.call(request, "シーンの一括生成中にエラーが発生しました")
+        
+        # 使用量は1単語あたりに按分して記録する
+        count = len(pending)
+        for position, index in enumerate(pending):
+            scene = scenes[position] if position < len(scenes) else None
+            if not isinstance(scene, dict):
+                continue
+            # 順序の入れ替わりなどで別の単語のシーンが返された場合は採用しない
+            if str(scene.get("word", "")).strip().lower() != word_infos[index]["word"].strip().lower():
+                continue
+            
+            self._cache_scene(cache_keys[index], scene)
+            scene["usage"] = {
+                "model": self.SCENE_MODEL,
+                "prompt_tokens": self._share(usage.prompt_tokens, count, position),
+                "completion_tokens": self._share(usage.completion_tokens, count, position),
+                "total_tokens": self._share(usage.total_tokens, count, position),
+                "batched": True,
+                "batch_size": count,
+                "attempts": attempts
+            }
+            results[index] = scene
+        
+        return results
+    
+    def _create_chat_completion(self, system_prompt: str, user_prompt: str, max_tokens: int):
+        """シーン生成用のChat Completionをレート制限内で実行"""
+        # TPM には max_tokens も数えられる。日本語は1文字1トークン程度として見積もる
+        estimated_tokens = (len(system_prompt) + len(user_prompt)) // 2 + max_tokens
+        return self._call_with_rate_limit(
+            "chat",
+            self.client.chat.completions,
+            "create",
+            estimated_tokens=estimated_tokens,
+            model=self.SCENE_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=self.SCENE_TEMPERATURE,
+            max_tokens=max_tokens
+        )
+    
+    def _call_with_rate_limit(self, endpoint: str, resource: Any, method: str,
+                              estimated_tokens: int = 0, **kwargs) -> Any:
+        """
+        レート制限の空きを待ってからAPIを呼び出し、応答ヘッダーで制限を更新する
+        
+        429 の場合は Retry-After の間このエンドポイントへの呼び出しをすべて止めてから再送する
+        （利用上限超過 insufficient_quota は待っても解消しないので再送しない）。再送は RetryPolicy の
+        試行記録に加え、上限まで 429 が続いた場合は RetryPolicy でさらに再試行しないエラーにする。
+        カセットがあれば、成功した応答を記録するか、記録済みの応答を呼び出しの代わりに返す。
+        
+        Args:
+            endpoint: 'chat' または 'image'
+            resource: self.client.chat.completions などのリソース
+            method: 呼び出すメソッド名
+            estimated_tokens: 見込みのトークン数
+            **kwargs: APIに渡す引数
+            
+        Returns:
+            パース済みの応答
+            
+        Raises:
+            RateLimitExhaustedError: 429 が RATE_LIMIT_RETRIES 回の再送の後も続いた場合
+        """
+        if self.cassette is not None and self.cassette.replaying:
+            # 記録済みの応答を返す（ネットワークにもレート制限にも触れない）
+            with tracing.span(f"{endpoint}_replay"):
+                return self.cassette.play(endpoint, kwargs)
+        
+        import openai
+        limiter = self.rate_limits[endpoint]
+        call = getattr(resource.with_raw_response, method)
+        
+        for attempt in range(self.RATE_LIMIT_RETRIES + 1):
+            wait_started = time.perf_counter()
+            waited = limiter.acquire(estimated_tokens)
+            if waited > 0.001:
+                tracing.add_span("rate_limit_wait", wait_started, waited, endpoint=endpoint)
+            call_started = time.perf_counter()
+            try:
+                with tracing.span(f"{endpoint}_api"):
+                    raw_response = call(**kwargs)
+            except openai.RateLimitError as e:
+                headers = e.response.headers
+                limiter.update_from_headers(headers)
+                if getattr(e, "code", None) == "insufficient_quota":
+                    raise
+                retry_after = retry_after_seconds(headers)
+                if attempt == self.RATE_LIMIT_RETRIES:
+                    raise RateLimitExhaustedError(
+                        f"レート制限（429）による再送が上限（{self.RATE_LIMIT_RETRIES}回）に達しました: {str(e)}",
+                        e, retry_after=retry_after
+                    ) from e
+                record_inner_retry("RateLimitedError", time.perf_counter() - call_started, retry_after)
+                limiter.record_rate_limited(retry_after)
+                continue
+            
+            limiter.update_from_headers(raw_response.headers)
+            response = raw_response.parse()
+            if self.cassette is not None:
+                self.cassette.record(endpoint, kwargs, response)
+            return response
+    
+    def _build_scene_system_prompt(self, character_description: str, batch: bool = False) -> str:
+        """
+        シーン生成用のシステムプロンプトを構築
+        
+        Args:
+            character_description: キャラクターの説明
+            batch: 複数単語をJSON配列で回答させる場合はTrue
+            
+        Returns:
+            システムプロンプト
+        """
+        scene_format = """{
     "word": "英単語",
     "scene_description": "シーンの詳細な説明（日本語）。キャラクターの表情、動作、背景要素まで具体的に描写する",
     "core_image": "この英単語のコアイメージ（日本語）。単語の本質的な意味や使用場面、感情的ニュアンスを説明する。シーンの説明ではなく、単語そのものの意味を表現する",
     "illustration_prompt": "イラスト作成用プロンプト（英語）。キャラクターの詳細な外見、表情、動作、背景要素を具体的に描写し、必ず最後に'No text, no words, no dialogue.'を含めること"
-}}
-```
+}"""
+        
+        if batch:
+            answer_format = f"""入力された英単語ごとに以下の形式のオブジェクトを作成し、入力と同じ順序・同じ個数のJSON配列で回答してください：
+```json
+[
+{scene_format},
+    ...
+]
+```"""
+        else:
+            answer_format = f"""以下の形式で回答してください：
+```json
+{scene_format}
+```"""
+        
+        return f"""あなたは英語教育のためのイラスト作成を支援するAIです。
+英単語の意味を視覚的に表現するシーンを考案し、イラスト作成用のプロンプトを生成してください。
+
+キャラクター: {character_description}
+
+{answer_format}
 
 重要な制約:
 - セリフや文字は一切使用しない
@@ -42,50 +343,46 @@ class OpenAIClient:
 - core_imageは英単語の辞書的意味や概念を説明し、シーンの要約にしない
 - scene_descriptionは視覚的詳細を豊富に含める
 - illustration_promptは具体的で詳細な英語描写にする"""
-
-        user_prompt = f"英単語: {word}"
-        if context:
-            user_prompt += f"\n補足情報: {context}"
-        user_prompt += f"\n\nこの単語のコアイメージを表現するシーンを考案してください。"
+    
+    def _extract_json(self, content: str) -> Any:
+        """応答本文からJSONブロックを取り出してパース"""
+        if "```json" in content:
+            json_start = content.find("```json") + 7
+            json_end = content.find("```", json_start)
+            json_content = content[json_start:json_end].strip()
+        else:
+            json_content = content
         
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            content = response.choices[0].message.content
-            
-            # 使用量情報を取得
-            usage = response.usage
-            
-            # JSONブロックを抽出
-            if "```json" in content:
-                json_start = content.find("```json") + 7
-                json_end = content.find("```", json_start)
-                json_content = content[json_start:json_end].strip()
-            else:
-                json_content = content
-            
-            result = json.loads(json_content)
-            
-            # 使用量情報を結果に追加
-            result["usage"] = {
-                "model": "gpt-4o-mini",
-                "prompt_tokens": usage.prompt_tokens,
-                "completion_tokens": usage.completion_tokens,
-                "total_tokens": usage.total_tokens
+        return json.loads(json_content)
+    
+    def _scene_cache_key(self, word: str, context: str, character_description: str) -> Optional[str]:
+        if self.scene_cache is None:
+            return None
+        return SceneCache.make_key(word, context, character_description,
+                                   self.SCENE_MODEL, self.SCENE_TEMPERATURE)
+    
+    def _get_cached_scene(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        cached = self.scene_cache.get(cache_key)
+        if cached is not None:
+            # キャッシュヒットはトークンを消費しない
+            cached["usage"] = {
+                "model": self.SCENE_MODEL,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+                "cached": True
             }
-            
-            return result
-            
-        except Exception as e:
-            raise Exception(f"シーン生成中にエラーが発生しました: {str(e)}")
+        return cached
+    
+    def _cache_scene(self, cache_key: Optional[str], scene: Any):
+        if cache_key is not None and isinstance(scene, dict) and \
+                all(key in scene for key in SceneCache.REQUIRED_KEYS):
+            self.scene_cache.put(cache_key, scene)
+    
+    @staticmethod
+    def _share(total: int, count: int, position: int) -> int:
+        """トークン数を count 個に按分した position 番目の値（合計が total と一致する）"""
+        return total // count + (1 if position < total % count else 0)
     
     def create_image_edit(self, image_path: str, prompt: str, size: str = "1024x1024", quality: str = "auto") -> str:
         """
@@ -99,32 +396,43 @@ class OpenAIClient:
             
         Returns:
             生成された画像のbase64データ
+            
+        Raises:
+            WordImageError: 一時的なエラーを再試行しても失敗した場合、または再試行しないエラーの場合
         """
+        message = "画像生成中にエラーが発生しました"
         try:
-            with open(image_path, "rb") as image_file:
-                response = self.client.images.edit(
-                    model="gpt-image-1",
-                    image=image_file,
-                    prompt=prompt,
-                    size=size,
-                    quality=quality,
-                    n=1
-                )
-            
-            # gpt-image-1は常にbase64形式で返す
-            result = {
-                "image_data": response.data[0].b64_json,
-                "usage": {
-                    "total_tokens": response.usage.total_tokens,
-                    "input_tokens": response.usage.input_tokens,
-                    "output_tokens": response.usage.output_tokens,
-                    "input_tokens_details": {
-                        "text_tokens": response.usage.input_tokens_details.text_tokens,
-                        "image_tokens": response.usage.input_tokens_details.image_tokens
-                    }
-                }
-            }
-            return result
-            
+            # ベース画像はメモリ上のバイト列からアップロードする（ファイルは更新時のみ読み直す）
+            character_image = self.character_images.get(image_path)
         except Exception as e:
-            raise Exception(f"画像生成中にエラーが発生しました: {str(e)}")
\ No newline at end of file
+            raise classify_error(e, message) from e
+        
+        response, attempts = self.retry_policy.call(
+            lambda: self._call_with_rate_limit(
+                "image",
+                self.client.images,
+                "edit",
+                model="gpt-image-1",
+                image=character_image.as_upload(),
+                prompt=prompt,
+                size=size,
+                quality=quality,
+                n=1
+            ),
+            message
+        )
+        
+        # gpt-image-1は常にbase64形式で返す
+        return {
+            "image_data": response.data[0].b64_json,
+            "usage": {
+                "total_tokens": response.usage.total_tokens,
+                "input_tokens": response.usage.input_tokens,
+                "output_tokens": response.usage.output_tokens,
+                "input_tokens_details": {
+                    "text_tokens": response.usage.input_tokens_details.text_tokens,
+                    "image_tokens": response.usage.input_tokens_details.image_tokens
+                }
+            },
+            "attempts": attempts
+        }
@@ -0,0 +1,266 @@
+"""
+生成済みビューアHTMLのメモリ内インデックス
+
+/outputs のたびに output/*_viewer.html を glob して stat する代わりに、
+HTMLGenerator がファイルを書いたときに更新し、一定間隔でディレクトリと突き合わせる。
+一覧は更新日時の新しい順に保持し、単語・品質・日付範囲での絞り込みとページングを提供する。
+
+変更のたびにバージョン番号を進めて変更履歴を残すので、クライアントは前回のバージョン以降の
+追加・削除分だけを取得できる。
+"""
+
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+QUALITIES = ("auto", "low", "medium", "high")
+VIEWER_SUFFIX = "_viewer.html"
+# 同じ更新日時のどのファイル名よりも後ろに並ぶ値（日付範囲の二分探索用）
+_LAST_NAME = chr(0x10FFFF)
+
+
+def parse_viewer_filename(filename: str) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    ビューアHTMLのファイル名から単語と品質を取得
+
+    {単語}_{品質}_viewer.html と、品質を含まない旧形式の {単語}_viewer.html に対応する。
+
+    Args:
+        filename: ファイル名
+
+    Returns:
+        (単語, 品質または None)（ビューアHTMLでない場合は None）
+    """
+    if not filename.endswith(VIEWER_SUFFIX):
+        return None
+
+    stem = filename[:-len(VIEWER_SUFFIX)]
+    word, _, quality = stem.rpartition("_")
+    if word and quality in QUALITIES:
+        return word, quality
+    if not stem:
+        return None
+    return stem, None
+
+
+class OutputEntry:
+    def __init__(self, filename: str, word: str, quality: Optional[str], mtime: float):
+        """
+        インデックスに登録されたビューアHTML
+
+        Args:
+            filename: ファイル名
+            word: 単語
+            quality: 画像品質（旧形式のファイルは None）
+            mtime: ファイルの更新日時
+        """
+        self.filename = filename
+        self.word = word
+        self.quality = quality
+        self.mtime = mtime
+
+    @property
+    def sort_key(self) -> Tuple[float, str]:
+        # 新しい順に並べるためのキー
+        return (-self.mtime, self.filename)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "filename": self.filename,
+            "word": self.word,
+            "quality": self.quality,
+            "mtime": self.mtime
+        }
+
+
+class OutputIndex:
+    def __init__(self, output_dir: str = "output", rescan_interval: float = 60.0, max_changes: int = 1000):
+        """
+        出力インデックスを初期化（初回のディレクトリ走査を行う）
+
+        Args:
+            output_dir: ビューアHTMLの出力先
+            rescan_interval: ディレクトリと突き合わせる間隔（秒）。外部でのファイル追加・削除を反映する
+            max_changes: 保持する変更履歴の件数（これより古いバージョンからは差分を返せない）
+        """
+        self.output_dir = output_dir
+        self.rescan_interval = rescan_interval
+        self._entries = {}
+        self._sorted_keys = []
+        self._sorted_entries = []
+        self._by_word = {}
+        self._lock = threading.Lock()
+        self._last_scan = 0.0
+
+        # 再起動後に古いバージョンと混同しないよう、起動時刻（ミリ秒）から数え始める
+        self.version = int(time.time() * 1000)
+        self._changes = deque(maxlen=max_changes)
+
+        self.rescan()
+        self._changes.clear()
+        self._oldest_version = self.version
+
+    def add(self, html_path: str):
+        """
+        書き込まれた（または上書きされた）ビューアHTMLを登録
+
+        Args:
+            html_path: ビューアHTMLのパス
+        """
+        filename = os.path.basename(html_path)
+        parsed = parse_viewer_filename(filename)
+        if parsed is None:
+            return
+
+        try:
+            mtime = os.path.getmtime(os.path.join(self.output_dir, filename))
+        except OSError:
+            return
+
+        with self._lock:
+            self._put(OutputEntry(filename, parsed[0], parsed[1], mtime))
+
+    def remove(self, filename: str):
+        """
+        ビューアHTMLをインデックスから削除
+
+        Args:
+            filename: ファイル名
+        """
+        with self._lock:
+            self._discard(filename)
+
+    def rescan(self):
+        """ディレクトリを走査してインデックスと突き合わせる"""
+        found = {}
+        try:
+            with os.scandir(self.output_dir) as it:
+                for dir_entry in it:
+                    parsed = parse_viewer_filename(dir_entry.name)
+                    if parsed is None or not dir_entry.is_file():
+                        continue
+                    found[dir_entry.name] = OutputEntry(dir_entry.name, parsed[0], parsed[1],
+                                                        dir_entry.stat().st_mtime)
+        except OSError:
+            pass
+
+        with self._lock:
+            for filename in list(self._entries):
+                if filename not in found:
+                    self._discard(filename)
+            for filename, entry in found.items():
+                current = self._entries.get(filename)
+                if current is None or current.mtime != entry.mtime:
+                    self._put(entry)
+            self._last_scan = time.monotonic()
+
+    def query(self, word: Optional[str] = None, quality: Optional[str] = None,
+              date_from: Optional[float] = None, date_to: Optional[float] = None,
+              offset: int = 0, limit: int = 50) -> Tuple[List[OutputEntry], int]:
+        """
+        ビューアHTMLを新しい順に検索
+
+        Args:
+            word: 単語（完全一致）
+            quality: 画像品質
+            date_from: この日時（UNIX時刻）以降に更新されたもの
+            date_to: この日時（UNIX時刻）より前に更新されたもの
+            offset: 先頭から飛ばす件数
+            limit: 返す最大件数
+
+        Returns:
+            (該当するエントリのリスト, 該当件数の合計)
+        """
+        self._maybe_rescan()
+
+        with self._lock:
+            if word is not None:
+                candidates = sorted(self._by_word.get(word, {}).values(), key=lambda e: e.sort_key)
+                keys = [entry.sort_key for entry in candidates]
+            else:
+                candidates = self._sorted_entries
+                keys = self._sorted_keys
+
+            # 更新日時の範囲は並び順を使って二分探索で切り出す
+            start = 0 if date_to is None else bisect.bisect_right(keys, (-date_to, _LAST_NAME))
+            end = len(keys) if date_from is None else bisect.bisect_right(keys, (-date_from, _LAST_NAME))
+
+            if quality is None:
+                total = max(end - start, 0)
+                return list(candidates[start + offset:min(start + offset + limit, end)]), total
+
+            matches = [entry for entry in candidates[start:end] if entry.quality == quality]
+            return matches[offset:offset + limit], len(matches)
+
+    def changes_since(self, version: int) -> Optional[Tuple[List[OutputEntry], List[str]]]:
+        """
+        指定したバージョン以降の変更を取得
+
+        Args:
+            version: クライアントが前回取得したバージョン
+
+        Returns:
+            (追加・更新されたエントリ（新しい順）, 削除されたファイル名のリスト)。
+            変更履歴が残っていないバージョンの場合は None（一覧を取得し直す必要がある）
+        """
+        self._maybe_rescan()
+
+        with self._lock:
+            if version < self._oldest_version or version > self.version:
+                return None
+
+            # ファイルごとに最後の変更だけを残す
+            latest = {}
+            for change_version, filename in self._changes:
+                if change_version > version:
+                    latest[filename] = True
+
+            added = [self._entries[filename] for filename in latest if filename in self._entries]
+            removed = [filename for filename in latest if filename not in self._entries]
+
+        added.sort(key=lambda entry: entry.sort_key)
+        return added, removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _maybe_rescan(self):
+        if time.monotonic() - self._last_scan >= self.rescan_interval:
+            self.rescan()
+
+    def _record_change(self, filename: str):
+        if len(self._changes) == self._changes.maxlen:
+            self._oldest_version = max(self._oldest_version, self._changes[0][0])
+        self.version += 1
+        self._changes.append((self.version, filename))
+
+    def _put(self, entry: OutputEntry):
+        self._discard(entry.filename, record=False)
+        self._record_change(entry.filename)
+        self._entries[entry.filename] = entry
+        self._by_word.setdefault(entry.word, {})[entry.filename] = entry
+
+        position = bisect.bisect_left(self._sorted_keys, entry.sort_key)
+        self._sorted_keys.insert(position, entry.sort_key)
+        self._sorted_entries.insert(position, entry)
+
+    def _discard(self, filename: str, record: bool = True):
+        entry = self._entries.pop(filename, None)
+        if entry is None:
+            return
+        if record:
+            self._record_change(filename)
+
+        words = self._by_word.get(entry.word)
+        if words is not None:
+            words.pop(filename, None)
+            if not words:
+                del self._by_word[entry.word]
+
+        position = bisect.bisect_left(self._sorted_keys, entry.sort_key)
+        del self._sorted_keys[position]
+        del self._sorted_entries[position]
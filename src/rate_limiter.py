@@ -0,0 +1,208 @@
+"""
+OpenAI API 呼び出しのレート制限スケジューラ
+
+エンドポイント（chat / image）ごとにリクエスト数とトークン数のトークンバケットを持ち、
+空きができるまで呼び出しを待たせる。バケットの大きさは設定値から始め、
+応答の x-ratelimit-* ヘッダーと 429 の Retry-After に合わせて調整する。
+待ち行列の長さと待ち時間を stats() で確認できるので、制限で待たされているのか
+API自体が遅いのかを区別できる。
+"""
+
+import re
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    x-ratelimit-reset-* 形式（例: 1s, 6m0s, 20ms）の期間を秒に変換
+
+    Returns:
+        秒数（解釈できない場合は None）
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        """
+        1分あたりの上限から作るトークンバケット
+
+        Args:
+            per_minute: 1分あたりに補充する量
+            burst_seconds: 何秒分の量まで一度に使えるか
+        """
+        self.burst_seconds = burst_seconds
+        self.updated = time.monotonic()
+        self.set_rate(per_minute)
+        self.tokens = self.capacity
+
+    def set_rate(self, per_minute: float):
+        """補充の速さ（1分あたり）を変更"""
+        self.per_minute = max(float(per_minute), 1.0)
+        self.capacity = max(self.per_minute * self.burst_seconds / 60.0, 1.0)
+
+    def refill(self, now: float):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.per_minute / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """amount を取り出せるまでの秒数（refill 済みであること）"""
+        # バケットより大きい要求は満杯になった時点で通す（残量は負になり後続が待つ）
+        needed = min(amount, self.capacity) - self.tokens
+        return max(needed, 0.0) * 60.0 / self.per_minute
+
+
+class RateLimiter:
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: Optional[float] = None):
+        """
+        1つのエンドポイント用のレート制限
+
+        Args:
+            name: 表示用の名前（chat, image など）
+            requests_per_minute: 1分あたりのリクエスト数の上限
+            tokens_per_minute: 1分あたりのトークン数の上限（None の場合は制限しない）
+        """
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._condition = threading.Condition()
+        self._blocked_until = 0.0
+
+        self._waiting = 0
+        self._acquired = 0
+        self._throttled = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._last_wait = 0.0
+        self._rate_limited = 0
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        リクエスト1回分（とトークン）の空きができるまで待って確保する
+
+        Args:
+            tokens: このリクエストで使う見込みのトークン数
+
+        Returns:
+            待った秒数
+        """
+        started = time.monotonic()
+        with self._condition:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    wait = max(self._blocked_until - now, self.requests.wait_time(1))
+                    if self.tokens is not None and tokens:
+                        self.tokens.refill(now)
+                        wait = max(wait, self.tokens.wait_time(tokens))
+                    if wait <= 0:
+                        break
+                    self._condition.wait(wait)
+
+                self.requests.tokens -= 1
+                if self.tokens is not None and tokens:
+                    self.tokens.tokens -= tokens
+            finally:
+                self._waiting -= 1
+
+            waited = time.monotonic() - started
+            self._acquired += 1
+            self._last_wait = waited
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            if waited > 0.001:
+                self._throttled += 1
+            return waited
+
+    def pause(self, seconds: float):
+        """
+        指定した秒数、新しいリクエストを止める（429 の Retry-After など）
+
+        Args:
+            seconds: 止める秒数
+        """
+        with self._condition:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + max(seconds, 0.0))
+            self._condition.notify_all()
+
+    def record_rate_limited(self, retry_after: Optional[float]):
+        """
+        429 を受け取ったことを記録して、Retry-After（なければ1秒）の間止める
+
+        Args:
+            retry_after: Retry-After ヘッダーの秒数
+        """
+        with self._condition:
+            self._rate_limited += 1
+        self.pause(retry_after if retry_after is not None else 1.0)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        応答の x-ratelimit-* ヘッダーに合わせて上限と残量を調整
+
+        Args:
+            headers: HTTP応答ヘッダー
+        """
+        with self._condition:
+            now = time.monotonic()
+            self._apply_headers(headers, "requests", self.requests, now)
+            if self.tokens is not None:
+                self._apply_headers(headers, "tokens", self.tokens, now)
+            self._condition.notify_all()
+
+    def _apply_headers(self, headers: Mapping[str, str], kind: str, bucket: TokenBucket, now: float):
+        limit = _to_float(headers.get(f"x-ratelimit-limit-{kind}"))
+        remaining = _to_float(headers.get(f"x-ratelimit-remaining-{kind}"))
+        reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+
+        if limit and limit != bucket.per_minute:
+            bucket.refill(now)
+            bucket.set_rate(limit)
+        if remaining is not None:
+            bucket.refill(now)
+            bucket.tokens = min(bucket.tokens, remaining)
+            if remaining <= 0 and reset:
+                self._blocked_until = max(self._blocked_until, now + reset)
+
+    def stats(self) -> Dict[str, Any]:
+        """待ち行列の長さ・待ち時間・現在の上限を取得"""
+        with self._condition:
+            return {
+                "name": self.name,
+                "queue_depth": self._waiting,
+                "acquired": self._acquired,
+                "throttled": self._throttled,
+                "rate_limited": self._rate_limited,
+                "total_wait_seconds": self._total_wait,
+                "max_wait_seconds": self._max_wait,
+                "last_wait_seconds": self._last_wait,
+                "paused_seconds": max(self._blocked_until - time.monotonic(), 0.0),
+                "requests_per_minute": self.requests.per_minute,
+                "tokens_per_minute": self.tokens.per_minute if self.tokens is not None else None
+            }
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
@@ -0,0 +1,117 @@
+"""
+再試行ポリシー（ジッター付き指数バックオフ）
+
+一時的なエラー（WordImageError.retryable が True のもの）だけを再試行し、
+試行ごとの所要時間とエラーを記録する。fn の内側で独自に再送した失敗（429 の再送など）も
+record_inner_retry で同じ記録に加えられる。
+"""
+
+import contextvars
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .errors import WordImageError, classify_error
+from . import tracing
+
+# 実行中の RetryPolicy.call の試行記録
+_current_attempts: contextvars.ContextVar = contextvars.ContextVar("retry_attempts", default=None)
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0):
+        """
+        再試行ポリシーを初期化
+
+        Args:
+            max_attempts: 最大試行回数（1回目を含む）
+            base_delay: 1回目の再試行前の待ち時間の上限（秒）。以降は2倍ずつ増える
+            max_delay: 待ち時間の上限（秒）
+        """
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry_number: int, error: WordImageError) -> float:
+        """
+        retry_number 回目の再試行前に待つ秒数
+
+        0 から上限までの一様乱数（フルジッター）で、同時に失敗した呼び出しが
+        一斉に再送しないようにする。サーバーが Retry-After を指定した場合はそれ以上待つ。
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (retry_number - 1)))
+        delay = random.uniform(0, ceiling)
+        if error.retry_after is not None:
+            delay = max(delay, min(error.retry_after, self.max_delay))
+        return delay
+
+    def call(self, fn: Callable[[], Any], message: str) -> Tuple[Any, List[Dict[str, Any]]]:
+        """
+        fn を実行し、一時的なエラーなら待ってから再試行する
+
+        Args:
+            fn: 実行する関数
+            message: エラーメッセージの前置き（例: "画像生成中にエラーが発生しました"）
+
+        Returns:
+            (fn の戻り値, 試行ごとの記録のリスト)
+
+        Raises:
+            WordImageError: 再試行しないエラー、または最大試行回数に達した場合
+                            （attempts に試行ごとの記録が入る）
+        """
+        attempts = []
+        token = _current_attempts.set(attempts)
+        try:
+            return self._call(fn, message, attempts)
+        finally:
+            _current_attempts.reset(token)
+
+    def _call(self, fn: Callable[[], Any], message: str,
+              attempts: List[Dict[str, Any]]) -> Tuple[Any, List[Dict[str, Any]]]:
+        for attempt in range(1, self.max_attempts + 1):
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                error = classify_error(e, message)
+                attempts.append({
+                    "attempt": len(attempts) + 1,
+                    "seconds": time.perf_counter() - started,
+                    "error": type(error).__name__,
+                    "retryable": error.retryable
+                })
+                if not error.retryable or attempt == self.max_attempts:
+                    error.attempts = attempts
+                    if error is e:
+                        raise
+                    raise error from e
+                with tracing.span("retry_backoff", error=type(error).__name__):
+                    time.sleep(self.delay(attempt, error))
+                continue
+
+            attempts.append({"attempt": len(attempts) + 1, "seconds": time.perf_counter() - started})
+            return result, attempts
+
+
+def record_inner_retry(error_name: str, seconds: float, retry_after: Optional[float] = None):
+    """
+    fn の内側で再送した失敗を、実行中の RetryPolicy.call の試行記録に加える
+    （RetryPolicy.call の外では何もしない）
+
+    Args:
+        error_name: エラーの種類（例: "RateLimitedError"）
+        seconds: 失敗した呼び出しの所要時間（秒）
+        retry_after: サーバーが指定した再送までの秒数
+    """
+    attempts = _current_attempts.get()
+    if attempts is None:
+        return
+    attempts.append({
+        "attempt": len(attempts) + 1,
+        "seconds": seconds,
+        "error": error_name,
+        "retryable": True,
+        "retry_after": retry_after,
+        "inner": True
+    })
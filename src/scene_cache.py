@@ -0,0 +1,148 @@
+"""
+シーン生成結果のキャッシュ（メモリLRU + ディスク）
+
+同じ単語・補足情報・キャラクター・モデル・温度の組み合わせに対する
+Chat Completions の結果を再利用し、APIの往復とトークン消費を省く。
+"""
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class SceneCache:
+    # キャッシュ対象とするシーンデータの必須キー
+    REQUIRED_KEYS = ("word", "scene_description", "core_image", "illustration_prompt")
+
+    def __init__(self, cache_dir: str = "output/cache/scenes", max_memory_entries: int = 256,
+                 max_disk_bytes: int = 50 * 1024 * 1024):
+        """
+        シーンキャッシュを初期化
+
+        Args:
+            cache_dir: ディスクキャッシュの保存先
+            max_memory_entries: メモリに保持するエントリ数の上限
+            max_disk_bytes: ディスクキャッシュの合計サイズ上限（超えた場合は古いものから削除）
+        """
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(word: str, context: str, character_description: str, model: str,
+                 temperature: float) -> str:
+        """
+        キャッシュキーを生成
+
+        Returns:
+            SHA-256 の16進文字列
+        """
+        payload = json.dumps(
+            [word, context, character_description, model, temperature],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュからシーンデータを取得
+
+        Args:
+            key: make_key で生成したキー
+
+        Returns:
+            シーンデータのコピー（キャッシュにない場合は None）
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return copy.deepcopy(self._memory[key])
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                scene = json.load(f)
+            # アクセス時刻を更新してLRU順の判定に使う
+            os.utime(path, None)
+        except (OSError, ValueError):
+            return None
+
+        with self._lock:
+            self._remember(key, scene)
+        return copy.deepcopy(scene)
+
+    def put(self, key: str, scene: Dict[str, Any]):
+        """
+        シーンデータをキャッシュに保存
+
+        Args:
+            key: make_key で生成したキー
+            scene: シーンデータ（usage は保存しない）
+        """
+        scene = {k: v for k, v in scene.items() if k != "usage"}
+
+        with self._lock:
+            self._remember(key, copy.deepcopy(scene))
+
+        data = json.dumps(scene, ensure_ascii=False).encode("utf-8")
+        path = self._disk_path(key)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"シーンキャッシュの保存に失敗しました: {str(e)}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def _remember(self, key: str, scene: Dict[str, Any]):
+        self._memory[key] = scene
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _scan_disk(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict_disk(self):
+        """ディスクキャッシュが上限を超えていれば最終アクセスの古いものから削除"""
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+
+        entries = sorted(self._scan_disk())
+        self._disk_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                self._disk_bytes -= size
+            except OSError:
+                pass
@@ -1,19 +1,28 @@
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from .openai_client import OpenAIClient
 
 
 class SceneGenerator:
+    # この単語数以上のバッチではシーンを一括生成する
+    BATCH_MIN_WORDS = 5
+    # 1回のChat Completionで生成する単語数の上限
+    BATCH_CHUNK_SIZE = 10
+
     def __init__(self, openai_client: OpenAIClient):
         """シーン生成器を初期化"""
         self.openai_client = openai_client
     
-    def generate_scene_data(self, word: str, character_description: str = '仲の良い猫とねずみ', context: str = '') -> Dict[str, Any]:
+    def generate_scene_data(self, word: str, character_description: str = '仲の良い猫とねずみ', context: str = '',
+                            use_cache: bool = True) -> Dict[str, Any]:
         """
         英単語からシーンデータを生成
         
         Args:
             word: 対象の英単語
+            character_description: キャラクターの説明
+            context: 補足情報
+            use_cache: Falseの場合はキャッシュを使わず新しいシーンを生成する
             
         Returns:
             シーン情報を含む辞書
@@ -21,9 +30,83 @@ class SceneGenerator:
         print(f"英単語 '{word}' のシーン生成中...")
         
         # OpenAI APIでシーンとプロンプトを生成
-        scene_data = self.openai_client.generate_scene_prompt(word, character_description, context)
+        scene_data = self.openai_client.generate_scene_prompt(word, character_description, context,
+                                                              use_cache=use_cache)
         
         # 生成結果を検証
+        scene_data = self.validate_scene_data(scene_data)
+        
+        print(f"シーン生成完了: {scene_data['scene_description']}")
+        return scene_data
+    
+    def generate_scene_data_batch(self, word_infos: List[Dict[str, str]],
+                                  character_description: str = '仲の良い猫とねずみ',
+                                  use_cache: bool = True) -> List[Optional[Dict[str, Any]]]:
+        """
+        複数の英単語のシーンデータをまとめて生成
+        
+        BATCH_CHUNK_SIZE 単語ごとに1回のChat Completionで生成し、各要素を
+        generate_scene_data と同じ検証にかける。検証に失敗した単語や一括生成自体が
+        失敗した単語は None になるため、呼び出し側で generate_scene_data に
+        フォールバックすること。
+        
+        Args:
+            word_infos: {'word': 英単語, 'context': 補足情報} のリスト
+            character_description: キャラクターの説明
+            use_cache: Falseの場合はキャッシュを使わず新しいシーンを生成する
+            
+        Returns:
+            入力順に並んだシーンデータ（生成できなかった単語は None）のリスト
+        """
+        results = []
+        
+        for start in range(0, len(word_infos), self.BATCH_CHUNK_SIZE):
+            chunk = word_infos[start:start + self.BATCH_CHUNK_SIZE]
+            results.extend(self._generate_chunk(chunk, character_description, use_cache))
+        
+        return results
+    
+    def _generate_chunk(self, word_infos: List[Dict[str, str]], character_description: str,
+                        use_cache: bool) -> List[Optional[Dict[str, Any]]]:
+        words = [word_info['word'] for word_info in word_infos]
+        print(f"英単語 {len(words)} 件のシーンを一括生成中: {', '.join(words)}")
+        
+        try:
+            scenes = self.openai_client.generate_scene_prompts_batch(
+                word_infos, character_description, use_cache=use_cache
+            )
+        except Exception as e:
+            print(f"一括生成に失敗したため単語ごとの生成に切り替えます: {str(e)}")
+            return [None] * len(word_infos)
+        
+        results = []
+        for word, scene_data in zip(words, scenes):
+            if scene_data is None:
+                print(f"'{word}' の一括生成結果が得られなかったため単語ごとに生成します")
+                results.append(None)
+                continue
+            
+            try:
+                results.append(self.validate_scene_data(scene_data))
+            except ValueError as e:
+                print(f"'{word}' の一括生成結果が不正なため単語ごとに生成します: {str(e)}")
+                results.append(None)
+        
+        return results
+    
+    def validate_scene_data(self, scene_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        シーンデータを検証し、プロンプトに制約条件を補う
+        
+        Args:
+            scene_data: シーンデータ
+            
+        Returns:
+            検証済みのシーンデータ
+            
+        Raises:
+            ValueError: 必要なキーが不足している場合
+        """
         required_keys = ["word", "scene_description", "core_image", "illustration_prompt"]
         missing_keys = [key for key in required_keys if key not in scene_data]
         
@@ -34,7 +117,6 @@ class SceneGenerator:
         if "No text, no words, no dialogue" not in scene_data["illustration_prompt"]:
             scene_data["illustration_prompt"] += "\nNo text, no words, no dialogue."
         
-        print(f"シーン生成完了: {scene_data['scene_description']}")
         return scene_data
     
     def save_scene_data(self, scene_data: Dict[str, Any], output_path: str):
@@ -0,0 +1,165 @@
+"""
+単語ごとの処理時間の内訳（スパン）の記録
+
+単語の処理を始めるときに WordTrace を作って activate し、既存の呼び出しを span() で囲む。
+有効なトレースがないスレッドでは span() は何もしないので、OpenAIClient などの部品は
+トレースの有無を気にせず計測できる。記録したスパンは結果のJSONとビューアに載せ、
+TraceFileWriter を使えば Chrome のトレースイベント形式（chrome://tracing, Perfetto）で保存できる。
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("word_trace", default=None)
+
+
+class WordTrace:
+    def __init__(self, name: str, started: Optional[float] = None, **attributes):
+        """
+        1単語分のトレース
+
+        Args:
+            name: トレースの名前（英単語）
+            started: 開始時刻（time.perf_counter の値。省略時は現在）
+            **attributes: トレース全体の属性（補足情報・品質など）
+        """
+        self.name = name
+        self.attributes = attributes
+        # 開始時刻は経過時間の基準（perf_counter）と、トレースファイル用の実時刻の両方で持つ
+        now = time.perf_counter()
+        self.started = now if started is None else started
+        self.started_at = time.time() - (now - self.started)
+        self._spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, duration: float, **attributes):
+        """
+        計測済みのスパンを追加
+
+        Args:
+            name: スパンの名前
+            start: 開始時刻（time.perf_counter の値）
+            duration: 所要時間（秒）
+            **attributes: スパンの属性
+        """
+        span = {
+            "name": name,
+            "start_ms": (start - self.started) * 1000.0,
+            "duration_ms": duration * 1000.0,
+            "thread": threading.current_thread().name
+        }
+        if attributes:
+            span["attributes"] = attributes
+        with self._lock:
+            self._spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[None]:
+        """囲んだ処理をスパンとして記録"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - start, **attributes)
+
+    @contextmanager
+    def activate(self) -> Iterator["WordTrace"]:
+        """このトレースを現在のスレッド（コンテキスト）で有効にする"""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """開始順に並べたスパンのリスト"""
+        with self._lock:
+            return sorted((dict(span) for span in self._spans), key=lambda span: span["start_ms"])
+
+
+def current_trace() -> Optional[WordTrace]:
+    """現在有効なトレース（なければ None）"""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[None]:
+    """
+    現在有効なトレースにスパンを記録（トレースがなければ何もしない）
+
+    Args:
+        name: スパンの名前
+        **attributes: スパンの属性
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name, **attributes):
+        yield
+
+
+def add_span(name: str, start: float, duration: float, **attributes):
+    """計測済みのスパンを現在有効なトレースに追加（トレースがなければ何もしない）"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, start, duration, **attributes)
+
+
+class TraceFileWriter:
+    def __init__(self, path: str):
+        """
+        Chrome のトレースイベント形式（JSON配列形式）のファイルに追記するライター
+
+        配列の閉じ括弧は省略できる形式なので、イベントごとに1行ずつ追記する。
+
+        Args:
+            path: トレースファイルのパス
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._thread_ids: Dict[str, int] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("[\n")
+
+    def write(self, trace: WordTrace):
+        """
+        1単語分のスパンを書き出す
+
+        Args:
+            trace: 書き出すトレース
+        """
+        base_us = trace.started_at * 1_000_000
+        events = []
+        with self._lock:
+            for span in trace.to_list():
+                tid = self._thread_ids.get(span["thread"])
+                if tid is None:
+                    # スレッド名を表示するためのメタデータイベント
+                    tid = self._thread_ids[span["thread"]] = len(self._thread_ids) + 1
+                    events.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                                   "args": {"name": span["thread"]}})
+                events.append({
+                    "name": span["name"],
+                    "cat": "word_image",
+                    "ph": "X",
+                    "ts": round(base_us + span["start_ms"] * 1000.0),
+                    "dur": round(span["duration_ms"] * 1000.0),
+                    "pid": self._pid,
+                    "tid": tid,
+                    "args": dict(span.get("attributes", {}), word=trace.name, **trace.attributes)
+                })
+            lines = "".join(json.dumps(event, ensure_ascii=False) + ",\n" for event in events)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
@@ -0,0 +1,168 @@
+"""
+単語リストの入力処理（Webの /generate とCLIで共通）
+
+1行1単語（「単語#補足情報」で意味を指定）のテキストを正規化し、同じバッチ内の重複
+（大文字小文字・全角半角・余分な空白の違いを含む）をまとめる。まとめた内容は報告用に残す。
+カタログを渡せば、同じキャラクター・品質で生成済みの単語を生成対象から外せる。
+"""
+
+import os
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+# 行頭の番号（1. / 2) など）と箇条書き記号
+_LIST_MARKER_PATTERN = re.compile(r"^(?:\d+[.)]\s+|[-*・•]\s*)")
+# 行末に残りがちな区切り記号
+_TRAILING_PUNCTUATION = ",;、，；"
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    全角英数字を半角にし、前後の空白を除いて連続する空白を1つにまとめる
+
+    Args:
+        text: 入力文字列
+
+    Returns:
+        正規化した文字列
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def parse_line(line: str) -> Optional[Dict[str, str]]:
+    """
+    1行を {'word': 英単語, 'context': 補足情報} に変換
+
+    Args:
+        line: 入力の1行（「単語」または「単語#補足情報」）
+
+    Returns:
+        単語情報（空行や単語がない行は None）
+    """
+    line = normalize_text(line)
+    word, _, context = line.partition("#")
+    word = _LIST_MARKER_PATTERN.sub("", word.strip()).rstrip(_TRAILING_PUNCTUATION).strip()
+    if not word:
+        return None
+    return {"word": word, "context": context.strip()}
+
+
+def parse_words(lines: Iterable[str]) -> List[Dict[str, str]]:
+    """
+    複数行を単語情報のリストに変換（重複はまとめない）
+
+    Args:
+        lines: 入力行
+
+    Returns:
+        単語情報のリスト
+    """
+    words = []
+    for line in lines:
+        word_info = parse_line(line)
+        if word_info is not None:
+            words.append(word_info)
+    return words
+
+
+def word_key(word_info: Dict[str, str]) -> tuple:
+    """重複判定に使うキー（大文字小文字を区別しない）"""
+    return word_info["word"].casefold(), word_info.get("context", "").casefold()
+
+
+class WordList:
+    def __init__(self, words: List[Dict[str, str]], merged: List[Dict[str, Any]]):
+        """
+        正規化・重複除去済みの単語リスト（from_lines で作成する）
+
+        Args:
+            words: 生成対象の単語情報のリスト
+            merged: まとめた重複の報告（word, context, count, variants）
+        """
+        self.words = words
+        self.merged = merged
+        self.existing: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "WordList":
+        """
+        入力行から単語リストを作成
+
+        同じ単語・補足情報の組み合わせは最初に現れた位置に1つだけ残す。
+        表記が複数ある場合は、すべて小文字の表記があればそれを、なければ最初の表記を使う。
+
+        Args:
+            lines: 入力行
+
+        Returns:
+            WordList
+        """
+        groups: Dict[tuple, List[Dict[str, str]]] = {}
+        for word_info in parse_words(lines):
+            groups.setdefault(word_key(word_info), []).append(word_info)
+
+        words = []
+        merged = []
+        for variants in groups.values():
+            chosen = next((v for v in variants if v["word"] == v["word"].lower()), variants[0])
+            words.append(dict(chosen))
+            if len(variants) > 1:
+                merged.append({
+                    "word": chosen["word"],
+                    "context": chosen["context"],
+                    "count": len(variants),
+                    "variants": sorted({v["word"] for v in variants})
+                })
+        return cls(words, merged)
+
+    def skip_existing(self, catalog, character_image: str, quality: str) -> List[Dict[str, Any]]:
+        """
+        同じキャラクター・品質で生成済みの単語を生成対象から外す
+
+        ビューアHTMLと画像が残っているものだけを生成済みとみなす。
+
+        Args:
+            catalog: 生成履歴カタログ
+            character_image: ベースキャラクター画像のファイル名
+            quality: 画像品質
+
+        Returns:
+            外した単語の報告（word, context, html_filename, image_path, created_at）
+        """
+        remaining = []
+        for word_info in self.words:
+            record = catalog.latest(word_info["word"], context=word_info["context"],
+                                    character_image=character_image, quality=quality)
+            if (record is None or not os.path.exists(record["html_path"])
+                    or not os.path.exists(record["image_path"])):
+                remaining.append(word_info)
+                continue
+            self.existing.append({
+                "word": word_info["word"],
+                "context": word_info["context"],
+                "html_filename": os.path.basename(record["html_path"]),
+                "image_path": record["image_path"],
+                "created_at": record["created_at"]
+            })
+        self.words = remaining
+        return self.existing
+
+    def to_dict(self) -> Dict[str, Any]:
+        """報告をJSON化可能な辞書で取得"""
+        return {
+            "count": len(self.words),
+            "merged": self.merged,
+            "existing": self.existing
+        }
+
+    def print_report(self):
+        """まとめた重複と生成済みで外した単語を表示"""
+        for item in self.merged:
+            label = f"{item['word']}#{item['context']}" if item["context"] else item["word"]
+            print(f"重複をまとめました: {label}（{item['count']}件: {', '.join(item['variants'])}）")
+        for item in self.existing:
+            label = f"{item['word']}#{item['context']}" if item["context"] else item["word"]
+            print(f"生成済みのため飛ばします: {label} → {item['html_filename']}")
@@ -0,0 +1,329 @@
+"""
+英単語ごとの生成パイプライン（シーン生成 → イラスト生成 → HTML生成）を
+ワーカープールで並列実行するユーティリティ
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from .scene_generator import SceneGenerator
+from .image_generator import ImageGenerator
+from .html_generator import HTMLGenerator
+from .image_derivatives import ImageDerivatives
+from .catalog import Catalog
+from .errors import WordImageError
+from .budget import Budget
+from .metrics import PipelineMetrics
+from .tracing import TraceFileWriter, WordTrace
+
+
+class WordPipeline:
+    def __init__(self, scene_generator: SceneGenerator, image_generator: ImageGenerator,
+                 html_generator: HTMLGenerator, executor: Optional[Executor] = None,
+                 max_workers: int = 4, catalog: Optional[Catalog] = None,
+                 metrics: Optional[PipelineMetrics] = None,
+                 trace_writer: Optional[TraceFileWriter] = None):
+        """
+        生成パイプラインを初期化
+
+        Args:
+            scene_generator: シーン生成器
+            image_generator: イメージ生成器
+            html_generator: HTML生成器
+            executor: 共有ワーカープール（省略時は実行ごとに作成）
+            max_workers: executor省略時のワーカー数
+            catalog: 成功した単語を記録する生成履歴カタログ
+            metrics: 工程ごとの処理時間・使用量・失敗を記録するメトリクス
+            trace_writer: 単語ごとの処理時間の内訳を書き出すトレースファイル
+        """
+        self.scene_generator = scene_generator
+        self.image_generator = image_generator
+        self.html_generator = html_generator
+        self.executor = executor
+        self.max_workers = max_workers
+        self.catalog = catalog
+        self.metrics = metrics
+        self.trace_writer = trace_writer
+
+    def process_word(self, word_info: Dict[str, str], base_image_path: str,
+                     character_description: str, quality: str = "auto",
+                     use_cache: bool = True,
+                     scene_data: Optional[Dict[str, Any]] = None,
+                     trace: Optional[WordTrace] = None) -> Dict[str, Any]:
+        """
+        1単語分のパイプラインを実行（失敗しても例外は送出せず結果に記録する）
+
+        Args:
+            word_info: {'word': 英単語, 'context': 補足情報}
+            base_image_path: ベースキャラクター画像のパス
+            character_description: キャラクターの説明
+            quality: 画像品質（auto, low, medium, high）
+            use_cache: Falseの場合はキャッシュを使わず新しく生成する
+            scene_data: 一括生成済みのシーンデータ（None の場合はこの単語だけ生成する）
+            trace: 処理時間の内訳を記録するトレース（省略時は新しく作成）
+
+        Returns:
+            生成結果の辞書（spans に処理時間の内訳を含む）
+        """
+        if trace is None:
+            trace = WordTrace(word_info['word'], context=word_info.get('context', ''), quality=quality)
+
+        with trace.activate():
+            result = self._process_word(word_info, base_image_path, character_description, quality,
+                                        use_cache, scene_data, trace)
+        result['spans'] = trace.to_list()
+
+        if self.trace_writer is not None:
+            try:
+                self.trace_writer.write(trace)
+            except Exception as e:
+                print(f"トレースの書き出し中にエラーが発生しました: {str(e)}")
+        return result
+
+    def _process_word(self, word_info, base_image_path, character_description, quality,
+                      use_cache, scene_data, trace):
+        word = word_info['word']
+        context = word_info.get('context', '')
+        timings = {}
+        started = time.perf_counter()
+        stage = 'scene'
+
+        try:
+            # シーンを生成（一括生成で得られなかった場合のフォールバックを含む）
+            if scene_data is None:
+                stage_started = time.perf_counter()
+                with trace.span('scene'):
+                    scene_data = self.scene_generator.generate_scene_data(
+                        word,
+                        character_description,
+                        context,
+                        use_cache=use_cache
+                    )
+                timings['scene_seconds'] = time.perf_counter() - stage_started
+
+            # イラストを生成
+            stage = 'image'
+            stage_started = time.perf_counter()
+            with trace.span('image'):
+                image_path, cost_info = self.image_generator.generate_image(
+                    base_image_path,
+                    scene_data,
+                    quality,
+                    use_cache=use_cache
+                )
+            timings['image_seconds'] = time.perf_counter() - stage_started
+
+            # HTMLビューアを生成
+            stage = 'html'
+            stage_started = time.perf_counter()
+            with trace.span('html_render'):
+                html_path = self.html_generator.generate_viewer_html(
+                    scene_data,
+                    image_path,
+                    cost_info,
+                    quality,
+                    spans=trace.to_list()
+                )
+            timings['html_seconds'] = time.perf_counter() - stage_started
+            timings['total_seconds'] = time.perf_counter() - started
+            # API呼び出しの試行ごとの所要時間（再試行があった場合は複数）
+            timings['attempts'] = {
+                'scene': scene_data.get('usage', {}).get('attempts', []),
+                'image': cost_info.get('image_attempts', [])
+            }
+
+            if self.metrics is not None:
+                self.metrics.observe_success(scene_data, cost_info, timings)
+
+            thumbnail_filename = ImageDerivatives.thumbnail_name(os.path.basename(image_path))
+            if self.catalog is not None:
+                self._record(word, context, base_image_path, character_description, quality,
+                             scene_data, cost_info, image_path, html_path, thumbnail_filename, timings)
+
+            return {
+                'word': word,
+                'context': context,
+                'status': 'success',
+                'image_path': image_path,
+                'thumbnail_filename': thumbnail_filename,
+                'html_path': html_path,
+                'html_filename': os.path.basename(html_path),
+                'cost': cost_info.get('total_cost', 0.0),
+                'image_stats': cost_info.get('image_stats'),
+                'timings': timings
+            }
+
+        except Exception as e:
+            if self.metrics is not None:
+                self.metrics.observe_failure(e, stage)
+            return {
+                'word': word,
+                'context': context,
+                'status': 'error',
+                'error': str(e),
+                'error_type': type(e).__name__,
+                'retryable': isinstance(e, WordImageError) and e.retryable,
+                'attempts': getattr(e, 'attempts', [])
+            }
+
+    def _generate_scene_batch(self, chunk: List[Dict[str, str]], character_description: str,
+                              use_cache: bool) -> Tuple[List[Optional[Dict[str, Any]]], float, float]:
+        """チャンクのシーンを一括生成し、(シーンのリスト, 開始時刻, 所要時間) を返す"""
+        stage_started = time.perf_counter()
+        scenes = self.scene_generator.generate_scene_data_batch(chunk, character_description, use_cache)
+        seconds = time.perf_counter() - stage_started
+        if self.metrics is not None:
+            self.metrics.observe_scene_batch(seconds, scenes)
+        return scenes, stage_started, seconds
+
+    @staticmethod
+    def _skip(index: int, word_info: Dict[str, str],
+              on_result: Optional[Callable[[int, Dict[str, Any]], None]]) -> Future:
+        result = {
+            'word': word_info['word'],
+            'context': word_info.get('context', ''),
+            'status': 'skipped',
+            'error': '予算の上限に達するため生成しませんでした',
+            'cost': 0.0
+        }
+        if on_result:
+            on_result(index, result)
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def _record(self, word, context, base_image_path, character_description, quality,
+                scene_data, cost_info, image_path, html_path, thumbnail_filename, timings):
+        # カタログへの記録に失敗しても、生成自体は成功として扱う
+        try:
+            self.catalog.record(
+                word, context, os.path.basename(base_image_path), character_description, quality,
+                scene_data, cost_info, image_path, html_path,
+                thumbnail_path=os.path.join(os.path.dirname(image_path), thumbnail_filename),
+                timings=timings
+            )
+        except Exception as e:
+            print(f"生成履歴の記録中にエラーが発生しました: {str(e)}")
+
+    def run(self, words: List[Dict[str, str]], base_image_path: str,
+            character_description: str, quality: str = "auto",
+            concurrency: Optional[int] = None,
+            use_cache: bool = True,
+            batch_min_words: int = SceneGenerator.BATCH_MIN_WORDS,
+            on_start: Optional[Callable[[int], None]] = None,
+            on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+            budget: Optional[Budget] = None,
+            word_cost: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        複数単語のパイプラインを並列実行
+
+        同時に実行する単語数は concurrency で制限され、結果は入力順で返される。
+        単語数が batch_min_words 以上の場合はシーンをチャンク単位で一括生成し、
+        シーンが揃ったチャンクから順にイラスト生成を開始する。
+        budget を渡した場合は単語ごとに word_cost を予約してから生成を始め、
+        予約できなくなった単語は生成せずに status 'skipped' の結果にする。
+
+        Args:
+            words: parse_words 形式の単語リスト
+            base_image_path: ベースキャラクター画像のパス
+            character_description: キャラクターの説明
+            quality: 画像品質（auto, low, medium, high）
+            concurrency: この実行での同時実行数の上限
+            use_cache: Falseの場合はキャッシュを使わず新しく生成する
+            batch_min_words: シーンを一括生成する最小単語数（0 で無効）
+            on_start: 各単語の処理開始時に入力インデックスで呼ばれるコールバック
+            on_result: 各単語の完了時に (入力インデックス, 結果) で呼ばれるコールバック
+            budget: 生成コストの予算
+            word_cost: 1単語あたりに予約する見込みコスト
+
+        Returns:
+            入力順に並んだ生成結果のリスト
+        """
+        if not words:
+            return []
+
+        limit = max(1, min(concurrency or self.max_workers, len(words)))
+        executor = self.executor
+        owns_executor = executor is None
+        if owns_executor:
+            executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="word")
+
+        # 共有プールを占有しないよう、実行中の単語数をセマフォで制限しながら投入する
+        slots = threading.Semaphore(limit)
+        futures = []
+
+        def task(index: int, word_info: Dict[str, str],
+                 scene_data: Optional[Dict[str, Any]], trace: WordTrace, queued: float) -> Dict[str, Any]:
+            try:
+                # 空きスロットとワーカーを待っていた時間
+                trace.add('queue_wait', queued, time.perf_counter() - queued)
+                if on_start:
+                    on_start(index)
+                if self.metrics is not None:
+                    self.metrics.in_flight.inc()
+                try:
+                    result = self.process_word(word_info, base_image_path, character_description, quality,
+                                               use_cache=use_cache, scene_data=scene_data, trace=trace)
+                finally:
+                    if self.metrics is not None:
+                        self.metrics.in_flight.dec()
+                if budget is not None:
+                    budget.settle(word_cost, result.get('cost', 0.0))
+                if on_result:
+                    on_result(index, result)
+                return result
+            finally:
+                slots.release()
+
+        scene_executor = None
+        try:
+            if batch_min_words and len(words) >= batch_min_words:
+                # チャンクごとのシーン一括生成を並行して開始
+                chunk_size = self.scene_generator.BATCH_CHUNK_SIZE
+                chunks = [words[start:start + chunk_size] for start in range(0, len(words), chunk_size)]
+                scene_executor = ThreadPoolExecutor(max_workers=min(limit, len(chunks)),
+                                                    thread_name_prefix="scene-batch")
+                scene_futures = [
+                    scene_executor.submit(self._generate_scene_batch, chunk, character_description, use_cache)
+                    for chunk in chunks
+                ]
+            else:
+                chunks = [words]
+                scene_futures = None
+
+            index = 0
+            for chunk_index, chunk in enumerate(chunks):
+                if scene_futures is not None:
+                    scenes, batch_started, batch_seconds = scene_futures[chunk_index].result()
+                else:
+                    scenes = [None] * len(chunk)
+
+                for word_info, scene_data in zip(chunk, scenes):
+                    trace_attributes = {'context': word_info.get('context', ''), 'quality': quality}
+                    if scene_futures is not None:
+                        # 一括生成したシーンの待ち時間も、この単語の内訳に含める
+                        trace = WordTrace(word_info['word'], started=batch_started, **trace_attributes)
+                        trace.add('scene_batch', batch_started, batch_seconds, batch_size=len(chunk))
+                    else:
+                        trace = WordTrace(word_info['word'], **trace_attributes)
+                    queued = time.perf_counter()
+                    slots.acquire()
+                    if budget is not None and not budget.reserve(word_cost):
+                        # 予算を超えるので、この単語の生成は始めない
+                        slots.release()
+                        futures.append(self._skip(index, word_info, on_result))
+                        if self.metrics is not None:
+                            self.metrics.observe_skipped()
+                    else:
+                        futures.append(executor.submit(task, index, word_info, scene_data, trace, queued))
+                    index += 1
+
+            return [future.result() for future in futures]
+        finally:
+            if scene_executor is not None:
+                scene_executor.shutdown(wait=False)
+            if owns_executor:
+                executor.shutdown(wait=True)
@@ -10,6 +10,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Load saved API key from localStorage
     loadSavedApiKey();
     
+    // Continue following a job started before this tab was (re)opened
+    resumeSavedJob();
+    
     generateForm.addEventListener('submit', function(e) {
         e.preventDefault();
         generateImages();
@@ -23,9 +26,6 @@ document.addEventListener('DOMContentLoaded', function() {
 
 async function generateImages() {
     const generateBtn = document.getElementById('generateBtn');
-    const progressArea = document.getElementById('progressArea');
-    const resultsArea = document.getElementById('resultsArea');
-    const errorArea = document.getElementById('errorArea');
     
     // Reset UI
     hideAllAreas();
@@ -37,12 +37,19 @@ async function generateImages() {
     
     // Get form data
     const formData = new FormData(document.getElementById('generateForm'));
-    const words = formData.get('words').trim().split('\n').filter(w => w.trim());
     
     try {
+        updateProgress(0, '見積もり中...');
+        
+        // Pre-flight estimate: let the user confirm cost and time before anything is spent
+        if (!await confirmEstimate(formData)) {
+            hideAllAreas();
+            return;
+        }
+        
         updateProgress(0, '準備中...');
         
-        // Submit to server
+        // Submit to server (returns a job ID immediately)
         const response = await fetch('/generate', {
             method: 'POST',
             body: formData
@@ -51,8 +58,8 @@ async function generateImages() {
         const data = await response.json();
         
         if (data.success) {
-            showResults(data);
-            refreshOutputs();
+            localStorage.setItem(JOB_STORAGE_KEY, data.job_id);
+            await pollJob(data.job_id);
         } else {
             showError(data.error || '生成に失敗しました');
         }
@@ -66,6 +73,104 @@ async function generateImages() {
     }
 }
 
+async function confirmEstimate(formData) {
+    const response = await fetch('/estimate', {
+        method: 'POST',
+        body: formData
+    });
+    
+    if (!response.ok) {
+        // Let /generate report the problem
+        return true;
+    }
+    
+    const data = await response.json();
+    const estimate = data.estimate;
+    const budget = data.budget;
+    const count = data.input.count;
+    
+    if (count === 0) {
+        return true;
+    }
+    
+    const overBudget = budget.words_within_budget < count;
+    if (count === 1 && !overBudget) {
+        return true;
+    }
+    
+    const basis = estimate.basis === 'price_table' ? '料金表から推定' : `過去 ${estimate.samples} 件の生成から推定`;
+    let message = `${count} 語を生成します。\n` +
+        `推定コスト: $${estimate.total_cost.toFixed(2)}（最大 $${estimate.total_cost_high.toFixed(2)}）\n` +
+        `推定所要時間: 約 ${formatDuration(estimate.estimated_seconds)}\n` +
+        `（${basis}）`;
+    
+    if (overBudget) {
+        message += `\n\n予算の残り $${budget.remaining.toFixed(2)} では約 ${budget.words_within_budget} 語までしか生成できません。` +
+            '上限に達した時点で残りの単語は生成されません。';
+    }
+    
+    return confirm(message + '\n\n実行しますか？');
+}
+
+function formatDuration(seconds) {
+    if (seconds < 60) {
+        return `${Math.ceil(seconds)} 秒`;
+    }
+    return `${Math.ceil(seconds / 60)} 分`;
+}
+
+// Job polling
+const JOB_STORAGE_KEY = 'wordImageMaker_jobId';
+const JOB_POLL_INTERVAL = 2000;
+
+async function pollJob(jobId) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        
+        if (response.status === 404) {
+            // The server no longer knows this job (e.g. it was restarted)
+            localStorage.removeItem(JOB_STORAGE_KEY);
+            showError('ジョブが見つかりません');
+            return;
+        }
+        
+        const job = await response.json();
+        const progress = job.progress;
+        const percent = progress.total ? Math.round(progress.completed / progress.total * 100) : 0;
+        
+        const skipped = progress.skipped ? `、予算超過: ${progress.skipped}` : '';
+        updateProgress(percent, `${progress.completed}/${progress.total} 完了（成功: ${progress.succeeded}、失敗: ${progress.failed}${skipped}）`);
+        showResults(job, true);
+        
+        if (job.status === 'completed' || job.status === 'failed') {
+            localStorage.removeItem(JOB_STORAGE_KEY);
+            if (job.status === 'failed') {
+                showError(job.error || '生成に失敗しました');
+            }
+            refreshOutputs();
+            return;
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+    }
+}
+
+async function resumeSavedJob() {
+    const jobId = localStorage.getItem(JOB_STORAGE_KEY);
+    if (!jobId) {
+        return;
+    }
+    
+    hideAllAreas();
+    showProgressArea();
+    
+    try {
+        await pollJob(jobId);
+    } catch (error) {
+        console.error('Failed to resume job:', error);
+    }
+}
+
 function hideAllAreas() {
     document.getElementById('progressArea').classList.add('d-none');
     document.getElementById('resultsArea').classList.add('d-none');
@@ -84,8 +189,10 @@ function updateProgress(percent, text) {
     progressText.textContent = text;
 }
 
-function showResults(data) {
-    hideAllAreas();
+function showResults(data, inProgress = false) {
+    if (!inProgress) {
+        hideAllAreas();
+    }
     
     const resultsArea = document.getElementById('resultsArea');
     const resultsContent = document.getElementById('resultsContent');
@@ -97,11 +204,14 @@ function showResults(data) {
         <div class="mt-3">
     `;
     
+    html += renderInputReport(data.input);
+    
     data.results.forEach(result => {
         if (result.status === 'success') {
             html += `
                 <div class="result-card success card mb-2">
                     <div class="card-body">
+                        ${result.thumbnail_filename ? `<img src="/view/images/${result.thumbnail_filename}" alt="${result.word}" class="result-thumbnail" width="96" height="96" loading="lazy">` : ''}
                         <h5 class="card-title">
                             <i class="fas fa-check-circle text-success"></i> ${result.word}
                         </h5>
@@ -115,7 +225,21 @@ function showResults(data) {
                     </div>
                 </div>
             `;
-        } else {
+        } else if (result.status === 'skipped') {
+            html += `
+                <div class="result-card card mb-2">
+                    <div class="card-body">
+                        <h5 class="card-title">
+                            <i class="fas fa-ban text-warning"></i> ${result.word}
+                        </h5>
+                        ${result.context ? `<p class="card-text"><small class="text-muted">補足: ${result.context}</small></p>` : ''}
+                        <p class="card-text text-muted">
+                            ${result.error}
+                        </p>
+                    </div>
+                </div>
+            `;
+        } else if (result.status === 'error') {
             html += `
                 <div class="result-card error card mb-2">
                     <div class="card-body">
@@ -129,6 +253,20 @@ function showResults(data) {
                     </div>
                 </div>
             `;
+        } else {
+            html += `
+                <div class="result-card card mb-2">
+                    <div class="card-body">
+                        <h5 class="card-title">
+                            ${result.status === 'running' ? '<div class="loading"></div>' : '<i class="fas fa-clock text-muted"></i>'} ${result.word}
+                        </h5>
+                        ${result.context ? `<p class="card-text"><small class="text-muted">補足: ${result.context}</small></p>` : ''}
+                        <p class="card-text text-muted">
+                            ${result.status === 'running' ? '生成中...' : '待機中'}
+                        </p>
+                    </div>
+                </div>
+            `;
         }
     });
     
@@ -138,6 +276,42 @@ function showResults(data) {
     resultsArea.classList.remove('d-none');
 }
 
+function renderInputReport(report) {
+    if (!report) {
+        return '';
+    }
+    
+    let html = '';
+    
+    (report.merged || []).forEach(item => {
+        html += `
+            <div class="alert alert-info py-2 mb-2">
+                <i class="fas fa-compress-alt"></i> 重複をまとめました: ${item.word}${item.context ? '#' + item.context : ''}
+                （${item.count}件: ${item.variants.join(', ')}）
+            </div>
+        `;
+    });
+    
+    (report.existing || []).forEach(item => {
+        html += `
+            <div class="result-card card mb-2">
+                <div class="card-body">
+                    <h5 class="card-title">
+                        <i class="fas fa-forward text-muted"></i> ${item.word}
+                    </h5>
+                    ${item.context ? `<p class="card-text"><small class="text-muted">補足: ${item.context}</small></p>` : ''}
+                    <p class="card-text text-muted">生成済みのため飛ばしました</p>
+                    <a href="/view/${item.html_filename}" target="_blank" class="btn btn-outline-primary btn-sm">
+                        <i class="fas fa-eye"></i> 表示
+                    </a>
+                </div>
+            </div>
+        `;
+    });
+    
+    return html;
+}
+
 function showError(message) {
     hideAllAreas();
     
@@ -152,40 +326,92 @@ function showError(message) {
 }
 
 async function refreshOutputs() {
+    const outputsList = document.getElementById('outputsList');
+    const version = outputsList.dataset.version;
+    
     try {
-        const response = await fetch('/outputs');
-        const data = await response.json();
+        // Ask only for changes since the version we last rendered
+        const url = version ? `/outputs?since=${encodeURIComponent(version)}` : '/outputs';
+        const response = await fetch(url);
         
-        const outputsList = document.getElementById('outputsList');
+        if (response.status === 304) {
+            return;
+        }
         
-        if (data.output_files && data.output_files.length > 0) {
-            let html = '<ul class="list-group">';
-            
-            data.output_files.forEach(file => {
-                html += `
-                    <li class="list-group-item d-flex justify-content-between align-items-center">
-                        <div>
-                            <strong>${file.word}</strong>
-                            <small class="text-muted d-block">${file.modified}</small>
-                        </div>
-                        <a href="${file.url}" target="_blank" class="btn btn-outline-primary btn-sm">
-                            <i class="fas fa-eye"></i> 表示
-                        </a>
-                    </li>
-                `;
-            });
-            
-            html += '</ul>';
-            outputsList.innerHTML = html;
+        const data = await response.json();
+        
+        if (data.added || data.removed) {
+            applyOutputsDelta(outputsList, data);
         } else {
-            outputsList.innerHTML = '<p class="text-muted">まだ生成されたファイルがありません</p>';
+            renderOutputs(outputsList, data.output_files);
         }
         
+        outputsList.dataset.version = data.version;
+        
     } catch (error) {
         console.error('Failed to refresh outputs:', error);
     }
 }
 
+function createOutputItem(file) {
+    const item = document.createElement('li');
+    item.className = 'list-group-item d-flex justify-content-between align-items-center';
+    item.dataset.filename = file.filename;
+    item.innerHTML = `
+        <div>
+            <strong>${file.word}</strong>
+            <small class="text-muted d-block">${file.modified}</small>
+        </div>
+        <a href="${file.url}" target="_blank" class="btn btn-outline-primary btn-sm">
+            <i class="fas fa-eye"></i> 表示
+        </a>
+    `;
+    return item;
+}
+
+function renderOutputs(outputsList, outputFiles) {
+    if (outputFiles && outputFiles.length > 0) {
+        const list = document.createElement('ul');
+        list.className = 'list-group';
+        outputFiles.forEach(file => list.appendChild(createOutputItem(file)));
+        outputsList.replaceChildren(list);
+    } else {
+        outputsList.innerHTML = '<p class="text-muted">まだ生成されたファイルがありません</p>';
+    }
+}
+
+function applyOutputsDelta(outputsList, delta) {
+    let list = outputsList.querySelector('ul.list-group');
+    if (!list) {
+        list = document.createElement('ul');
+        list.className = 'list-group';
+        outputsList.replaceChildren(list);
+    }
+    
+    const findItem = filename => Array.from(list.children)
+        .find(item => item.dataset.filename === filename);
+    
+    delta.removed.forEach(filename => {
+        const item = findItem(filename);
+        if (item) {
+            item.remove();
+        }
+    });
+    
+    // Added viewers are the newest, so insert them at the top (oldest first)
+    delta.added.slice().reverse().forEach(file => {
+        const item = findItem(file.filename);
+        if (item) {
+            item.remove();
+        }
+        list.prepend(createOutputItem(file));
+    });
+    
+    if (list.children.length === 0) {
+        outputsList.innerHTML = '<p class="text-muted">まだ生成されたファイルがありません</p>';
+    }
+}
+
 // Auto-refresh outputs every 30 seconds
 setInterval(refreshOutputs, 30000);
 